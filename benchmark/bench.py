@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+
+"""
+Micro-benchmarks for the processing functions.
+
+The benchmarks run on a synthetic IC86-like detector and synthetic events (see
+synthetic.py), so no GCD or I3 files are needed. The geometry.py,
+trackgeometry.py and regions.py benchmarks only need NumPy. The tray modules
+(dom_data, om_partition, count_hits, calc_dist_to_border) use IceTray. If it
+can't be imported they are run on the pure-Python stand-ins in the standin
+directory instead, and labelled '(stand-in)' since the timings aren't
+comparable with the ones with IceTray.
+
+For each benchmark the per-call latency and the calls (frames) per second are
+reported. The latencies can be saved as a baseline, and later runs compared to
+it to catch regressions.
+"""
+
+from __future__ import print_function, division  # 2to3
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+import numpy as np
+
+# The processing modules are in the process directory.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'process'))
+
+import synthetic
+from geometry import point_to_polygon_dist, point_in_polygon, polygon_edges, signed_dist, SignedDistGrid
+from regions import regions
+from trackgeometry import track_geometry, windowed_charge, PulseArrays
+
+try:
+    from icecube import dataclasses
+    have_icetray = True
+except ImportError:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'standin'))
+    have_icetray = False
+
+
+def time_calls(function, calls, min_time):
+    """
+    Time a function.
+
+    Parameters
+    ----------
+    function : callable
+
+    calls : list of tuples
+        The arguments for each call. They are all called in turn, and this
+        is repeated until at least min_time seconds have passed.
+
+    min_time : float
+
+    Returns
+    -------
+    float
+        The time per call (s). The median over the repeats is used.
+    """
+
+    per_call = []
+    start = timeit.default_timer()
+    while not per_call or timeit.default_timer() - start < min_time:
+        repeat_start = timeit.default_timer()
+        for args in calls:
+            function(*args)
+        per_call.append((timeit.default_timer() - repeat_start) / len(calls))
+
+    return float(np.median(per_call))
+
+
+def border_polygon():
+    """
+    Return the (x, y) coordinates of the border strings of the synthetic detector.
+    """
+
+    positions = synthetic.string_positions()
+
+    # The same as in geoanalysis.py
+    border_strings = [1, 2, 3, 4, 5, 6, 13, 21, 30, 40, 50, 59, 67, 74, 73, 72, 78, 77, 76, 75, 68, 60, 51, 41, 31, 22, 14, 7]
+
+    return [positions[string] for string in border_strings]
+
+
+def analysis_doms():
+    """
+    Return the indices (into synthetic.dom_positions) of the analysis DOMs.
+    """
+
+    strings, oms, positions = synthetic.dom_positions()
+
+    analysis = regions.contains('ICAnalysis', strings, oms) | regions.contains('DCAnalysis', strings, oms)
+
+    return np.flatnonzero(analysis)
+
+
+def numpy_benchmarks(events, rng):
+    """
+    Return the benchmarks that only need NumPy.
+
+    Returns
+    -------
+    list of tuples
+        The (name, function, calls) of each benchmark.
+    """
+
+    benchmarks = []
+
+    polygon = border_polygon()
+    edges = polygon_edges(polygon)
+    endpoints = [tuple(event['track']['endpoint'][:2]) for event in events]
+
+    benchmarks.append(('point_to_polygon_dist', point_to_polygon_dist, [(p, polygon) for p in endpoints]))
+    benchmarks.append(('point_in_polygon', point_in_polygon, [(p, polygon) for p in endpoints]))
+
+    many_points = rng.uniform(-600, 600, (10000, 2))
+    benchmarks.append(('signed_dist (10000 points)', signed_dist, [(many_points, edges)]))
+
+    grid = SignedDistGrid(edges, 5, (-700, 700))
+    benchmarks.append(('SignedDistGrid (10000 points)', grid, [(many_points,)]))
+
+    strings, oms, positions = synthetic.dom_positions()
+    doms = analysis_doms()
+
+    calls = []
+    for event in events:
+        track = event['track']
+        calls.append((positions[doms], track['pos'], track['dir'], 'infinite', np.nan, track['endpoint'],
+                      1.35, 1.31, 140, track['time']))
+    benchmarks.append(('track_geometry', track_geometry, calls))
+
+    calls = []
+    for event in events:
+        pulses = PulseArrays(event['offsets'], event['times'], event['charges'])
+        hit = np.arange(len(event['hit_doms']))
+        calls.append((pulses, hit, np.full(len(hit), event['track']['time']), 1000))
+    benchmarks.append(('windowed_charge', windowed_charge, calls))
+
+    calls = [(strings[event['hit_doms']], oms[event['hit_doms']]) for event in events]
+    benchmarks.append(('regions.count', regions.count, calls))
+
+    return benchmarks
+
+
+def icetray_benchmarks(events):
+    """
+    Return the benchmarks of the tray modules (on the stand-ins if IceTray
+    isn't there).
+    """
+
+    from domanalysis import dom_data, om_partition
+    from general import count_hits
+    from geoanalysis import calc_dist_to_border
+
+    options = default_options()
+
+    geometry = synthetic.make_geometry()
+    frames = [synthetic.make_frame(event, geometry, event_id=i) for i, event in enumerate(events)]
+
+    benchmarks = []
+
+    for engine in ['calculator', 'numpy']:
+        engine_options = dict(options, engine=engine)
+        calls = [(frame, 'MPEFit{}', engine_options) for frame in frames]
+        benchmarks.append(('dom_data ({})'.format(engine), dom_data, calls))
+
+    copy_options = dict(options, partition_mode='copy')
+    calls = [(frame, 'InIceRecoPulseSeriesPattern{}', copy_options) for frame in frames]
+    benchmarks.append(('om_partition (copy)', om_partition, calls))
+
+    # The masks need real I3Frames.
+    if have_icetray:
+        real_frames = [synthetic.make_frame(event, geometry, event_id=i, real_frame=True)
+                       for i, event in enumerate(events)]
+        mask_options = dict(options, partition_mode='mask')
+        calls = [(frame, 'InIceRecoPulseSeriesPattern{}', mask_options) for frame in real_frames]
+        benchmarks.append(('om_partition (mask)', om_partition, calls))
+
+    calls = [(frame, options['pulses_name']) for frame in frames]
+    benchmarks.append(('count_hits', count_hits, calls))
+
+    benchmarks.append(('calc_dist_to_border', calc_dist_to_border, [(frame,) for frame in frames]))
+
+    calls = [(frame,) for frame in frames]
+    benchmarks.append(('calc_dist_to_border (grid)', lambda frame: calc_dist_to_border(frame, resolution=5), calls))
+
+    if not have_icetray:
+        benchmarks = [(name + ' (stand-in)', function, calls) for name, function, calls in benchmarks]
+
+    return benchmarks
+
+
+def default_options():
+    """
+    Return the processing options (the same as in process.py).
+    """
+
+    options = {}
+    options['pulses_name'] = 'TWSRTOfflinePulses'
+    options['max_dist'] = 140
+    options['partitions'] = 5
+    options['engine'] = 'calculator'
+    options['partition_mode'] = 'copy'
+
+    return options
+
+
+def check_engines(events, tolerance):
+    """
+    Check that the numpy and calculator engines of dom_data agree.
+
+    Returns
+    -------
+    float
+        The largest absolute difference of the per-dom data.
+    """
+
+    from domanalysis import dom_data
+    from pulses import pulse_cache
+
+    options = default_options()
+    geometry = synthetic.make_geometry()
+
+    max_diff = 0
+    for i, event in enumerate(events):
+        results = []
+        for engine in ['calculator', 'numpy']:
+            frame = synthetic.make_frame(event, geometry, event_id=i)
+            pulse_cache.clear()
+            dom_data(frame, 'MPEFit{}', dict(options, engine=engine))
+            results.append(frame)
+
+        calculator_frame, numpy_frame = results
+        for key in ['String', 'OM', 'RecoDistance', 'DistAboveEndpoint', 'ImpactAngle', 'TotalCharge']:
+            calculator_data = np.array(calculator_frame[key])
+            numpy_data = np.array(numpy_frame[key])
+            if len(calculator_data) != len(numpy_data):
+                raise ValueError('{} has a different number of DOMs for event {}'.format(key, i))
+            if len(calculator_data):
+                max_diff = max(max_diff, np.max(np.abs(calculator_data - numpy_data)))
+
+    if max_diff > tolerance:
+        raise ValueError('dom_data engines differ by {} (more than {})'.format(max_diff, tolerance))
+
+    return max_diff
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='micro-benchmarks for the processing functions')
+    parser.add_argument('-n', '--num-events', help='number of synthetic events per event size',
+                        type=int, default=50)
+    parser.add_argument('--sizes', help='event sizes to benchmark',
+                        nargs='+', default=sorted(synthetic.event_sizes), choices=sorted(synthetic.event_sizes))
+    parser.add_argument('--min-time', help='minimum time to run each benchmark for (s)',
+                        type=float, default=0.5)
+    parser.add_argument('--seed', help='random seed for the synthetic events',
+                        type=int, default=0)
+    parser.add_argument('--save-baseline', help='save the results as a baseline to this JSON file')
+    parser.add_argument('--baseline', help='compare the results to the baseline in this JSON file')
+    parser.add_argument('--tolerance', help='allowed slowdown relative to the baseline (0.2 is 20%%)',
+                        type=float, default=0.2)
+    parser.add_argument('--check', help='check that the dom_data engines agree',
+                        action='store_true')
+    args = parser.parse_args()
+
+    if not have_icetray:
+        print('IceTray not found: running the tray modules on the stand-ins\n')
+
+    results = {}
+
+    print('{:<46}{:>8}{:>16}{:>14}'.format('Benchmark', 'Size', 'Latency (us)', 'Calls/s'))
+    for size in args.sizes:
+        rng = np.random.RandomState(args.seed)
+        events = [synthetic.random_event(rng, size) for i in range(args.num_events)]
+
+        benchmarks = numpy_benchmarks(events, rng) + icetray_benchmarks(events)
+
+        for name, function, calls in benchmarks:
+            latency = time_calls(function, calls, args.min_time)
+            results['{} [{}]'.format(name, size)] = latency
+            print('{:<46}{:>8}{:>16.1f}{:>14.1f}'.format(name, size, latency * 1e6, 1 / latency))
+
+        if args.check:
+            max_diff = check_engines(events, 1e-6)
+            print('dom_data engines agree to {:.2g}'.format(max_diff))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as outfile:
+            json.dump(results, outfile, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as infile:
+            baseline = json.load(infile)
+
+        regressions = []
+        for name in sorted(set(results) & set(baseline)):
+            ratio = results[name] / baseline[name]
+            if ratio > 1 + args.tolerance:
+                regressions.append((name, ratio))
+
+        for name, ratio in regressions:
+            print('REGRESSION: {} is {:.2f}x slower than the baseline'.format(name, ratio))
+        if regressions:
+            sys.exit(1)
+        print('No regressions compared to {}'.format(args.baseline))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+
+"""
+Benchmark of the dom cuts in cut.py.
+
+The dom cuts are the hot loop of cut.py: there are tens to hundreds of DOMs for
+each event. This compares the ways of making them on the same synthetic
+per-DOM data (see synthetic.random_dom_data):
+
+per frame (before)
+    The old make_dom_cuts on each event, which converted the data to arrays
+    once for the cut mask and again for each dom key. Each event's data is a
+    list, standing in for an I3VectorDouble.
+
+per frame
+    The same, converting each key to an array once.
+
+make_dom_cuts
+    functions.make_dom_cuts on frames of I3VectorDoubles (needs IceTray).
+
+ragged
+    The columnar engine (columnar.py): the data of all the events is one flat
+    array per key plus the event offsets, the dom cuts are made once on the
+    whole batch, and each key is selected with a single fancy index.
+
+The DOMs cut per second are reported for each.
+"""
+
+from __future__ import print_function, division  # 2to3
+
+import argparse
+import operator
+import os
+import sys
+import timeit
+
+import numpy as np
+
+# The cut modules are in the cut directory, and the detector regions in the
+# process directory.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cut'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'process'))
+
+import synthetic
+from columnar import event_dom_rows, dom_cut_mask, ragged_counts
+from regions import IC_strings
+
+try:
+    from icecube import dataclasses
+    from functions import make_dom_cuts
+    have_icetray = True
+except ImportError:
+    have_icetray = False
+
+# The same cuts as cut_options_example.py
+dom_cuts = {}
+dom_cuts['String'] = (np.isin, IC_strings)
+dom_cuts['ImpactAngle'] = (operator.lt, np.pi / 2)
+dom_cuts['DistAboveEndpoint'] = (operator.gt, 100)
+
+dom_keys = ['TotalCharge', 'String', 'OM', 'DistAboveEndpoint', 'ImpactAngle', 'RecoDistance']
+
+
+def per_frame_cuts(frames, convert_once):
+    """
+    Make the dom cuts on each frame (a dict of lists), as make_dom_cuts does.
+    """
+
+    for frame in frames:
+        data = {}
+        if convert_once:
+            for key in list(dom_cuts) + dom_keys:
+                if key not in data:
+                    data[key] = np.array(frame[key])
+
+        pass_cut = np.ones(len(frame['String']), dtype=bool)
+        for key, (function, value) in dom_cuts.items():
+            pass_cut &= function(data[key] if convert_once else np.array(frame[key]), value)
+
+        for key in dom_keys:
+            frame[key + 'Cut'] = list((data[key] if convert_once else np.array(frame[key]))[pass_cut])
+
+
+def icetray_cuts(frames):
+    """
+    Make the dom cuts on each frame with functions.make_dom_cuts.
+    """
+
+    for frame in frames:
+        make_dom_cuts(frame, dom_cuts, dom_keys)
+
+
+def ragged_cuts(dom_offsets, doms):
+    """
+    Make the dom cuts on all the events at once with the columnar engine.
+
+    Returns
+    -------
+    cut : dict[str] -> np.ndarray
+        The data of the DOMs that pass, for each key.
+
+    counts : np.ndarray of int
+        The number of DOMs that pass in each event.
+    """
+
+    rows, counts = event_dom_rows(dom_offsets, np.arange(len(dom_offsets) - 1))
+    pass_cut = dom_cut_mask(doms, dom_cuts, rows)
+    cut_rows = rows[pass_cut]
+
+    cut = {}
+    for key in dom_keys:
+        cut[key] = doms[key][cut_rows]
+
+    return cut, ragged_counts(pass_cut, counts)
+
+
+def time_function(function, args, min_time):
+    """
+    Return the median time (s) of function(*args) over repeats lasting at
+    least min_time seconds.
+    """
+
+    times = []
+    start = timeit.default_timer()
+    while not times or timeit.default_timer() - start < min_time:
+        repeat_start = timeit.default_timer()
+        function(*args)
+        times.append(timeit.default_timer() - repeat_start)
+
+    return float(np.median(times))
+
+
+def check(events, dom_offsets, doms):
+    """
+    Check that the ragged engine cuts the same DOMs as the per frame cuts.
+    """
+
+    frames = [dict((key, list(event[key])) for key in dom_keys) for event in events]
+    per_frame_cuts(frames, convert_once=False)
+
+    cut, counts = ragged_cuts(dom_offsets, doms)
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    for i, frame in enumerate(frames):
+        for key in dom_keys:
+            if not np.array_equal(frame[key + 'Cut'], cut[key][offsets[i]:offsets[i + 1]]):
+                raise ValueError('The ragged engine cut {} differently for event {}'.format(key, i))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='benchmark of the dom cuts in cut.py')
+    parser.add_argument('-n', '--num-events', help='number of synthetic events per event size',
+                        type=int, default=2000)
+    parser.add_argument('--sizes', help='event sizes to benchmark',
+                        nargs='+', default=sorted(synthetic.event_sizes), choices=sorted(synthetic.event_sizes))
+    parser.add_argument('--min-time', help='minimum time to run each benchmark for (s)',
+                        type=float, default=0.5)
+    parser.add_argument('--seed', help='random seed for the synthetic events',
+                        type=int, default=0)
+    parser.add_argument('--check', help='check that the ragged engine agrees with the per frame cuts',
+                        action='store_true')
+    args = parser.parse_args()
+
+    if not have_icetray:
+        print('IceTray not found: not running make_dom_cuts\n')
+
+    print('{:<24}{:>8}{:>10}{:>14}{:>14}{:>10}'.format('Benchmark', 'Size', 'DOMs', 'DOMs/s', 'Events/s', 'Speedup'))
+    for size in args.sizes:
+        rng = np.random.RandomState(args.seed)
+        events = [synthetic.random_dom_data(rng, size) for i in range(args.num_events)]
+
+        dom_offsets = np.concatenate(([0], np.cumsum([len(event['String']) for event in events])))
+        doms = dict((key, np.concatenate([event[key] for event in events])) for key in dom_keys)
+        num_doms = dom_offsets[-1]
+
+        if args.check:
+            check(events, dom_offsets, doms)
+
+        benchmarks = []
+        for name, convert_once in [('per frame (before)', False), ('per frame', True)]:
+            frames = [dict((key, list(event[key])) for key in dom_keys) for event in events]
+            benchmarks.append((name, per_frame_cuts, (frames, convert_once)))
+
+        if have_icetray:
+            frames = [synthetic.SyntheticFrame((key, dataclasses.I3VectorDouble(event[key])) for key in dom_keys)
+                      for event in events]
+            benchmarks.append(('make_dom_cuts', icetray_cuts, (frames,)))
+
+        benchmarks.append(('ragged', ragged_cuts, (dom_offsets, doms)))
+
+        before = None
+        for name, function, function_args in benchmarks:
+            latency = time_function(function, function_args, args.min_time)
+            if before is None:
+                before = latency
+            print('{:<24}{:>8}{:>10}{:>14.3g}{:>14.3g}{:>9.1f}x'.format(
+                name, size, num_doms, num_doms / latency, len(events) / latency, before / latency))
+
+
+if __name__ == '__main__':
+    main()
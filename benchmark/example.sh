@@ -0,0 +1,12 @@
+#!/bin/bash
+
+# Example usage of bench.py
+
+# Save a baseline of the current timings (and check that the dom_data engines agree).
+python /home/jgarber/IC86/benchmark/bench.py --check --save-baseline baseline.json
+
+# After changing the processing code, check that nothing got more than 20% slower.
+python /home/jgarber/IC86/benchmark/bench.py --baseline baseline.json --tolerance 0.2
+
+# Compare the per frame and ragged dom cuts (and check that they agree).
+python /home/jgarber/IC86/benchmark/cut_bench.py --check
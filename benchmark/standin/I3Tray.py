@@ -0,0 +1,5 @@
+"""
+Stand-in for I3Tray (only the OMKey used by geoanalysis.py).
+"""
+
+from icecube.icetray import OMKey
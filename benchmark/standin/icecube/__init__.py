@@ -0,0 +1,11 @@
+"""
+Pure-Python stand-ins for the parts of IceTray used by the tray module
+benchmarks.
+
+bench.py puts the standin directory on the path when IceTray can't be
+imported, so dom_data, om_partition, count_hits and calc_dist_to_border can
+still be benchmarked (on the synthetic frames of synthetic.py). Only the
+classes and functions those modules use are here, and only as far as they
+use them. The timings are not the same as with IceTray (eg. I3Calculator is
+written in Python here), so bench.py labels them '(stand-in)'.
+"""
@@ -0,0 +1,3 @@
+"""
+Stand-in for icecube.common_variables.direct_hits.
+"""
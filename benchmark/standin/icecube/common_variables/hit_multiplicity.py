@@ -0,0 +1,3 @@
+"""
+Stand-in for icecube.common_variables.hit_multiplicity.
+"""
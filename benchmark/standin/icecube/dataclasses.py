@@ -0,0 +1,145 @@
+"""
+Stand-in for icecube.dataclasses.
+"""
+
+from __future__ import print_function, division  # 2to3
+
+import math
+
+
+class I3Constants(object):
+    # The same values as in IceTray
+    c = 0.299792458  # m/ns
+    n_ice_group = 1.35634
+    n_ice_phase = 1.3195
+
+
+class I3Position(object):
+
+    __slots__ = ['x', 'y', 'z']
+
+    def __init__(self, x=float('nan'), y=float('nan'), z=float('nan')):
+        self.x = float(x)
+        self.y = float(y)
+        self.z = float(z)
+
+    def __add__(self, other):
+        return I3Position(self.x + other.x, self.y + other.y, self.z + other.z)
+
+    def __sub__(self, other):
+        return I3Position(self.x - other.x, self.y - other.y, self.z - other.z)
+
+    @property
+    def magnitude(self):
+        return math.sqrt(self.x ** 2 + self.y ** 2 + self.z ** 2)
+
+
+class I3Direction(object):
+    """
+    The direction a particle travels in (normalized to unit length).
+    """
+
+    __slots__ = ['x', 'y', 'z']
+
+    def __init__(self, x, y, z):
+        norm = math.sqrt(x ** 2 + y ** 2 + z ** 2)
+        self.x = x / norm
+        self.y = y / norm
+        self.z = z / norm
+
+    @property
+    def zenith(self):
+        return math.acos(-self.z)
+
+    @property
+    def azimuth(self):
+        return math.atan2(-self.y, -self.x) % (2 * math.pi)
+
+
+class I3Particle(object):
+
+    # Shapes
+    Null = 0
+    InfiniteTrack = 10
+    StartingTrack = 20
+    StoppingTrack = 30
+    ContainedTrack = 40
+
+    # Fit statuses
+    OK = 0
+    FailedToConverge = 30
+
+    def __init__(self):
+        self.shape = I3Particle.Null
+        self.fit_status = I3Particle.OK
+        self.pos = I3Position()
+        self.dir = I3Direction(0, 0, 1)
+        self.time = float('nan')
+        self.length = float('nan')
+        self.energy = float('nan')
+
+
+class I3OMGeo(object):
+
+    def __init__(self):
+        self.position = I3Position()
+
+
+class I3Time(object):
+
+    def __init__(self, utc_year=0, utc_daq_time=0):
+        self.utc_year = utc_year
+        self.utc_daq_time = utc_daq_time
+
+
+class I3Geometry(object):
+
+    def __init__(self):
+        self.omgeo = {}  # OMKey -> I3OMGeo, in the order they were added
+        self.start_time = I3Time()
+        self.end_time = I3Time()
+
+
+class I3EventHeader(object):
+
+    def __init__(self):
+        self.run_id = 0
+        self.event_id = 0
+        self.sub_event_id = 0
+        self.sub_event_stream = ''
+
+
+class I3RecoPulse(object):
+
+    __slots__ = ['time', 'charge']
+
+    def __init__(self):
+        self.time = float('nan')
+        self.charge = float('nan')
+
+
+class I3RecoPulseSeries(list):
+    pass
+
+
+class I3RecoPulseSeriesMap(dict):
+    pass
+
+
+class I3RecoPulseSeriesMapMask(object):
+    """
+    Masks need a real I3Frame, so they aren't available.
+    """
+
+    def __init__(self, *args):
+        raise NotImplementedError('I3RecoPulseSeriesMapMask needs IceTray')
+
+
+class I3VectorDouble(list):
+    pass
+
+
+class I3Double(object):
+
+    def __init__(self, value=float('nan')):
+        self.value = value
@@ -0,0 +1,3 @@
+"""
+Stand-in for icecube.finiteReco (only imported for its converters).
+"""
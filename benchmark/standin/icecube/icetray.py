@@ -0,0 +1,16 @@
+"""
+Stand-in for icecube.icetray.
+"""
+
+from __future__ import print_function, division  # 2to3
+
+from collections import namedtuple
+
+
+class OMKey(namedtuple('OMKey', ['string', 'om', 'pmt'])):
+    """
+    The (string, om, pmt) of a DOM.
+    """
+
+    def __new__(cls, string, om, pmt=0):
+        return super(OMKey, cls).__new__(cls, string, om, pmt)
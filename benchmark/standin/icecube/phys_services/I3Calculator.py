@@ -0,0 +1,68 @@
+"""
+Stand-in for I3Calculator, for infinite tracks only (like the synthetic fits).
+"""
+
+from __future__ import print_function, division  # 2to3
+
+import math
+
+from icecube.dataclasses import I3Constants, I3Particle, I3Position
+
+
+def _closest_approach(particle, position):
+    """
+    Return the distance along the track to the point of closest approach to
+    the position, and that point.
+    """
+
+    if particle.shape != I3Particle.InfiniteTrack:
+        raise NotImplementedError('The I3Calculator stand-in only handles infinite tracks')
+
+    pos, direction = particle.pos, particle.dir
+    along = ((position.x - pos.x) * direction.x + (position.y - pos.y) * direction.y +
+             (position.z - pos.z) * direction.z)
+
+    return along, I3Position(pos.x + along * direction.x, pos.y + along * direction.y, pos.z + along * direction.z)
+
+
+def closest_approach_position(particle, position):
+    return _closest_approach(particle, position)[1]
+
+
+def closest_approach_distance(particle, position):
+    return (position - closest_approach_position(particle, position)).magnitude
+
+
+def distance_along_track(particle, position):
+    return _closest_approach(particle, position)[0]
+
+
+def _cherenkov(particle, position, n_group, n_phase):
+    """
+    Return the distance along the track of the Cherenkov emission point for
+    the position, and the Cherenkov distance.
+    """
+
+    along, closest = _closest_approach(particle, position)
+    closest_dist = (position - closest).magnitude
+
+    changle = math.acos(1 / n_phase)
+
+    return along - closest_dist / math.tan(changle), closest_dist / math.sin(changle)
+
+
+def cherenkov_distance(particle, position, n_group=I3Constants.n_ice_group, n_phase=I3Constants.n_ice_phase):
+    return _cherenkov(particle, position, n_group, n_phase)[1]
+
+
+def cherenkov_position(particle, position, n_group=I3Constants.n_ice_group, n_phase=I3Constants.n_ice_phase):
+    along = _cherenkov(particle, position, n_group, n_phase)[0]
+    pos, direction = particle.pos, particle.dir
+
+    return I3Position(pos.x + along * direction.x, pos.y + along * direction.y, pos.z + along * direction.z)
+
+
+def time_residual(particle, position, time, n_group=I3Constants.n_ice_group, n_phase=I3Constants.n_ice_phase):
+    along, reco_dist = _cherenkov(particle, position, n_group, n_phase)
+
+    return time - (particle.time + (along + reco_dist * n_group) / I3Constants.c)
@@ -0,0 +1,355 @@
+"""
+Synthetic detector and events for benchmarking the processing functions.
+
+The geometry is an IC86-like detector: 78 IceCube strings on a hexagonal grid
+with 125 m spacing and 8 Deep Core strings around string 36, each with 60
+DOMs. The events are straight muon tracks with pulses on the DOMs near the
+track, which is enough to exercise dom_data, om_partition, count_hits and
+calc_dist_to_border without GCD or I3 files. For the cuts, random_dom_data
+makes the per-DOM data that dom_data would add to the frame.
+
+The positions, tracks and pulses are plain NumPy arrays. The make_* functions
+turn them into the IceCube objects the processing functions expect, so they
+need IceTray (or the stand-ins in the standin directory, see bench.py).
+"""
+
+from __future__ import print_function, division  # 2to3
+
+import numpy as np
+
+# Spacing of the IceCube strings (m).
+string_spacing = 125.0
+
+# Number of strings in each row of the IceCube hexagonal grid, and the x
+# offset of the first string in each row (in units of string_spacing).
+row_lengths = [6, 7, 8, 9, 10, 10, 9, 8, 7, 4]
+row_offsets = [0, -0.5, -1, -1.5, -2, -1.5, -1, -0.5, 0, 1.5]
+
+# Number of IceCube strings (the rest are Deep Core), and DOMs per string.
+num_ic_strings = 78
+num_strings = 86
+doms_per_string = 60
+
+# Event sizes used by the benchmarks: (number of hit DOMs, mean pulses per hit DOM).
+event_sizes = {}
+event_sizes['small'] = (20, 1.5)
+event_sizes['medium'] = (100, 4)
+event_sizes['large'] = (400, 15)
+
+
+def string_positions():
+    """
+    Return the (x, y) positions of the 86 strings.
+
+    Returns
+    -------
+    dict[int] -> tuple
+    """
+
+    positions = {}
+    row_height = string_spacing * np.sqrt(3) / 2
+
+    string = 1
+    for row, (length, offset) in enumerate(zip(row_lengths, row_offsets)):
+        for i in range(length):
+            positions[string] = ((offset + i) * string_spacing, row * row_height)
+            string += 1
+
+    # Center the detector on string 36.
+    center_x, center_y = positions[36]
+    for string in positions:
+        x, y = positions[string]
+        positions[string] = (x - center_x, y - center_y)
+
+    # Deep Core: strings 79 and 80 near string 36, and 81 to 86 in a ring
+    # around it.
+    positions[79] = (30.0, -35.0)
+    positions[80] = (-35.0, 30.0)
+    for i, string in enumerate(range(81, 87)):
+        angle = np.pi / 3 * i
+        positions[string] = (72 * np.cos(angle), 72 * np.sin(angle))
+
+    return positions
+
+
+def dom_z(string, om):
+    """
+    Return the z coordinate of a DOM.
+
+    The IceCube DOMs are spaced by 17 m from 500 m down. On the Deep Core
+    strings, the first 10 DOMs are above the dust layer (10 m spacing) and the
+    rest are below it (7 m spacing).
+    """
+
+    if string <= num_ic_strings:
+        return 500.0 - 17.0 * (om - 1)
+    if om <= 10:
+        return 190.0 - 10.0 * (om - 1)
+    return -150.0 - 7.0 * (om - 11)
+
+
+def dom_positions():
+    """
+    Return the string and OM numbers and the (x, y, z) positions of all the
+    in ice DOMs.
+
+    Returns
+    -------
+    strings, oms : np.ndarray of int
+    positions : np.ndarray with shape (N, 3)
+    """
+
+    strings = []
+    oms = []
+    positions = []
+    for string, (x, y) in sorted(string_positions().items()):
+        for om in range(1, doms_per_string + 1):
+            strings.append(string)
+            oms.append(om)
+            positions.append((x, y, dom_z(string, om)))
+
+    return np.array(strings), np.array(oms), np.array(positions)
+
+
+def random_track(rng):
+    """
+    Return a random down going track that stops in the detector.
+
+    The zenith is between 40 and 70 degrees (as for the MPEFit filter), and
+    the endpoint is within 500 m of the center horizontally and between -450
+    and 0 m in z.
+
+    Returns
+    -------
+    dict
+        The track 'pos' (the vertex), 'dir', 'endpoint', 'length' and 'time'.
+    """
+
+    zenith = np.radians(rng.uniform(40, 70))
+    azimuth = rng.uniform(0, 2 * np.pi)
+
+    # The direction the particle travels (opposite to the direction it
+    # comes from).
+    direction = -np.array([np.sin(zenith) * np.cos(azimuth),
+                           np.sin(zenith) * np.sin(azimuth),
+                           np.cos(zenith)])
+
+    radius = 500 * np.sqrt(rng.uniform())
+    angle = rng.uniform(0, 2 * np.pi)
+    endpoint = np.array([radius * np.cos(angle), radius * np.sin(angle), rng.uniform(-450, 0)])
+
+    length = rng.uniform(800, 1500)
+    vertex = endpoint - length * direction
+
+    return {'pos': vertex, 'dir': direction, 'endpoint': endpoint,
+            'length': length, 'time': rng.uniform(9000, 11000)}
+
+
+def random_event(rng, size='medium'):
+    """
+    Return a random event: a track, and pulses on the DOMs closest to it.
+
+    Parameters
+    ----------
+    rng : np.random.RandomState
+
+    size : str
+        One of the keys of event_sizes.
+
+    Returns
+    -------
+    dict
+        The 'track' (see random_track), the indices of the 'hit_doms' (into
+        the arrays from dom_positions), and the pulse 'offsets', 'times' and
+        'charges' (the pulses of the ith hit DOM are
+        times[offsets[i]:offsets[i + 1]]).
+    """
+
+    num_hit_doms, pulses_per_dom = event_sizes[size]
+
+    strings, oms, positions = dom_positions()
+    track = random_track(rng)
+
+    # Hit the DOMs closest to the track.
+    delta = positions - track['pos']
+    along = np.dot(delta, track['dir'])
+    dist = np.sqrt(np.sum((delta - along[:, np.newaxis] * track['dir']) ** 2, axis=1))
+    hit_doms = np.sort(np.argsort(dist)[:num_hit_doms])
+
+    counts = 1 + rng.poisson(pulses_per_dom - 1, len(hit_doms))
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    # Pulses arrive a bit after the light would travel directly from the track.
+    direct_time = track['time'] + (along[hit_doms] + 1.2 * dist[hit_doms]) / 0.3
+    times = np.repeat(direct_time, counts) + rng.exponential(300, offsets[-1])
+    charges = rng.lognormal(0, 0.5, offsets[-1])
+
+    return {'track': track, 'hit_doms': hit_doms,
+            'offsets': offsets, 'times': times, 'charges': charges}
+
+
+def random_dom_data(rng, size='medium'):
+    """
+    Return random per-DOM data for an event, as added to the frame by
+    dom_data (for benchmarking the cuts).
+
+    Parameters
+    ----------
+    rng : np.random.RandomState
+
+    size : str
+        One of the keys of event_sizes. The number of DOMs is Poisson
+        distributed around its number of hit DOMs.
+
+    Returns
+    -------
+    dict[str] -> np.ndarray
+        The 'TotalCharge', 'String', 'OM', 'DistAboveEndpoint',
+        'ImpactAngle' and 'RecoDistance' of each DOM.
+    """
+
+    strings, oms, positions = dom_positions()
+
+    num_doms = rng.poisson(event_sizes[size][0])
+    doms = rng.choice(len(strings), num_doms, replace=False)
+
+    return {'TotalCharge': rng.lognormal(0, 1, num_doms),
+            'String': strings[doms].astype(float),
+            'OM': oms[doms].astype(float),
+            'DistAboveEndpoint': rng.uniform(-300, 700, num_doms),
+            'ImpactAngle': rng.uniform(0, np.pi, num_doms),
+            'RecoDistance': rng.uniform(0, 140, num_doms)}
+
+
+class SyntheticFrame(dict):
+    """
+    A lightweight stand-in for an I3Frame.
+
+    The processing functions only get and put objects in the frame, so a dict
+    is enough.
+    """
+
+    def Has(self, key):
+        return key in self
+
+
+class SyntheticMask(object):
+    """
+    A stand-in for an I3RecoPulseSeriesMapMask, which just holds the pulse
+    series.
+    """
+
+    def __init__(self, pulse_series):
+        self.pulse_series = pulse_series
+
+    def apply(self, frame):
+        return self.pulse_series
+
+
+def make_geometry():
+    """
+    Return the synthetic detector as an I3Geometry.
+    """
+
+    from icecube import dataclasses, icetray
+
+    geometry = dataclasses.I3Geometry()
+    strings, oms, positions = dom_positions()
+    for string, om, (x, y, z) in zip(strings, oms, positions):
+        omgeo = dataclasses.I3OMGeo()
+        omgeo.position = dataclasses.I3Position(x, y, z)
+        geometry.omgeo[icetray.OMKey(int(string), int(om))] = omgeo
+
+    return geometry
+
+
+def make_particle(track, shift=0):
+    """
+    Return the track as an infinite track I3Particle, optionally shifted
+    sideways by shift metres (to mimic the partition fits).
+    """
+
+    from icecube import dataclasses
+
+    pos = track['pos'] + shift * np.cross(track['dir'], [0, 0, 1])
+
+    particle = dataclasses.I3Particle()
+    particle.shape = dataclasses.I3Particle.InfiniteTrack
+    particle.fit_status = dataclasses.I3Particle.OK
+    particle.pos = dataclasses.I3Position(*pos)
+    particle.dir = dataclasses.I3Direction(*track['dir'])
+    particle.time = track['time']
+
+    return particle
+
+
+def make_frame(event, geometry, event_id=0, partitions=5, pulses_name='TWSRTOfflinePulses',
+               real_frame=False):
+    """
+    Build a Physics frame for the event, with everything the processing
+    functions need from it.
+
+    Parameters
+    ----------
+    event : dict
+        As returned by random_event.
+
+    geometry : I3Geometry
+        As returned by make_geometry.
+
+    event_id : int
+
+    partitions : int
+        The number of MPEFit0...MPEFitN partition fits to add.
+
+    pulses_name : str
+        The key of the pulse series.
+
+    real_frame : bool
+        If True, build an icetray.I3Frame with a real pulse series mask (eg.
+        for the mask mode of om_partition). Otherwise use a SyntheticFrame.
+
+    Returns
+    -------
+    SyntheticFrame or I3Frame
+    """
+
+    from icecube import dataclasses, icetray
+
+    strings, oms, positions = dom_positions()
+
+    pulse_series = dataclasses.I3RecoPulseSeriesMap()
+    for i, dom in enumerate(event['hit_doms']):
+        pulse_vector = dataclasses.I3RecoPulseSeries()
+        for j in range(event['offsets'][i], event['offsets'][i + 1]):
+            pulse = dataclasses.I3RecoPulse()
+            pulse.time = event['times'][j]
+            pulse.charge = event['charges'][j]
+            pulse_vector.append(pulse)
+        pulse_series[icetray.OMKey(int(strings[dom]), int(oms[dom]))] = pulse_vector
+
+    header = dataclasses.I3EventHeader()
+    header.run_id = 1
+    header.event_id = event_id
+    header.sub_event_stream = 'in_ice'
+
+    if real_frame:
+        frame = icetray.I3Frame(icetray.I3Frame.Physics)
+        frame['SyntheticPulses'] = pulse_series
+        frame[pulses_name] = dataclasses.I3RecoPulseSeriesMapMask(frame, 'SyntheticPulses')
+        frame['TWOfflinePulsesHLC'] = dataclasses.I3RecoPulseSeriesMapMask(frame, 'SyntheticPulses')
+    else:
+        frame = SyntheticFrame()
+        frame[pulses_name] = SyntheticMask(pulse_series)
+        frame['TWOfflinePulsesHLC'] = SyntheticMask(pulse_series)
+
+    frame['I3EventHeader'] = header
+    frame['I3Geometry'] = geometry
+
+    track = event['track']
+    frame['RecoEndpoint'] = dataclasses.I3Position(*track['endpoint'])
+    frame['MPEFit'] = make_particle(track)
+    for partition in range(partitions):
+        frame['MPEFit{}'.format(partition)] = make_particle(track, shift=2.0 * (partition - partitions // 2))
+
+    return frame
@@ -0,0 +1,159 @@
+"""
+Sidecar cache of the cut masks of the columnar data.
+
+Each cut (key, function and value) only depends on the data, so its mask for
+an input file never changes. The BitmapCache saves the event and dom cut
+masks of a column file in an SQLite database next to it, as zlib compressed
+bit arrays, keyed by a hash of the file contents and a description of the
+cut. When the data is cut again (eg. with one cut tightened), the masks of the
+cuts already made are read from the cache, and only the new cuts are made.
+The cut columns are then not read from the file at all.
+
+Cuts made with a function that has no importable name (eg. a lambda) can't
+be told apart, so they are never cached.
+"""
+
+from __future__ import print_function, division  # 2to3
+
+import hashlib
+import os
+import sqlite3
+import zlib
+
+import numpy as np
+
+
+def cache_path(datafile):
+    """
+    Return the path of the cache for a column file.
+    """
+
+    return datafile + '.cuts.sqlite'
+
+
+def cut_key(key, function, value):
+    """
+    Return a description of the cut that is the same every time it is made,
+    eg. 'DistToBorder _operator.gt 50', or None if the cut can't be cached.
+    """
+
+    name = getattr(function, '__name__', None)
+    module = getattr(function, '__module__', None)
+    if name is None or module is None or name.startswith('<'):
+        return None
+
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+
+    return '{} {}.{} {!r}'.format(key, module, name, value)
+
+
+def content_hash(path, block_size=1 << 20):
+    """
+    Return the SHA-1 hash of the contents of a file.
+    """
+
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as infile:
+        block = infile.read(block_size)
+        while block:
+            sha1.update(block)
+            block = infile.read(block_size)
+
+    return sha1.hexdigest()
+
+
+def pack_mask(mask):
+    return zlib.compress(np.packbits(mask).tobytes())
+
+
+def unpack_mask(data, length):
+    return np.unpackbits(np.frombuffer(zlib.decompress(data), dtype=np.uint8))[:length].astype(bool)
+
+
+class BitmapCache(object):
+    """
+    Cache of the cut masks of a column file.
+
+    Parameters
+    ----------
+    datafile : str
+        The column file.
+
+    Attributes
+    ----------
+    hits : int
+        The number of masks read from the cache.
+
+    misses : int
+        The number of masks that weren't in the cache.
+    """
+
+    def __init__(self, datafile):
+        self.hits = 0
+        self.misses = 0
+
+        self.connection = sqlite3.connect(cache_path(datafile))
+        self.connection.execute('CREATE TABLE IF NOT EXISTS files '
+                                '(size INTEGER, mtime REAL, hash TEXT)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS bitmaps '
+                                '(hash TEXT, level TEXT, cut TEXT, start INTEGER, length INTEGER, data BLOB, '
+                                'PRIMARY KEY (hash, level, cut, start, length))')
+
+        self.file_hash = self.find_hash(datafile)
+
+    def find_hash(self, datafile):
+        """
+        Return the hash of the file contents. Hashing means reading the whole
+        file, so the hash is saved with the size and modification time of the
+        file, and only found again if they change.
+        """
+
+        size = os.path.getsize(datafile)
+        mtime = os.path.getmtime(datafile)
+
+        row = self.connection.execute('SELECT hash FROM files WHERE size = ? AND mtime = ?',
+                                      (size, mtime)).fetchone()
+        if row is not None:
+            return row[0]
+
+        file_hash = content_hash(datafile)
+
+        # The masks of an old version of the file are no use any more.
+        self.connection.execute('DELETE FROM bitmaps WHERE hash != ?', (file_hash,))
+        self.connection.execute('DELETE FROM files')
+        self.connection.execute('INSERT INTO files VALUES (?, ?, ?)', (size, mtime, file_hash))
+        self.connection.commit()
+
+        return file_hash
+
+    def lookup(self, level, cut, start, length):
+        """
+        Return the cached mask of rows [start, start + length) of the event
+        (level='event') or dom (level='dom') columns, or None if it isn't in
+        the cache.
+        """
+
+        row = self.connection.execute('SELECT data FROM bitmaps WHERE hash = ? AND level = ? AND cut = ? '
+                                      'AND start = ? AND length = ?',
+                                      (self.file_hash, level, cut, start, length)).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+
+        return unpack_mask(row[0], length)
+
+    def store(self, level, cut, start, mask):
+        """
+        Save the mask of rows [start, start + len(mask)) to the cache.
+        """
+
+        self.connection.execute('INSERT OR REPLACE INTO bitmaps VALUES (?, ?, ?, ?, ?, ?)',
+                                (self.file_hash, level, cut, start, len(mask), sqlite3.Binary(pack_mask(mask))))
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,501 @@
+"""
+Vectorized cuts on the columnar output of process.py.
+
+process.py --columns saves the cut variables and per-DOM data of the events as
+plain columns (see columns.py in the process directory). Instead of reading the
+processed I3 files frame by frame, the columnar mode of cut.py reads these
+columns a chunk of events at a time, and makes each event cut on the whole
+chunk at once. The per-DOM data of a chunk is kept as one flat array per key
+plus the offsets of each event, so the dom cuts are also made on all the DOMs
+of the chunk at once. The cuts are given in the usual cut_options format: each
+(function, value) is called on the array of values, and if the function
+doesn't work on arrays it is called on each value in turn.
+
+The output HDF5 file has the same layout as the one written by I3TableWriter:
+a table for each key with Run, Event, SubEvent, SubEventStream and exists
+columns, plus 'value' for the scalars, 'vector_index' and 'item' for the
+per-DOM vectors, or the position/fit parameters, and the start and stop rows
+of each event in /__I3Index__.
+"""
+
+from __future__ import print_function, division  # 2to3
+
+import numpy as np
+import tables
+
+from bitmaps import BitmapCache, cut_key
+
+# The per-event columns that are the parameters of an object (eg. MPEFit_zenith),
+# and the table they are written to.
+object_prefixes = ['RecoEndpoint', 'MPEFit', 'FiniteRecoFit']
+
+# The event ID columns
+id_columns = ['Run', 'Event', 'SubEvent']
+
+
+class ChunkColumns(object):
+    """
+    The rows [start, stop) of the columns in a group of the columnar output.
+
+    It is used like a dict of the column arrays, but each column is only read
+    from the file the first time it is used (eg. the columns of cuts whose
+    masks are cached are never read).
+    """
+
+    def __init__(self, group, start, stop, exclude=()):
+        self.arrays = dict((array.name, array) for array in group if array.name not in exclude)
+        self.start = start
+        self.stop = stop
+        self.data = {}
+
+    def __getitem__(self, key):
+        if key not in self.data:
+            self.data[key] = self.arrays[key][self.start:self.stop]
+        return self.data[key]
+
+    def __contains__(self, key):
+        return key in self.arrays
+
+    def __iter__(self):
+        return iter(sorted(self.arrays))
+
+    def keys(self):
+        return sorted(self.arrays)
+
+
+def read_chunks(path, chunk_size=100000):
+    """
+    Read the columnar output of process.py a chunk of events at a time.
+
+    Parameters
+    ----------
+    path : str
+        The HDF5 file written by process.py --columns.
+
+    chunk_size : int
+        The number of events in each chunk.
+
+    Yields
+    ------
+    events : ChunkColumns
+        The per-event columns of the events in the chunk.
+
+    dom_offsets : np.ndarray
+        The per-DOM data of the ith event in the chunk is in rows
+        dom_offsets[i]:dom_offsets[i + 1] of the doms.
+
+    doms : ChunkColumns
+        The per-DOM columns of the events in the chunk.
+    """
+
+    infile = tables.open_file(path)
+
+    try:
+        num_events = infile.root.events.dom_offsets.nrows - 1
+
+        for start in range(0, num_events, chunk_size):
+            stop = min(start + chunk_size, num_events)
+
+            events = ChunkColumns(infile.root.events, start, stop, exclude=['dom_offsets'])
+
+            dom_offsets = infile.root.events.dom_offsets[start:stop + 1]
+            doms = ChunkColumns(infile.root.doms, dom_offsets[0], dom_offsets[-1])
+
+            yield events, dom_offsets - dom_offsets[0], doms
+    finally:
+        infile.close()
+
+
+def cut_mask(data, function, value):
+    """
+    Make a cut on an array of values.
+
+    Parameters
+    ----------
+    data : np.ndarray
+
+    function, value
+        The cut, eg. (operator.gt, 5). function(data, value) is used if it
+        gives a boolean for each value, otherwise function is called on each
+        value in turn.
+
+    Returns
+    -------
+    np.ndarray of bool
+        Which values pass the cut.
+    """
+
+    try:
+        mask = np.asarray(function(data, value))
+    except Exception:
+        mask = None
+
+    if mask is None or mask.shape != data.shape:
+        mask = np.array([bool(function(x, value)) for x in data], dtype=bool)
+
+    return mask.astype(bool)
+
+
+def event_cut_mask(events, event_cuts):
+    """
+    Make the event cuts on a chunk of events.
+
+    Parameters
+    ----------
+    events : dict[str] -> np.ndarray
+        The per-event columns.
+
+    event_cuts : dict[str] -> tuple
+        The event cuts, eg. event_cuts['NDirDoms'] = (operator.gt, 5).
+
+    Returns
+    -------
+    np.ndarray of bool
+        Which events pass all the cuts.
+    """
+
+    num_events = len(events['Event'])
+    pass_cut = np.ones(num_events, dtype=bool)
+
+    for key, (function, value) in event_cuts.items():
+        if key not in events:
+            raise KeyError('{} is not in the columnar output (it has {})'.format(key, ', '.join(sorted(events))))
+
+        pass_cut &= cut_mask(events[key], function, value)
+
+    return pass_cut
+
+
+class CutMasks(object):
+    """
+    The masks of the cuts made on a chunk of data.
+
+    Each (key, function, value) is only cut once per chunk, however many
+    times it is asked for (eg. by the variants of a sweep). With a
+    BitmapCache, the masks are also read from (and saved to) the cache.
+
+    Parameters
+    ----------
+    data : dict[str] -> np.ndarray or ChunkColumns
+        The columns of the chunk.
+
+    num_rows : int
+        The number of rows in the chunk.
+
+    cache : BitmapCache or None
+
+    level : str
+        'event' or 'dom' (the columns the data is from, for the cache).
+
+    start : int
+        The row of the file the chunk starts at (for the cache).
+    """
+
+    def __init__(self, data, num_rows, cache=None, level='event', start=0):
+        self.data = data
+        self.num_rows = int(num_rows)
+        self.cache = cache
+        self.level = level
+        self.start = int(start)
+        self.masks = {}
+
+    def cut(self, key, function, value):
+        """
+        Return the mask of the data that pass the cut.
+        """
+
+        # The values can be lists (eg. the strings), so they are compared by
+        # their repr.
+        cut = (key, function, repr(value))
+        if cut in self.masks:
+            return self.masks[cut]
+
+        name = None
+        mask = None
+        if self.cache is not None:
+            name = cut_key(key, function, value)
+            if name is not None:
+                mask = self.cache.lookup(self.level, name, self.start, self.num_rows)
+
+        if mask is None:
+            if key not in self.data:
+                raise KeyError('{} is not in the columnar output (it has {})'.format(
+                    key, ', '.join(sorted(self.data))))
+            mask = cut_mask(self.data[key], function, value)
+
+            if name is not None:
+                self.cache.store(self.level, name, self.start, mask)
+
+        self.masks[cut] = mask
+
+        return mask
+
+    def mask(self, cuts):
+        """
+        Return the mask of the data that pass all the cuts.
+        """
+
+        pass_cut = np.ones(self.num_rows, dtype=bool)
+
+        for key, (function, value) in cuts.items():
+            pass_cut &= self.cut(key, function, value)
+
+        return pass_cut
+
+
+def event_dom_rows(dom_offsets, event_indices):
+    """
+    Return the rows of the per-DOM data of some events.
+
+    Parameters
+    ----------
+    dom_offsets : np.ndarray of int
+        The per-DOM data of the ith event is in rows
+        dom_offsets[i]:dom_offsets[i + 1].
+
+    event_indices : np.ndarray of int
+        The events, in increasing order.
+
+    Returns
+    -------
+    rows : np.ndarray of int
+        The rows of all the DOMs of the events, in order.
+
+    counts : np.ndarray of int
+        The number of DOMs of each event.
+    """
+
+    counts = np.diff(dom_offsets)
+
+    selected = np.zeros(len(counts), dtype=bool)
+    selected[event_indices] = True
+
+    return np.flatnonzero(np.repeat(selected, counts)), counts[event_indices]
+
+
+def dom_cut_mask(doms, dom_cuts, rows):
+    """
+    Make the dom cuts on the given rows of the per-DOM data.
+
+    All the DOMs of a chunk are cut at once, so each cut is made once per
+    chunk rather than once per event.
+
+    Returns
+    -------
+    np.ndarray of bool
+        Which of the rows pass all the dom cuts.
+    """
+
+    pass_cut = np.ones(len(rows), dtype=bool)
+
+    for key, (function, value) in dom_cuts.items():
+        pass_cut &= cut_mask(doms[key][rows], function, value)
+
+    return pass_cut
+
+
+def ragged_counts(mask, counts):
+    """
+    Return the number of True values of the mask in each event, where the
+    ith event has the next counts[i] values of the mask.
+    """
+
+    passed = np.concatenate(([0], np.cumsum(mask)))
+    ends = np.concatenate(([0], np.cumsum(counts)))
+
+    return np.diff(passed[ends])
+
+
+class TableWriter(object):
+    """
+    Write tables in the layout of the I3TableWriter HDF5 output.
+
+    Parameters
+    ----------
+    path : str
+        The HDF5 file.
+    """
+
+    def __init__(self, path):
+        self.file = tables.open_file(path, 'w')
+        self.index = self.file.create_group('/', '__I3Index__')
+        self.filters = tables.Filters(complevel=6, complib='zlib')
+
+    def _table(self, where, name, fields):
+        if name in where:
+            return where._f_get_child(name)
+
+        dtype = [('Run', np.uint32), ('Event', np.uint32), ('SubEvent', np.uint32),
+                 ('SubEventStream', np.uint32), ('exists', np.uint8)] + fields
+
+        return self.file.create_table(where, name, np.dtype(dtype), filters=self.filters)
+
+    def append(self, name, ids, fields, counts=None):
+        """
+        Append the rows of some events to a table.
+
+        Parameters
+        ----------
+        name : str
+            The name of the table (the frame key).
+
+        ids : tuple of np.ndarray
+            The Run, Event and SubEvent of each event.
+
+        fields : list of tuples
+            The (column, values) of the table. There is one value for each
+            event, or for vectors, counts[i] values for the ith event.
+
+        counts : np.ndarray of int or None
+            The number of rows of each event (for vectors). Each vector row
+            also gets its vector_index.
+        """
+
+        num_events = len(ids[0])
+        if counts is None:
+            row_counts = np.ones(num_events, dtype=int)
+        else:
+            row_counts = np.asarray(counts, dtype=int)
+            vector_start = np.cumsum(row_counts) - row_counts
+            vector_index = np.arange(row_counts.sum()) - np.repeat(vector_start, row_counts)
+            fields = [('vector_index', vector_index)] + list(fields)
+
+        table = self._table(self.file.root, name, [(column, np.asarray(values).dtype) for column, values in fields])
+        index = self._table(self.index, name, [('start', np.uint64), ('stop', np.uint64)])
+
+        rows = np.zeros(row_counts.sum(), dtype=table.dtype)
+        for column, event_ids in zip(id_columns, ids):
+            rows[column] = np.repeat(event_ids, row_counts)
+        rows['exists'] = 1
+        for column, values in fields:
+            rows[column] = values
+
+        index_rows = np.zeros(num_events, dtype=index.dtype)
+        for column, event_ids in zip(id_columns, ids):
+            index_rows[column] = event_ids
+        index_rows['exists'] = 1
+        index_rows['stop'] = table.nrows + np.cumsum(row_counts)
+        index_rows['start'] = index_rows['stop'] - row_counts
+
+        table.append(rows)
+        index.append(index_rows)
+
+    def close(self):
+        self.file.close()
+
+
+def write_events(writer, events, event_indices, doms, dom_keys, rows, counts, pass_cut):
+    """
+    Write the data of the events that passed the cuts to the tables.
+
+    Parameters
+    ----------
+    writer : TableWriter
+
+    events, doms
+        A chunk from read_chunks.
+
+    event_indices : np.ndarray of int
+        The events (in the chunk) that passed the event cuts.
+
+    dom_keys : list of str
+        The per-DOM keys to write (with and without the dom cuts).
+
+    rows, counts
+        The DOM rows of the events, and the number for each event, from
+        event_dom_rows.
+
+    pass_cut : np.ndarray of bool
+        Which of the rows passed the dom cuts, from dom_cut_mask.
+    """
+
+    ids = tuple(events[column][event_indices] for column in id_columns)
+
+    objects = {}
+    for column in events:
+        if column in id_columns:
+            continue
+
+        prefix, _, param = column.partition('_')
+        if prefix in object_prefixes and param:
+            objects.setdefault(prefix, []).append((param, events[column][event_indices]))
+        else:
+            writer.append(column, ids, [('value', events[column][event_indices])])
+
+    for prefix in object_prefixes:
+        if prefix in objects:
+            writer.append(prefix, ids, objects[prefix])
+
+    # All the DOMs of the events, and the ones that passed the dom cuts.
+    cut_rows = rows[pass_cut]
+    cut_counts = ragged_counts(pass_cut, counts)
+
+    for key in dom_keys:
+        writer.append(key, ids, [('item', doms[key][rows])], counts=counts)
+        writer.append(key + 'Cut', ids, [('item', doms[key][cut_rows])], counts=cut_counts)
+
+
+def cut_columns(datafiles, ofile, event_cuts, dom_cuts, dom_keys, chunk_size=100000, cut_cache=False):
+    """
+    Make the event and dom cuts on the columnar output of process.py, and
+    write the events that pass to an HDF5 file.
+
+    Parameters
+    ----------
+    datafiles : list of str
+        The columnar output files of process.py.
+
+    ofile : str
+        The output HDF5 file.
+
+    event_cuts, dom_cuts, dom_keys
+        As in cut_options.py.
+
+    chunk_size : int
+        The number of events to cut at once.
+
+    cut_cache : bool
+        If True, read the cut masks from (and save them to) the BitmapCache
+        of each data file.
+
+    Returns
+    -------
+    num_events, num_passed : int
+        The number of events read, and the number that passed the event cuts.
+    """
+
+    writer = TableWriter(ofile)
+
+    num_events = 0
+    num_passed = 0
+
+    for path in datafiles:
+        cache = BitmapCache(path) if cut_cache else None
+
+        for events, dom_offsets, doms in read_chunks(path, chunk_size):
+            if cache is None:
+                event_indices = np.flatnonzero(event_cut_mask(events, event_cuts))
+                rows, counts = event_dom_rows(dom_offsets, event_indices)
+                pass_cut = dom_cut_mask(doms, dom_cuts, rows)
+            else:
+                # The cached masks are of all the DOMs in the chunk, not only
+                # the ones of the events that pass.
+                event_masks = CutMasks(events, len(dom_offsets) - 1, cache, 'event', events.start)
+                dom_masks = CutMasks(doms, dom_offsets[-1], cache, 'dom', doms.start)
+
+                event_indices = np.flatnonzero(event_masks.mask(event_cuts))
+                rows, counts = event_dom_rows(dom_offsets, event_indices)
+                pass_cut = dom_masks.mask(dom_cuts)[rows]
+
+            write_events(writer, events, event_indices, doms, dom_keys, rows, counts, pass_cut)
+
+            num_events += len(dom_offsets) - 1
+            num_passed += len(event_indices)
+
+        if cache is not None:
+            print('{}: {} of {} cut masks read from the cache'.format(path, cache.hits, cache.hits + cache.misses))
+            cache.close()
+
+    writer.close()
+
+    return num_events, num_passed
@@ -6,12 +6,22 @@ Script for making event and DOM cuts.
 The cuts to make are specified in a file called "cut_options.py". The directory
 containing this file needs to be added to the PYTHONPATH in order for this file
 to find and import it. See example in the current directory for an example.
+
+With --columnar, the data files are the columnar output of process.py
+(--columns) instead of I3 files, and the cuts are made on whole chunks of
+events at once (see columnar.py). With --sweep as well, the variants of the
+cuts in "sweep_options.py" (also on the PYTHONPATH) are all made in one pass
+over the data, and a summary of each is saved to the output file (see
+sweep.py). With --jobs, the data files are cut by a pool of worker processes
+and the outputs merged in the order of the data files (see parallel.py).
 """
 
 from __future__ import print_function, division  # 2to3
 
 import argparse
 import math
+import os
+import sys
 
 import I3Tray
 from icecube import icetray, dataclasses, dataio
@@ -19,25 +29,43 @@ from icecube.hdfwriter import I3HDFTableService
 from icecube.rootwriter import I3ROOTTableService
 from icecube.tableio import I3TableWriter
 
+from columnar import cut_columns, TableWriter
 from functions import make_event_cuts, make_dom_cuts, write_cut_metadata
+from parallel import cut_parallel
+
+# The cut options use the detector regions defined in the process directory.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'process'))
+
 from cut_options import event_cuts, dom_cuts, dom_keys
+from progress import Progress, ProgressModule
 
 
-def main():
+def cut_i3(datafiles, ofile, root=False, progress=None):
+    """
+    Make the cuts on processed I3 files, and write the frames that pass to a
+    table file.
 
-    parser = argparse.ArgumentParser(description='script for making event and DOM cuts')
-    parser.add_argument('-d', '--datafiles', help='data files to make the cuts on',
-                        nargs='+', required=True)
-    parser.add_argument('-o', '--ofile', help='name of output file',
-                        required=True)
-    parser.add_argument('--root', help='write output to ROOT file instead',
-                        action='store_true')
-    args = parser.parse_args()
+    Parameters
+    ----------
+    datafiles : list of str
+
+    ofile : str
+
+    root : bool
+        Write a ROOT file instead of an HDF5 file.
+
+    progress : Progress or None
+    """
 
     tray = I3Tray.I3Tray()
 
     tray.AddModule('I3Reader', 'I3Reader',
-                   Filenamelist=args.datafiles)
+                   Filenamelist=datafiles)
+
+    if progress is not None:
+        tray.AddModule(ProgressModule, 'progress_read',
+                       Progress=progress,
+                       Count='read')
 
     # Cut out the frames that do not pass the event cuts.
     tray.AddModule(make_event_cuts, 'make_event_cuts',
@@ -49,11 +77,16 @@ def main():
                    dom_cuts=dom_cuts,
                    dom_keys=dom_keys)
 
+    if progress is not None:
+        tray.AddModule(ProgressModule, 'progress_passed',
+                       Progress=progress,
+                       Count='passed')
+
     # Get the appropriate output file service
-    if args.root:
-        ofile_service = I3ROOTTableService(args.ofile)
+    if root:
+        ofile_service = I3ROOTTableService(ofile)
     else:
-        ofile_service = I3HDFTableService(args.ofile)
+        ofile_service = I3HDFTableService(ofile)
 
     tray.AddModule(I3TableWriter, 'I3TableWriter',
                    TableService=ofile_service,
@@ -63,6 +96,121 @@ def main():
     tray.Execute()
     tray.Finish()
 
+
+def cut_part(task):
+    """
+    Cut one data file to a partial HDF5 file (the worker of --jobs).
+
+    Parameters
+    ----------
+    task : tuple
+        The data file, the partial file, and the columnar, chunk_size and
+        cut_cache arguments.
+
+    Returns
+    -------
+    str
+        The partial file.
+    """
+
+    datafile, part_file, columnar, chunk_size, cut_cache = task
+
+    if columnar:
+        cut_columns([datafile], part_file, event_cuts, dom_cuts, dom_keys, chunk_size, cut_cache)
+    else:
+        cut_i3([datafile], part_file)
+
+    return part_file
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='script for making event and DOM cuts')
+    parser.add_argument('-d', '--datafiles', help='data files to make the cuts on',
+                        nargs='+', required=True)
+    parser.add_argument('-o', '--ofile', help='name of output file',
+                        required=True)
+    parser.add_argument('--root', help='write output to ROOT file instead',
+                        action='store_true')
+    parser.add_argument('--progress', help='report the progress every this many seconds',
+                        type=float)
+    parser.add_argument('--status-file', help='also save the progress reports to this JSON file (needs --progress)')
+    parser.add_argument('--columnar', help='the data files are the columnar output of process.py (--columns)',
+                        action='store_true')
+    parser.add_argument('--chunk-size', help='number of events to cut at once with --columnar',
+                        type=int, default=100000)
+    parser.add_argument('--sweep', help='make the variants of the cuts in sweep_options.py, and save their '
+                        'summaries to the output (JSON) file (needs --columnar)',
+                        action='store_true')
+    parser.add_argument('--write', help='also write the HDF5 output of these variants (by number) of the sweep',
+                        nargs='+', type=int, default=[])
+    parser.add_argument('--cut-cache', help='cache the cut masks of each data file next to it, and reuse them '
+                        '(needs --columnar)',
+                        action='store_true')
+    parser.add_argument('-j', '--jobs', help='number of data files to cut in parallel',
+                        type=int, default=1)
+    args = parser.parse_args()
+
+    if args.cut_cache and not args.columnar:
+        parser.error('--cut-cache needs --columnar')
+
+    if args.sweep:
+        if not args.columnar:
+            parser.error('--sweep needs --columnar')
+        if args.jobs > 1:
+            parser.error('--sweep can not be used with --jobs')
+
+        # Only needed for sweeps.
+        from sweep import sweep, save_summaries
+        from sweep_options import variants
+
+        # The full output of the variants goes next to the summary.
+        ofiles = {}
+        writers = {}
+        for i in args.write:
+            ofiles[variants[i]['name']] = '{}.variant{:03d}.h5'.format(os.path.splitext(args.ofile)[0], i)
+            writers[variants[i]['name']] = TableWriter(ofiles[variants[i]['name']])
+
+        summaries = sweep(args.datafiles, variants, dom_keys, writers, args.chunk_size, args.cut_cache)
+        save_summaries(args.ofile, summaries)
+
+        for i in args.write:
+            writers[variants[i]['name']].close()
+            write_cut_metadata(ofiles[variants[i]['name']], variants[i]['event_cuts'], variants[i]['dom_cuts'])
+        return
+
+    if args.jobs > 1:
+        if args.root:
+            parser.error('--jobs can only write an HDF5 file')
+        if args.progress:
+            parser.error('--progress can not be used with --jobs')
+
+        cut_parallel(cut_part, args.datafiles, args.ofile, args.jobs,
+                     args.columnar, args.chunk_size, args.cut_cache)
+
+        write_cut_metadata(args.ofile, event_cuts, dom_cuts)
+        return
+
+    if args.columnar:
+        if args.root:
+            parser.error('--columnar can only write an HDF5 file')
+
+        num_events, num_passed = cut_columns(args.datafiles, args.ofile, event_cuts, dom_cuts, dom_keys,
+                                             args.chunk_size, args.cut_cache)
+        print('{} of {} events passed the event cuts'.format(num_passed, num_events))
+
+        write_cut_metadata(args.ofile, event_cuts, dom_cuts)
+        return
+
+    progress = None
+    if args.progress:
+        progress = Progress(args.datafiles, args.progress, args.status_file)
+
+    cut_i3(args.datafiles, args.ofile, args.root, progress)
+
+    if progress is not None:
+        progress.report(done=True)
+
     if not args.root:
         # Write the cuts to the HDF5 as metadata (so we know for later).
         write_cut_metadata(args.ofile, event_cuts, dom_cuts)
@@ -15,8 +15,8 @@ import operator as op
 
 import numpy as np
 
-IC_strings = [26, 27, 37, 46, 45, 35, 17, 18, 19, 28, 38, 47, 56, 55, 54, 44, 34, 25]
-DC_strings = [81, 82, 83, 84, 85, 86]
+# The analysis strings are defined in regions.py in the process directory.
+from regions import IC_strings, DC_strings
 
 # The event cuts to make. Change these as much as you like.
 event_cuts = {}
@@ -65,30 +65,27 @@ def make_dom_cuts(frame, dom_cuts, dom_keys):
         The cut DOM data. This is done for all the keys in dom_keys.
     """
 
+    # Convert the dom data to arrays once, for both the cuts and the output.
+    data = {}
+    for key in list(dom_cuts) + list(dom_keys):
+        if key not in data:
+            data[key] = np.array(frame[key])
+
     # pass_cut is a boolean array that records which data passes the
     # dom cuts. We need to initialize it to an array the same length as the dom
     # data (in this case using 'String', but it doesn't matter). We need to
     # explicitly say "dtype=bool" in the case that len(frame['String']) == 0.
-    pass_cut = np.array([True] * len(frame['String']), dtype=bool)
+    pass_cut = np.ones(len(frame['String']), dtype=bool)
 
     # Iterate over the data and make the cuts.
     for key, (function, value) in dom_cuts.items():
-        data = np.array(frame[key])
-
         # Update pass_cut for the events that pass the cut.
-        pass_cut &= function(data, value)
+        pass_cut &= function(data[key], value)
 
-    # Iterate over the dom keys we want to keep and make the cut.
+    # Iterate over the dom keys we want to keep, make the cut, and put it
+    # back in the frame.
     for key in dom_keys:
-
-        # Get the data.
-        data = np.array(frame[key])
-
-        # Make the cut.
-        pass_cut_data = data[pass_cut]
-
-        # Put it back in the frame.
-        frame[key + 'Cut'] = dataclasses.I3VectorDouble(pass_cut_data)
+        frame[key + 'Cut'] = dataclasses.I3VectorDouble(data[key][pass_cut])
 
 
 def write_cut_metadata(ofile, event_cuts, dom_cuts):
@@ -0,0 +1,143 @@
+"""
+Cutting many data files in parallel.
+
+Each data file is cut by a worker process to its own partial HDF5 file, and
+the partial files are then merged into the output file in the order of the
+data files. So the output is the same as cutting all the files in one
+process, whatever the number of workers.
+
+The partial files have the layout of the I3TableWriter output: a table for
+each key, and in /__I3Index__ the start and stop rows of each event in it.
+When a partial file is merged, its table rows are appended to the tables of
+the output, and its index rows are shifted by the number of rows already in
+the table.
+"""
+
+from __future__ import print_function, division  # 2to3
+
+import multiprocessing
+import os
+import shutil
+
+import tables
+
+# The group of the index tables
+index_group = '__I3Index__'
+
+
+def part_path(ofile, index):
+    """
+    Return the path of the partial output file of the data file with the
+    given index.
+    """
+
+    return '{}.part{:04d}.h5'.format(ofile, index)
+
+
+def merge_part(outfile, part_file):
+    """
+    Append the tables of a partial file to the output file.
+
+    Parameters
+    ----------
+    outfile : tables.File
+        The output file (open for appending).
+
+    part_file : str
+        The partial file.
+    """
+
+    part = tables.open_file(part_file)
+
+    try:
+        if index_group not in outfile.root:
+            outfile.create_group('/', index_group)
+        out_index = outfile.root._f_get_child(index_group)
+
+        data_tables = [table for table in part.walk_nodes('/', 'Table')
+                       if table._v_parent._v_name != index_group]
+        index_tables = [table for table in part.walk_nodes('/', 'Table')
+                        if table._v_parent._v_name == index_group]
+
+        # The number of rows of each table before this part.
+        offsets = {}
+        for table in data_tables:
+            if table.name in outfile.root:
+                out_table = outfile.root._f_get_child(table.name)
+                offsets[table.name] = out_table.nrows
+                out_table.append(table.read())
+            else:
+                offsets[table.name] = 0
+                table._f_copy(outfile.root)
+
+        for table in index_tables:
+            rows = table.read()
+
+            # The index columns are unsigned, and adding a signed offset
+            # would make floats of them.
+            offset = offsets.get(table.name, 0)
+            rows['start'] += rows.dtype['start'].type(offset)
+            rows['stop'] += rows.dtype['stop'].type(offset)
+
+            if table.name in out_index:
+                out_index._f_get_child(table.name).append(rows)
+            else:
+                out_table = table._f_copy(out_index)
+                out_table.modify_columns(columns=[rows['start'], rows['stop']], names=['start', 'stop'])
+    finally:
+        part.close()
+
+
+def merge_parts(part_files, ofile):
+    """
+    Merge the partial files, in order, into the output file, then remove them.
+
+    The first partial file is copied as a whole (so the output keeps all its
+    attributes), and the rest are appended to it.
+    """
+
+    shutil.copyfile(part_files[0], ofile)
+
+    outfile = tables.open_file(ofile, 'a')
+    try:
+        for part_file in part_files[1:]:
+            merge_part(outfile, part_file)
+    finally:
+        outfile.close()
+
+    for part_file in part_files:
+        os.remove(part_file)
+
+
+def cut_parallel(cut_part, datafiles, ofile, jobs, *args):
+    """
+    Cut each data file to its own partial file with a pool of workers, and
+    merge the partial files into the output file.
+
+    Parameters
+    ----------
+    cut_part : callable
+        The worker. It is called with a tuple of the data file, the partial
+        file to write, and args.
+
+    datafiles : list of str
+
+    ofile : str
+        The merged output file.
+
+    jobs : int
+        The number of worker processes.
+    """
+
+    tasks = [(datafile, part_path(ofile, i)) + args for i, datafile in enumerate(datafiles)]
+
+    pool = multiprocessing.Pool(jobs)
+    try:
+        # The files are cut in any order, but the results come back in the
+        # order of the data files.
+        part_files = list(pool.imap(cut_part, tasks))
+    finally:
+        pool.close()
+        pool.join()
+
+    merge_parts(part_files, ofile)
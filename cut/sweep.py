@@ -0,0 +1,259 @@
+"""
+Cut sweeps: make many variants of the cuts in one pass over the data.
+
+To optimize the cuts, many variants of event_cuts and dom_cuts are tried. Most
+of the variants share most of their cuts, so instead of cutting the data once
+for each variant, each distinct cut (key, function and value) is made once on
+each chunk of the columnar data, and the masks are combined for each variant.
+
+For each variant the number of events and DOMs that pass is counted, and the
+charges of the DOMs that pass are summed in the distance bins used by
+plot/interpolation.py, so the mean charge and error of each bin (as in
+calc_charge_info) can be found without writing the DOMs out. The full HDF5
+output can also be written for some of the variants.
+
+The variants are given in a file called "sweep_options.py" on the PYTHONPATH,
+which defines a list called variants. Each variant is a dict with a 'name',
+and its 'event_cuts' and 'dom_cuts' in the cut_options format. grid() makes
+the variants for all the combinations of some cut values. See
+sweep_options_example.py.
+"""
+
+from __future__ import print_function, division  # 2to3
+
+import itertools
+import json
+
+import numpy as np
+
+from bitmaps import BitmapCache
+from columnar import read_chunks, event_dom_rows, write_events, CutMasks
+
+# The distance bins of the charges (m), the same as dist_bin_split in
+# plot/interpolation.py.
+bin_width = 20
+max_dist = 140
+
+
+def cut_label(key, function, value):
+    """
+    Return a short label for a cut, eg. 'DistToBorder gt 50'.
+    """
+
+    return '{} {} {}'.format(key, getattr(function, '__name__', function), value)
+
+
+def grid(event_cuts, dom_cuts, event_grid=None, dom_grid=None):
+    """
+    Return the variants of the cuts for all the combinations of the cuts in
+    the grids.
+
+    Parameters
+    ----------
+    event_cuts, dom_cuts : dict[str] -> tuple
+        The cuts shared by all the variants.
+
+    event_grid, dom_grid : dict[str] -> list of tuples
+        The (function, value) cuts to try for each key. They replace the cut
+        on the key in event_cuts (or dom_cuts). Ex.
+        event_grid['DistToBorder'] = [(operator.gt, 50), (operator.gt, 60)]
+
+    Returns
+    -------
+    list of dict
+        The variants. Each is named after its cuts from the grid.
+    """
+
+    event_grid = event_grid or {}
+    dom_grid = dom_grid or {}
+
+    event_keys = sorted(event_grid)
+    dom_keys = sorted(dom_grid)
+
+    variants = []
+    for combination in itertools.product(*([event_grid[key] for key in event_keys] +
+                                           [dom_grid[key] for key in dom_keys])):
+        variant_event_cuts = dict(event_cuts)
+        variant_dom_cuts = dict(dom_cuts)
+        labels = []
+
+        for i, (key, cut) in enumerate(zip(event_keys + dom_keys, combination)):
+            if i < len(event_keys):
+                variant_event_cuts[key] = cut
+            else:
+                variant_dom_cuts[key] = cut
+            labels.append(cut_label(key, *cut))
+
+        variants.append({'name': ', '.join(labels) or 'base',
+                         'event_cuts': variant_event_cuts, 'dom_cuts': variant_dom_cuts})
+
+    return variants
+
+
+class VariantSummary(object):
+    """
+    The number of events and DOMs that pass the cuts of a variant, and the
+    sums of the DOM charges in each distance bin.
+    """
+
+    def __init__(self, variant):
+        self.variant = variant
+        self.num_events = 0
+        self.events_passed = 0
+        self.doms_passed = 0
+
+        num_bins = max_dist // bin_width
+        self.num_doms = np.zeros(num_bins)
+        self.charge_sum = np.zeros(num_bins)
+        self.num_hits = np.zeros(num_bins)
+        self.hit_charge_sum = np.zeros(num_bins)
+        self.hit_charge_sum2 = np.zeros(num_bins)
+
+    def add(self, num_events, events_passed, total_charge, reco_distance):
+        """
+        Add the events of a chunk, and the TotalCharge and RecoDistance of the
+        DOMs that passed.
+        """
+
+        self.num_events += num_events
+        self.events_passed += events_passed
+        self.doms_passed += len(total_charge)
+
+        in_range = (0 <= reco_distance) & (reco_distance < max_dist)
+        bins = (reco_distance[in_range] // bin_width).astype(int)
+        charge = total_charge[in_range]
+        hit = charge != 0
+
+        num_bins = len(self.num_doms)
+        self.num_doms += np.bincount(bins, minlength=num_bins)
+        self.charge_sum += np.bincount(bins, charge, minlength=num_bins)
+        self.num_hits += np.bincount(bins[hit], minlength=num_bins)
+        self.hit_charge_sum += np.bincount(bins[hit], charge[hit], minlength=num_bins)
+        self.hit_charge_sum2 += np.bincount(bins[hit], charge[hit] ** 2, minlength=num_bins)
+
+    def charge_info(self):
+        """
+        Return the mean charge and error of each distance bin, as
+        calc_charge_info in plot/interpolation.py does (NaN for empty bins).
+        """
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            num_doms = self.num_doms
+            num_hits = self.num_hits
+            num_no_hits = num_doms - num_hits
+
+            mean_charges = self.charge_sum / num_doms
+
+            mu = self.hit_charge_sum / num_hits
+            variance = (self.hit_charge_sum2 - num_hits * mu ** 2) / (num_hits - 1)
+            std_mu = np.sqrt(np.maximum(variance, 0)) / np.sqrt(num_hits)
+
+            error = num_hits * (mu * num_no_hits) ** 2 / num_doms ** 4
+            error += num_no_hits * (mu * num_hits) ** 2 / num_doms ** 4
+            error += (std_mu * num_hits / num_doms) ** 2
+            error **= 1 / 2
+
+        return mean_charges, error
+
+    def report(self):
+        """
+        Return the summary as a dict, ready to be saved as JSON.
+        """
+
+        mean_charges, errors = self.charge_info()
+
+        def to_list(array):
+            return [None if np.isnan(x) else float(x) for x in array]
+
+        return {'name': self.variant['name'],
+                'event_cuts': sorted(cut_label(key, *cut) for key, cut in self.variant['event_cuts'].items()),
+                'dom_cuts': sorted(cut_label(key, *cut) for key, cut in self.variant['dom_cuts'].items()),
+                'events': self.num_events,
+                'events_passed': self.events_passed,
+                'doms_passed': self.doms_passed,
+                'bin_edges': list(range(0, max_dist + bin_width, bin_width)),
+                'bin_doms': [int(x) for x in self.num_doms],
+                'mean_charges': to_list(mean_charges),
+                'errors': to_list(errors)}
+
+
+def sweep(datafiles, variants, dom_keys, writers=None, chunk_size=100000, cut_cache=False):
+    """
+    Make the cuts of all the variants on the columnar output of process.py in
+    one pass.
+
+    Parameters
+    ----------
+    datafiles : list of str
+        The columnar output files of process.py.
+
+    variants : list of dict
+        The 'name', 'event_cuts' and 'dom_cuts' of each variant.
+
+    dom_keys : list of str
+        The per-DOM keys to write (for the variants in writers).
+
+    writers : dict[str] -> TableWriter
+        The writers of the variants (by name) to write the full output of.
+
+    chunk_size : int
+        The number of events to cut at once.
+
+    cut_cache : bool
+        If True, read the cut masks from (and save them to) the BitmapCache
+        of each data file.
+
+    Returns
+    -------
+    list of VariantSummary
+        The summary of each variant.
+    """
+
+    writers = writers or {}
+    summaries = [VariantSummary(variant) for variant in variants]
+
+    for path in datafiles:
+        cache = BitmapCache(path) if cut_cache else None
+
+        for events, dom_offsets, doms in read_chunks(path, chunk_size):
+            event_masks = CutMasks(events, len(dom_offsets) - 1, cache, 'event', events.start)
+            dom_masks = CutMasks(doms, dom_offsets[-1], cache, 'dom', doms.start)
+
+            for summary in summaries:
+                variant = summary.variant
+
+                event_indices = np.flatnonzero(event_masks.mask(variant['event_cuts']))
+                rows, counts = event_dom_rows(dom_offsets, event_indices)
+                pass_cut = dom_masks.mask(variant['dom_cuts'])[rows]
+
+                cut_rows = rows[pass_cut]
+                summary.add(len(dom_offsets) - 1, len(event_indices),
+                            doms['TotalCharge'][cut_rows], doms['RecoDistance'][cut_rows])
+
+                if variant['name'] in writers:
+                    write_events(writers[variant['name']], events, event_indices, doms, dom_keys,
+                                 rows, counts, pass_cut)
+
+        if cache is not None:
+            print('{}: {} of {} cut masks read from the cache'.format(path, cache.hits, cache.hits + cache.misses))
+            cache.close()
+
+    return summaries
+
+
+def save_summaries(path, summaries):
+    """
+    Save the summaries of the variants to a JSON file, and print the pass
+    counts.
+    """
+
+    reports = [summary.report() for summary in summaries]
+
+    with open(path, 'w') as outfile:
+        json.dump(reports, outfile, indent=2, sort_keys=True)
+
+    width = max([len('Variant')] + [len(report['name']) for report in reports]) + 2
+    row = '{:>4}  {:<' + str(width) + '}{:>14}{:>14}'
+    print(row.format('', 'Variant', 'Events', 'DOMs'))
+    for i, report in enumerate(reports):
+        print(row.format(i, report['name'], report['events_passed'], report['doms_passed']))
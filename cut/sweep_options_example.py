@@ -0,0 +1,26 @@
+"""
+This file contains the variants of the cuts for a cut sweep (cut.py --sweep).
+Each variant is a dict with a 'name', and its 'event_cuts' and 'dom_cuts' in
+the same format as cut_options.py. This example tries a few distances to the
+border, numbers of direct DOMs and impact angles on top of the usual cuts.
+"""
+
+import operator as op
+
+import numpy as np
+
+from cut_options import event_cuts, dom_cuts
+from sweep import grid
+
+# All the combinations of these cuts, with the rest of the cuts from cut_options.py
+event_grid = {}
+event_grid['DistToBorder'] = [(op.gt, dist) for dist in [0, 25, 50, 75, 100]]
+event_grid['NDirDoms'] = [(op.gt, n) for n in [3, 5, 7]]
+
+dom_grid = {}
+dom_grid['ImpactAngle'] = [(op.lt, angle) for angle in [np.pi / 3, np.pi / 2, 2 * np.pi / 3]]
+
+variants = grid(event_cuts, dom_cuts, event_grid, dom_grid)
+
+# Single variants can be added too.
+variants.append({'name': 'no dom cuts', 'event_cuts': event_cuts, 'dom_cuts': {}})
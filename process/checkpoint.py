@@ -0,0 +1,228 @@
+"""
+Checkpoints for processing an I3 file in segments.
+
+With checkpoints, process.py writes the output a segment (a fixed number of
+DAQ frames of the input) at a time to part files, all in one pass over the
+input. After each segment the checkpoint file is updated with the index of
+the next DAQ frame and the part files written so far. If the job is killed,
+restarting it with the same arguments skips the segments that are already
+done, so at most one segment of reconstructions is redone. When the whole
+file is processed the part files are merged into the output file.
+"""
+
+from __future__ import print_function, division  # 2to3
+
+import json
+import os
+import re
+
+from icecube import dataio, icetray
+
+
+class FrameRange(icetray.I3Module):
+    """
+    Only pass on the DAQ frames (and the Physics frames split from them) with
+    an index of at least Start.
+
+    The other frames (Geometry, Calibration, etc.) are always passed on.
+    position['index'] is set to the index of the current DAQ frame, for
+    SegmentWriter.
+    """
+
+    def __init__(self, context):
+        icetray.I3Module.__init__(self, context)
+        self.AddParameter('Start', 'Index of the first DAQ frame to process', 0)
+        self.AddParameter('Position', 'Dict to record the index of the current DAQ frame in', None)
+        self.AddOutBox('OutBox')
+
+    def Configure(self):
+        self.start = self.GetParameter('Start')
+        self.position = self.GetParameter('Position')
+        self.position['index'] = -1
+
+    def Process(self):
+        frame = self.PopFrame()
+
+        if frame.Stop == icetray.I3Frame.DAQ:
+            self.position['index'] += 1
+
+        if frame.Stop in (icetray.I3Frame.DAQ, icetray.I3Frame.Physics):
+            if self.position['index'] < self.start:
+                return
+
+        self.PushFrame(frame)
+
+
+class SegmentWriter(icetray.I3Module):
+    """
+    Write the DAQ and Physics frames to a part file per segment, and save the
+    checkpoint after each segment.
+
+    The segment of a frame is found from position['index'] (set by
+    FrameRange at the start of the tray). A part file is closed, and the
+    checkpoint saved, when the first frame of a later segment arrives, so all
+    the frames split from the earlier DAQ frames are in it. Like the I3Writer
+    of add_writer in process.py, DAQ frames without any Physics frames are
+    dropped, and the keys matching SkipKeys are not written.
+    """
+
+    def __init__(self, context):
+        icetray.I3Module.__init__(self, context)
+        self.AddParameter('OutputFile', 'Name of the output file (the part files are named after it)', None)
+        self.AddParameter('Checkpoint', 'The checkpoint dict (see load_checkpoint)', None)
+        self.AddParameter('Position', 'The position dict of FrameRange', None)
+        self.AddParameter('ColumnWriter', 'ColumnWriter of the columnar output (if any)', None)
+        self.AddParameter('SkipKeys', 'Regular expressions of the keys not to write', [])
+        self.AddOutBox('OutBox')
+
+    def Configure(self):
+        self.ofile = self.GetParameter('OutputFile')
+        self.checkpoint = self.GetParameter('Checkpoint')
+        self.position = self.GetParameter('Position')
+        self.column_writer = self.GetParameter('ColumnWriter')
+        self.skip_keys = [re.compile(pattern) for pattern in self.GetParameter('SkipKeys')]
+
+        self.segment_size = self.checkpoint['segment_size']
+        self.segment = self.checkpoint['next_frame'] // self.segment_size
+        self.part = None
+        self.daq_frame = None
+
+    def Process(self):
+        frame = self.PopFrame()
+
+        if frame.Stop not in (icetray.I3Frame.DAQ, icetray.I3Frame.Physics):
+            self.PushFrame(frame)
+            return
+
+        segment = self.position['index'] // self.segment_size
+        if segment != self.segment:
+            self.end_segment(segment * self.segment_size)
+            self.segment = segment
+
+        for key in frame.keys():
+            if frame.get_stop(key) == frame.Stop and any(pattern.match(key) for pattern in self.skip_keys):
+                del frame[key]
+
+        if frame.Stop == icetray.I3Frame.DAQ:
+            # Only written with the first Physics frame split from it.
+            self.daq_frame = frame
+        else:
+            if self.part is None:
+                self.part = dataio.I3File(part_path(self.ofile, len(self.checkpoint['parts'])), 'w')
+            if self.daq_frame is not None:
+                self.part.push(self.daq_frame)
+                self.daq_frame = None
+                if 'I3EventHeader' in frame:
+                    header = frame['I3EventHeader']
+                    self.checkpoint['last_event'] = (header.run_id, header.event_id)
+            self.part.push(frame)
+
+        self.PushFrame(frame)
+
+    def Finish(self):
+        self.end_segment((self.segment + 1) * self.segment_size)
+
+    def end_segment(self, next_frame):
+        """
+        Close the part file of the current segment and save the checkpoint,
+        to resume at the DAQ frame with index next_frame.
+        """
+
+        self.daq_frame = None
+        if self.part is not None:
+            self.part.close()
+            self.checkpoint['parts'].append(part_path(self.ofile, len(self.checkpoint['parts'])))
+            self.part = None
+
+        self.checkpoint['next_frame'] = next_frame
+        if self.column_writer is not None:
+            self.column_writer.flush()
+            self.checkpoint['column_events'] = self.column_writer.num_events
+        save_checkpoint(self.ofile, self.checkpoint)
+
+
+def checkpoint_path(ofile):
+    """
+    Return the path of the checkpoint file for an output file.
+    """
+
+    return ofile + '.checkpoint'
+
+
+def part_path(ofile, segment):
+    """
+    Return the path of the part file of a segment.
+    """
+
+    return '{}.part{:04d}.i3'.format(ofile, segment)
+
+
+def load_checkpoint(ofile, gcd, data, segment_size):
+    """
+    Load the checkpoint for an output file.
+
+    A checkpoint is only used if it was made with the same GCD file, data
+    file, and segment size. Otherwise processing starts from the beginning.
+
+    Returns
+    -------
+    dict
+        The 'gcd', 'data', 'segment_size', 'next_frame', 'last_event',
+        'parts', and 'column_events' (the number of events in the columnar
+        output, if any) of the checkpoint.
+    """
+
+    checkpoint = {'gcd': gcd, 'data': data, 'segment_size': segment_size,
+                  'next_frame': 0, 'last_event': None, 'parts': [], 'column_events': 0}
+
+    path = checkpoint_path(ofile)
+    if not os.path.exists(path):
+        return checkpoint
+
+    with open(path) as infile:
+        saved = json.load(infile)
+
+    if (saved['gcd'], saved['data'], saved['segment_size']) != (gcd, data, segment_size):
+        print('Ignoring the checkpoint {} (made with different arguments)'.format(path))
+        return checkpoint
+
+    # Only the parts that were completely written are in the checkpoint.
+    missing = [part for part in saved['parts'] if not os.path.exists(part)]
+    if missing:
+        print('Ignoring the checkpoint {} (missing {})'.format(path, ', '.join(missing)))
+        return checkpoint
+
+    return saved
+
+
+def save_checkpoint(ofile, checkpoint):
+    """
+    Save the checkpoint for an output file.
+
+    The checkpoint is written to a temporary file first, so a job killed while
+    saving it leaves the previous checkpoint intact.
+    """
+
+    path = checkpoint_path(ofile)
+    with open(path + '.tmp', 'w') as outfile:
+        json.dump(checkpoint, outfile, indent=2, sort_keys=True)
+    os.rename(path + '.tmp', path)
+
+
+def merge_parts(ofile, checkpoint):
+    """
+    Merge the part files into the output file, then remove the part files and
+    the checkpoint.
+    """
+
+    outfile = dataio.I3File(ofile, 'w')
+    for part in checkpoint['parts']:
+        infile = dataio.I3File(part)
+        while infile.more():
+            outfile.push(infile.pop_frame())
+        infile.close()
+    outfile.close()
+
+    for part in checkpoint['parts']:
+        os.remove(part)
+    os.remove(checkpoint_path(ofile))
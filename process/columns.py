@@ -0,0 +1,223 @@
+"""
+Columnar output of the cut variables.
+
+Besides the I3 file, process.py can write the per-event cut variables and the
+per-DOM data to an HDF5 file as plain columns, so later stages can load them
+straight into NumPy arrays without reading the frames through IceTray. The
+layout of the file is
+
+/events/<column>
+    One row per event: the Run, Event and SubEvent IDs, the scalar cut
+    variables (event_keys), the RecoEndpoint, and the MPEFit and
+    FiniteRecoFit parameters (eg. MPEFit_zenith). Missing values are NaN.
+
+/events/dom_offsets
+    One more row than the events. The per-DOM data of the ith event is in
+    rows dom_offsets[i]:dom_offsets[i + 1] of the /doms columns.
+
+/doms/<column>
+    The per-DOM data (dom_keys) of all the events, one after the other.
+
+The rows are buffered, and written in chunks.
+"""
+
+from __future__ import print_function, division  # 2to3
+
+import os
+
+import numpy as np
+import tables
+
+# The scalar cut variables added to the frame by process.py
+event_keys = ['NDirDoms', 'DirTrackLength', 'NHitDoms', 'rlogl', 'RecoEndpointZ',
+              'ICAnalysisHits', 'DCAnalysisHits', 'ICNHits', 'DCNHits', 'DistToBorder']
+
+# The per-DOM data added to the frame by dom_data
+dom_keys = ['TotalCharge', 'String', 'OM', 'DistAboveEndpoint', 'ImpactAngle', 'RecoDistance']
+
+# The fits whose parameters are saved, and the parameters
+particle_keys = ['MPEFit', 'FiniteRecoFit']
+particle_params = ['x', 'y', 'z', 'zenith', 'azimuth', 'time', 'length']
+
+# The event ID columns
+id_columns = ['Run', 'Event', 'SubEvent']
+
+
+def event_columns():
+    """
+    Return the names of the per-event columns (other than dom_offsets).
+    """
+
+    columns = list(id_columns) + list(event_keys)
+    columns += ['RecoEndpoint_' + axis for axis in 'xyz']
+    columns += ['{}_{}'.format(key, param) for key in particle_keys for param in particle_params]
+
+    return columns
+
+
+def event_row(frame):
+    """
+    Return the values of the per-event columns for a frame.
+    """
+
+    header = frame['I3EventHeader']
+    row = [header.run_id, header.event_id, header.sub_event_id]
+
+    for key in event_keys:
+        row.append(frame[key].value if frame.Has(key) else np.nan)
+
+    if frame.Has('RecoEndpoint'):
+        endpoint = frame['RecoEndpoint']
+        row += [endpoint.x, endpoint.y, endpoint.z]
+    else:
+        row += [np.nan] * 3
+
+    for key in particle_keys:
+        if frame.Has(key):
+            particle = frame[key]
+            row += [particle.pos.x, particle.pos.y, particle.pos.z,
+                    particle.dir.zenith, particle.dir.azimuth, particle.time, particle.length]
+        else:
+            row += [np.nan] * len(particle_params)
+
+    return row
+
+
+class ColumnWriter(object):
+    """
+    Write the cut variables of the frames to an HDF5 file as columns.
+
+    Parameters
+    ----------
+    path : str
+        The HDF5 file.
+
+    chunk_size : int
+        The number of events to buffer before writing them.
+
+    append : bool
+        If True and the file exists, add to the columns already in it (see
+        truncate). Otherwise the file is overwritten.
+
+    Attributes
+    ----------
+    num_events : int
+        The number of events added so far (including the ones already in the
+        file).
+    """
+
+    def __init__(self, path, chunk_size=1000, append=False):
+        self.chunk_size = chunk_size
+
+        if append and os.path.exists(path):
+            self.file = tables.open_file(path, 'a')
+            self.events = self.file.root.events
+            self.doms = self.file.root.doms
+        else:
+            self.file = tables.open_file(path, 'w')
+            self.create()
+
+        self.event_buffer = []
+        self.dom_buffer = []
+        self.dom_counts = []
+
+        self.num_events = self.events.dom_offsets.nrows - 1
+        self.num_doms = int(self.events.dom_offsets[-1])
+
+    def create(self):
+        """
+        Create the (empty) columns.
+        """
+
+        filters = tables.Filters(complevel=5, complib='zlib')
+
+        self.events = self.file.create_group('/', 'events', 'Per-event cut variables')
+        self.doms = self.file.create_group('/', 'doms', 'Per-DOM data')
+
+        for column in event_columns():
+            atom = tables.Int64Atom() if column in id_columns else tables.Float64Atom()
+            self.file.create_earray(self.events, column, atom, (0,), filters=filters,
+                                    chunkshape=(self.chunk_size,))
+
+        offsets = self.file.create_earray(self.events, 'dom_offsets', tables.Int64Atom(), (0,), filters=filters,
+                                          chunkshape=(self.chunk_size,))
+        offsets.append(np.zeros(1, dtype=np.int64))
+
+        for column in dom_keys:
+            self.file.create_earray(self.doms, column, tables.Float64Atom(), (0,), filters=filters,
+                                    chunkshape=(16 * self.chunk_size,))
+
+    def add(self, frame):
+        """
+        Add the cut variables of a frame.
+        """
+
+        self.event_buffer.append(event_row(frame))
+
+        dom_data = [np.asarray(frame[key], dtype=float) if frame.Has(key) else np.empty(0) for key in dom_keys]
+        self.dom_buffer.append(dom_data)
+        self.dom_counts.append(len(dom_data[0]))
+
+        self.num_events += 1
+
+        if len(self.event_buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered events to the file.
+        """
+
+        if not self.event_buffer:
+            return
+
+        columns = event_columns()
+        rows = list(zip(*self.event_buffer))
+        for i, column in enumerate(columns):
+            dtype = np.int64 if column in id_columns else np.float64
+            getattr(self.events, column).append(np.array(rows[i], dtype=dtype))
+
+        offsets = self.num_doms + np.cumsum(self.dom_counts)
+        self.events.dom_offsets.append(offsets.astype(np.int64))
+        self.num_doms = int(offsets[-1])
+
+        for i, column in enumerate(dom_keys):
+            getattr(self.doms, column).append(np.concatenate([data[i] for data in self.dom_buffer]))
+
+        self.event_buffer = []
+        self.dom_buffer = []
+        self.dom_counts = []
+        self.file.flush()
+
+    def truncate(self, num_events):
+        """
+        Remove all but the first num_events events (eg. the events written
+        after the last checkpoint).
+        """
+
+        self.flush()
+
+        if num_events > self.num_events:
+            raise ValueError('Can not truncate {} events to {}'.format(self.num_events, num_events))
+
+        num_doms = int(self.events.dom_offsets[num_events])
+        for column in event_columns():
+            getattr(self.events, column).truncate(num_events)
+        self.events.dom_offsets.truncate(num_events + 1)
+        for column in dom_keys:
+            getattr(self.doms, column).truncate(num_doms)
+
+        self.num_events = num_events
+        self.num_doms = num_doms
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def write_columns(frame, column_writer):
+    """
+    Add the cut variables of the frame to the columnar output.
+    """
+
+    column_writer.add(frame)
@@ -6,12 +6,241 @@ from __future__ import print_function, division  # 2to3
 
 import math
 
+import numpy as np
+
 from icecube import dataclasses, finiteReco
 from icecube.phys_services import I3Calculator as calc
 from icecube.dataclasses import I3Constants
 
+from geoanalysis import geometry_key
+from pulses import pulse_cache
+from regions import regions
+from trackgeometry import track_geometry, windowed_charge, PulseArrays
+
+# The trackgeometry.track_geometry names of the track shapes.
+track_shapes = {dataclasses.I3Particle.InfiniteTrack: 'infinite',
+                dataclasses.I3Particle.StartingTrack: 'starting',
+                dataclasses.I3Particle.StoppingTrack: 'stopping',
+                dataclasses.I3Particle.ContainedTrack: 'contained'}
+
+
+class DOMIndex(object):
+    """
+    Spatial index of the analysis DOMs for the current geometry.
+
+    The analysis DOMs are the ones in the IC/DC strings below the dust layer
+    (40 and below for IC, 11 and below for DC). They are grouped by partition,
+    and within each partition by string. Since the strings are vertical, the
+    distance from a track to the line through a string is a lower bound on the
+    distance to every DOM on it, so whole strings can be skipped before
+    looking at the DOMs.
+
+    Attributes
+    ----------
+    doms : list of tuples
+        The (OMKey, I3Position) of each analysis DOM, in the order of the
+        geometry.
+
+    dom_numbers : dict[OMKey] -> int
+        The index of each analysis DOM in doms.
+
+    before, after : int
+        The number of candidate DOMs before and after pruning for the last
+        frame.
 
-def om_partition(frame, output_name, options):
+    total_before, total_after : int
+        The same, summed over all frames.
+
+    misses : int
+        The number of times the index had to be (re)built.
+    """
+
+    def __init__(self):
+        self.key = None
+        self.doms = []
+        self.dom_numbers = {}
+        self.before = 0
+        self.after = 0
+        self.total_before = 0
+        self.total_after = 0
+        self.misses = 0
+
+    def update(self, geometry, partitions):
+        """
+        Rebuild the index if the I3Geometry or the number of partitions
+        changed.
+        """
+
+        key = (geometry_key(geometry), partitions)
+        if key == self.key:
+            return
+
+        self.misses += 1
+        self.key = key
+
+        dom_geo = list(geometry.omgeo.items())  # (OMKey, I3OMGeo)
+        all_strings = [dom.string for dom, geo in dom_geo]
+        all_oms = [dom.om for dom, geo in dom_geo]
+
+        analysis = (regions.contains('ICAnalysis', all_strings, all_oms) |
+                    regions.contains('DCAnalysis', all_strings, all_oms))
+
+        self.doms = [(dom, geo.position) for (dom, geo), keep in zip(dom_geo, analysis) if keep]
+
+        self.dom_numbers = dict((dom, i) for i, (dom, position) in enumerate(self.doms))
+
+        strings = np.array([dom.string for dom, position in self.doms], dtype=int)
+        oms = np.array([dom.om for dom, position in self.doms], dtype=int)
+        self.positions = np.array([(p.x, p.y, p.z) for dom, p in self.doms], dtype=float).reshape(-1, 3)
+
+        # The (x, y) coordinates of each string, and which string each DOM
+        # is on (as an index into self.string_xy).
+        string_numbers, self.string_slot = np.unique(strings, return_inverse=True)
+        self.string_xy = np.zeros((len(string_numbers), 2))
+        self.string_xy[self.string_slot] = self.positions[:, :2]
+
+        partition_nums = (strings + oms) % partitions
+        self.partition_doms = [np.flatnonzero(partition_nums == p) for p in range(partitions)]
+
+    def candidates(self, track, max_dist, partition):
+        """
+        Return the indices (into self.doms) of the DOMs in the given partition
+        that are less than max_dist from the line of the track.
+
+        The Cherenkov distance is never smaller than this distance, so no DOM
+        with a Cherenkov distance less than max_dist is left out.
+
+        Parameters
+        ----------
+        track : I3Particle
+        max_dist : float
+        partition : int
+
+        Returns
+        -------
+        np.ndarray of int
+        """
+
+        origin = np.array([track.pos.x, track.pos.y, track.pos.z])
+        direction = np.array([track.dir.x, track.dir.y, track.dir.z])
+
+        # Distance from the track line to each (vertical) string line.
+        horizontal = np.hypot(direction[0], direction[1])
+        delta_xy = self.string_xy - origin[:2]
+        if horizontal > 1e-9:
+            string_dist = np.abs(delta_xy[:, 0] * direction[1] - delta_xy[:, 1] * direction[0]) / horizontal
+        else:
+            string_dist = np.hypot(delta_xy[:, 0], delta_xy[:, 1])
+
+        doms = self.partition_doms[partition]
+        doms = doms[string_dist[self.string_slot[doms]] < max_dist]
+
+        # Distance from the track line to the DOMs on the remaining strings.
+        delta = self.positions[doms] - origin
+        along = np.dot(delta, direction)
+        perp = delta - along[:, np.newaxis] * direction
+        dom_dist = np.sqrt(np.sum(perp ** 2, axis=1))
+
+        return doms[dom_dist < max_dist]
+
+    def count(self, before, after):
+        """
+        Record the number of candidate DOMs before and after pruning for a
+        frame.
+        """
+
+        self.before = before
+        self.after = after
+        self.total_before += before
+        self.total_after += after
+
+
+# Shared by every dom_data module that isn't given its own index.
+dom_index = DOMIndex()
+
+
+def flatten_pulses(pulse_series, dom_index):
+    """
+    Flatten the pulses on the analysis DOMs into contiguous arrays.
+
+    Parameters
+    ----------
+    pulse_series : I3RecoPulseSeriesMap
+    dom_index : DOMIndex
+
+    Returns
+    -------
+    PulseArrays
+        The times and charges of the pulses, ordered by DOM index. The pulses
+        of the ith DOM in dom_index.doms are times[offsets[i]:offsets[i + 1]].
+    """
+
+    dom_pulses = []
+    for dom, pulse_vector in pulse_series.items():
+        i = dom_index.dom_numbers.get(dom)
+        if i is not None:
+            dom_pulses.append((i, [pulse.time for pulse in pulse_vector], [pulse.charge for pulse in pulse_vector]))
+
+    dom_pulses.sort(key=lambda item: item[0])
+
+    counts = np.zeros(len(dom_index.doms), dtype=int)
+    times = []
+    charges = []
+    for i, dom_times, dom_charges in dom_pulses:
+        counts[i] = len(dom_times)
+        times.extend(dom_times)
+        charges.extend(dom_charges)
+
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    return PulseArrays(offsets, np.array(times, dtype=float), np.array(charges, dtype=float))
+
+
+class PartitionMemory(object):
+    """
+    Estimate of the memory saved by the mask partitions in om_partition.
+
+    Attributes
+    ----------
+    last : int
+        The number of bytes saved for the last frame.
+
+    total : int
+        The number of bytes saved, summed over all frames.
+
+    frames : int
+        The number of frames partitioned with masks.
+    """
+
+    # The size of an I3RecoPulse (time, charge, width, and flags, padded).
+    pulse_bytes = 24
+
+    def __init__(self):
+        self.last = 0
+        self.total = 0
+        self.frames = 0
+
+    def record(self, num_pulses, partitions):
+        """
+        Record the memory saved for a frame with num_pulses pulses. Each
+        copied pulse series would hold the pulses of all but one partition,
+        while each mask only needs one bit per pulse.
+        """
+
+        copied = (partitions - 1) * num_pulses * self.pulse_bytes
+        masks = partitions * (num_pulses + 7) // 8
+
+        self.last = copied - masks
+        self.total += self.last
+        self.frames += 1
+
+
+# Shared by every om_partition module that isn't given its own.
+partition_memory = PartitionMemory()
+
+
+def om_partition(frame, output_name, options, partition_memory=partition_memory,
+                 pulse_cache=pulse_cache):
     """
     Partition the pulses.
 
@@ -19,43 +248,101 @@ def om_partition(frame, output_name, options):
     ----------
     output_name : str
     options : dict[str]
+        If options['partition_mode'] is 'copy', the pulses of each partition
+        are copied into new pulse series. If it is 'mask', each partition is
+        an I3RecoPulseSeriesMapMask over the pulse series, so no pulses are
+        copied.
+
+    partition_memory : PartitionMemory
+        Records the memory saved by using masks.
+
+    pulse_cache : PulseCache
+        The cache of the applied pulse series masks.
 
     Adds To Frame
     -------------
-    output_name.format(partition) : I3RecoPulseSeriesMap
+    output_name.format(partition) : I3RecoPulseSeriesMap or I3RecoPulseSeriesMapMask
 
     """
 
-    # Initialize the RecoPulseSeriesMaps
-    for partition in range(options['partitions']):
-        key = output_name.format(partition)
-        frame[key] = dataclasses.I3RecoPulseSeriesMap()
+    if options['partition_mode'] == 'mask':
+        # Start with masks that select all the pulses, and then turn off the
+        # DOMs that are in the partition.
+        partition_maps = [dataclasses.I3RecoPulseSeriesMapMask(frame, options['pulses_name'])
+                          for partition in range(options['partitions'])]
+    else:
+        partition_maps = [dataclasses.I3RecoPulseSeriesMap() for partition in range(options['partitions'])]
 
     # Get the pulse series
-    pulse_series = frame[options['pulses_name']].apply(frame)
+    pulse_series = pulse_cache.get(frame, options['pulses_name'])
 
+    num_pulses = 0
     for dom, pulse_vector in pulse_series.items():
 
         # Find out which partition the pulse_vector should go in
         partition_num = (dom.string + dom.om) % options['partitions']
 
-        # Put it in every partition except the one it is in.
-        for partition in range(options['partitions']):
-            if partition != partition_num:
-                key = output_name.format(partition)
-                frame[key][dom] = pulse_vector
+        if options['partition_mode'] == 'mask':
+            # Take it out of the partition it is in.
+            partition_maps[partition_num].set(dom, False)
+            num_pulses += len(pulse_vector)
+        else:
+            # Put it in every partition except the one it is in.
+            for partition in range(options['partitions']):
+                if partition != partition_num:
+                    partition_maps[partition][dom] = pulse_vector
 
+    for partition, partition_map in enumerate(partition_maps):
+        frame[output_name.format(partition)] = partition_map
 
-def dom_data(frame, reco_fit, options):
+    if options['partition_mode'] == 'mask':
+        partition_memory.record(num_pulses, options['partitions'])
+
+
+def dom_configs(options):
+    """
+    Return the dom_data configurations.
+
+    Each configuration is a dict with a 'suffix' for the keys of its per-dom
+    data, the 'max_dist' of the DOMs from the track, and the
+    'residual_window' of the pulses counted in TotalCharge. They are given in
+    options['dom_configs']. Without it there is a single configuration with
+    no suffix, options['max_dist'], and a 1000 ns window.
+    """
+
+    if options.get('dom_configs'):
+        return options['dom_configs']
+
+    return [{'suffix': '', 'max_dist': options['max_dist'], 'residual_window': 1000}]
+
+
+def dom_data(frame, reco_fit, options, dom_index=dom_index, pulse_cache=pulse_cache):
     """
     Analyze and save the per-dom data using the provided fit.
 
+    The per-dom data is calculated for each configuration in
+    dom_configs(options) in a single pass: the DOMs, their track geometry,
+    and the pulses are found once (for the largest max_dist), and then each
+    configuration keeps the DOMs within its own max_dist and sums the charge
+    within its own residual window.
+
     Parameters
     ----------
     reco_fit : str
         The key of the
 
     options : dict[str]
+        options['engine'] selects how the per-dom track geometry is
+        calculated: 'calculator' uses I3Calculator one DOM at a time, and
+        'numpy' uses trackgeometry.track_geometry for all the DOMs at once.
+        Either way, the pulses are flattened once per frame and the charges
+        summed with trackgeometry.windowed_charge.
+
+    dom_index : DOMIndex
+        The index used to find the DOMs close to the fits.
+
+    pulse_cache : PulseCache
+        The cache of the applied pulse series masks.
 
     Adds To Frame
     -------------
@@ -65,87 +352,217 @@ def dom_data(frame, reco_fit, options):
     DistAboveEndpoint : I3VectorDouble
     ImpactAngle : I3VectorDouble
     RecoDistance : I3VectorDouble
+        These keys get the suffix of each configuration.
 
     Returns
     -------
     bool
-        Whether any per-dom data was added to the frame. If no data was added,
-        return False, because this frame contains no pertinent information.
-        Otherwise return True.
+        Whether any per-dom data was added to the frame (for any of the
+        configurations). If no data was added, return False, because this
+        frame contains no pertinent information. Otherwise return True.
 
     """
 
-    n_ice_group = I3Constants.n_ice_group
-    n_ice_phase = I3Constants.n_ice_phase
-
-    IC_strings = [26, 27, 37, 46, 45, 35, 17, 18, 19, 28, 38, 47, 56, 55, 54, 44, 34, 25]
-    DC_strings = [81, 82, 83, 84, 85, 86]
-
     reco_endpoint = frame['RecoEndpoint']
 
     # Get the pulse series
-    pulse_series = frame[options['pulses_name']].apply(frame)
+    pulse_series = pulse_cache.get(frame, options['pulses_name'])
+
+    configs = dom_configs(options)
+    max_dist = max(config['max_dist'] for config in configs)
+
+    # We want to get DOMs that are in the IC/DC strings and below the dust
+    # layer (40 and below for IC, 11 and below for DC). These are kept in the
+    # index, which is only rebuilt for a new geometry.
+    dom_index.update(frame['I3Geometry'], options['partitions'])
+
+    # The per-dom data of each configuration, keyed by the index of the DOM,
+    # so it can be saved in the order of the geometry.
+    dom_rows = [{} for config in configs]
+    num_candidates = 0
+
+    # The DOMs that pass and their track geometry for each configuration (for
+    # the numpy engine).
+    passed = [[] for config in configs]
+
+    for partition_num in range(options['partitions']):
+        mpe = frame[reco_fit.format(partition_num)]  # MPEFit0...4
+
+        # Only look at the DOMs in this partition that are close to the track.
+        candidates = dom_index.candidates(mpe, max_dist, partition_num)
+        num_candidates += len(candidates)
+
+        if options['engine'] == 'numpy':
+            track = _track_geometry(mpe, dom_index.positions[candidates], reco_endpoint, max_dist)
+            for config, config_passed in zip(configs, passed):
+                keep = track.passed & (track.reco_dist < config['max_dist'])
+                config_passed.append((candidates[keep], track, keep))
+        else:
+            rows = _calculator_rows(mpe, candidates, dom_index, reco_endpoint, configs)
+            for config_rows, partition_rows in zip(dom_rows, rows):
+                config_rows.update(partition_rows)
+
+    # Decode the pulses once for all the configurations (and both engines).
+    pulses = flatten_pulses(pulse_series, dom_index)
+
+    if options['engine'] == 'numpy':
+        dom_rows = [_numpy_rows(config_passed, dom_index, pulses, config['residual_window'])
+                    for config, config_passed in zip(configs, passed)]
+    else:
+        dom_rows = [_add_total_charge(config_rows, pulses, config['residual_window'])
+                    for config, config_rows in zip(configs, dom_rows)]
+
+    dom_index.count(len(dom_index.doms), num_candidates)
+
+    for config, config_rows in zip(configs, dom_rows):
+        suffix = config['suffix']
+
+        # Initialize the vectors
+        vectors = {}
+        for key in ['RecoDistance', 'DistAboveEndpoint', 'String', 'OM', 'ImpactAngle', 'TotalCharge']:
+            vectors[key] = dataclasses.I3VectorDouble()
+
+        for i in sorted(config_rows):
+            reco_dist, dist_above_endpoint, string, om, impact_angle, total_charge = config_rows[i]
+
+            vectors['RecoDistance'].append(reco_dist)
+            vectors['DistAboveEndpoint'].append(dist_above_endpoint)
+            vectors['String'].append(string)
+            vectors['OM'].append(om)
+            vectors['ImpactAngle'].append(impact_angle)
+            vectors['TotalCharge'].append(total_charge)
+
+        for key, vector in vectors.items():
+            frame[key + suffix] = vector
+
+    # After all that, if none of the DOMs made it through, get rid of this
+    # frame.
+    return any(dom_rows)
+
+
+def _calculator_rows(mpe, candidates, dom_index, reco_endpoint, configs):
+    """
+    Calculate the per-dom track geometry for the candidate DOMs of a fit with
+    I3Calculator.
+
+    Returns
+    -------
+    list of dicts[int] -> tuple
+        For each configuration, the (RecoDistance, DistAboveEndpoint, String,
+        OM, ImpactAngle, Cherenkov time) of the DOMs that pass, keyed by their
+        index in dom_index. The Cherenkov time is replaced by the TotalCharge
+        in _add_total_charge.
+    """
+
+    n_ice_group = I3Constants.n_ice_group
+    n_ice_phase = I3Constants.n_ice_phase
 
-    # Initialize the vectors
-    frame['TotalCharge'] = dataclasses.I3VectorDouble()
-    frame['String'] = dataclasses.I3VectorDouble()
-    frame['OM'] = dataclasses.I3VectorDouble()
-    frame['DistAboveEndpoint'] = dataclasses.I3VectorDouble()
-    frame['ImpactAngle'] = dataclasses.I3VectorDouble()
-    frame['RecoDistance'] = dataclasses.I3VectorDouble()
+    max_dist = max(config['max_dist'] for config in configs)
 
-    dom_geo = frame['I3Geometry'].omgeo.items()
+    dom_rows = [{} for config in configs]
 
     # Find all doms above the reconstructed z coord of endpoint and
     # within the specified distance interval of the track
-    for dom, geo in dom_geo:  # (OMKey, I3OMGeo)
+    for i in candidates:
+        dom, dom_position = dom_index.doms[i]  # (OMKey, I3Position)
+
+        # Find cherenkov distance from track to DOM
+        reco_dist = calc.cherenkov_distance(mpe, dom_position, n_ice_group, n_ice_phase)
+        if reco_dist < max_dist:
+
+            # Keep if track is below DOM
+            clos_app_pos = calc.closest_approach_position(mpe, dom_position)
+            if clos_app_pos.z < dom_position.z:
 
-        # We want to get DOMs that are in the IC/DC strings and below the dust
-        # layer (40 and below for IC, 11 and below for DC).
-        if (dom.string in IC_strings and dom.om >= 40) or (dom.string in DC_strings and dom.om >= 11):
+                # Try cherenkov dist
+                cherenkov_pos = calc.cherenkov_position(mpe, dom_position, n_ice_group, n_ice_phase)
+                dist_above_endpoint = calc.distance_along_track(mpe, reco_endpoint) - calc.distance_along_track(mpe, cherenkov_pos)
+                if dist_above_endpoint > 0:
 
-            dom_position = geo.position
-            partition_num = (dom.string + dom.om) % options['partitions']
-            mpe = frame[reco_fit.format(partition_num)]  # MPEFit0...4
+                    perp_position = dataclasses.I3Position(dom_position.x, dom_position.y, clos_app_pos.z)
+                    delta = perp_position - clos_app_pos
+                    impact_param = delta.magnitude
 
-            # Find cherenkov distance from track to DOM
-            reco_dist = calc.cherenkov_distance(mpe, dom_position, n_ice_group, n_ice_phase)
-            if reco_dist < options['max_dist']:
+                    impact_angle = math.asin(impact_param / calc.closest_approach_distance(mpe, dom_position))
 
-                # Keep if track is below DOM
-                clos_app_pos = calc.closest_approach_position(mpe, dom_position)
-                if clos_app_pos.z < dom_position.z:
+                    # The time residual of a pulse is its time minus this.
+                    cherenkov_time = -calc.time_residual(mpe, dom_position, 0, n_ice_group, n_ice_phase)
 
-                    # Try cherenkov dist
-                    cherenkov_pos = calc.cherenkov_position(mpe, dom_position, n_ice_group, n_ice_phase)
-                    dist_above_endpoint = calc.distance_along_track(mpe, reco_endpoint) - calc.distance_along_track(mpe, cherenkov_pos)
-                    if dist_above_endpoint > 0:
+                    for config, config_rows in zip(configs, dom_rows):
+                        if reco_dist < config['max_dist']:
+                            config_rows[i] = (reco_dist, dist_above_endpoint, dom.string, dom.om, impact_angle, cherenkov_time)
 
-                        frame['RecoDistance'].append(reco_dist)
-                        frame['DistAboveEndpoint'].append(dist_above_endpoint)
-                        frame['String'].append(dom.string)
-                        frame['OM'].append(dom.om)
+    return dom_rows
 
-                        perp_position = dataclasses.I3Position(dom_position.x, dom_position.y, clos_app_pos.z)
-                        delta = perp_position - clos_app_pos
-                        impact_param = delta.magnitude
 
-                        impact_angle = math.asin(impact_param / calc.closest_approach_distance(mpe, dom_position))
-                        frame['ImpactAngle'].append(impact_angle)
+def _track_geometry(mpe, positions, reco_endpoint, max_dist):
+    """
+    Call trackgeometry.track_geometry for a fit.
+    """
 
-                        # TotalCharge and TimeResidual
-                        total_charge = 0
+    return track_geometry(positions,
+                          (mpe.pos.x, mpe.pos.y, mpe.pos.z),
+                          (mpe.dir.x, mpe.dir.y, mpe.dir.z),
+                          track_shapes.get(mpe.shape),
+                          mpe.length,
+                          (reco_endpoint.x, reco_endpoint.y, reco_endpoint.z),
+                          I3Constants.n_ice_group, I3Constants.n_ice_phase,
+                          max_dist,
+                          mpe.time)
 
-                        # If there are pulses, sum the charge of the ones with a
-                        # time residual less than 1000 ns.
-                        if dom in pulse_series.keys():
-                            for pulse in pulse_series[dom]:
-                                time_res = calc.time_residual(mpe, dom_position, pulse.time, n_ice_group, n_ice_phase)
-                                if time_res < 1000:
-                                    total_charge += pulse.charge
 
-                        frame['TotalCharge'].append(total_charge)
+def _numpy_rows(passed, dom_index, pulses, window):
+    """
+    Build the per-dom data of a configuration for the numpy engine. Returns
+    the same as _calculator_rows for a single configuration.
 
-    # After all that, if none of the DOMs made it through, get rid of this
-    # frame.
-    return len(frame['TotalCharge']) != 0
+    Parameters
+    ----------
+    passed : list of tuples
+        The indices of the DOMs that pass (into dom_index.doms), their
+        TrackGeometry, and the mask of the ones that pass, for each
+        partition.
+
+    pulses : PulseArrays
+        The pulses from flatten_pulses.
+
+    window : float
+        The time residual window of the pulses counted in TotalCharge (ns).
+    """
+
+    doms = np.concatenate([np.empty(0, dtype=int)] + [doms for doms, track, keep in passed])
+
+    def passed_values(name):
+        return np.concatenate([np.empty(0)] + [getattr(track, name)[keep] for doms, track, keep in passed])
+
+    reco_dist = passed_values('reco_dist')
+    dist_above_endpoint = passed_values('dist_above_endpoint')
+    impact_angle = passed_values('impact_angle')
+    cherenkov_time = passed_values('cherenkov_time')
+
+    # Sum the charges of all the DOMs that pass at once.
+    total_charge = windowed_charge(pulses, doms, cherenkov_time, window)
+
+    dom_rows = {}
+    for j, i in enumerate(doms):
+        dom, dom_position = dom_index.doms[i]  # (OMKey, I3Position)
+        dom_rows[i] = (reco_dist[j], dist_above_endpoint[j], dom.string, dom.om,
+                       impact_angle[j], total_charge[j])
+
+    return dom_rows
+
+
+def _add_total_charge(dom_rows, pulses, window):
+    """
+    Replace the Cherenkov time in the rows from _calculator_rows by the total
+    charge of the pulses on the DOM with a time residual less than window
+    (ns).
+    """
+
+    doms = np.array(sorted(dom_rows), dtype=int)
+    cherenkov_time = np.array([dom_rows[i][-1] for i in doms], dtype=float)
+
+    # Sum the charges of all the DOMs that pass at once.
+    total_charge = windowed_charge(pulses, doms, cherenkov_time, window)
+
+    return dict((i, dom_rows[i][:-1] + (total_charge[j],)) for j, i in enumerate(doms))
@@ -13,3 +13,6 @@ for data in $datafiles; do
     ofile=$outdir/$(basename $data)
     python /home/jgarber/IC86/process/process.py $gcd $data $ofile -s
 done
+
+# Or process all the files in parallel (on every core), fitting in 12 hours
+#python /home/jgarber/IC86/process/schedule.py $gcd $outdir $datafiles --budget 43200 -- -s
@@ -9,8 +9,11 @@ These are the base "cuts": they are always the same. The variable cuts
 from __future__ import print_function, division
 
 import math
+import timeit
 
-from icecube import dataclasses
+from icecube import dataclasses, icetray
+
+from pulses import pulse_cache
 
 
 def in_ice(frame):
@@ -31,11 +34,11 @@ def min_bias(frame):
     return filter_min_bias.condition_passed and filter_min_bias.prescale_passed
 
 
-def SMT8(frame):
+def SMT8(frame, pulse_cache=pulse_cache):
     """
     Check that the length of TWOfflinePulsesHLC >= 8.
     """
-    pulse_series = frame['TWOfflinePulsesHLC'].apply(frame)
+    pulse_series = pulse_cache.get(frame, 'TWOfflinePulsesHLC')
     return len(pulse_series) >= 8
 
 
@@ -54,3 +57,244 @@ def InIceSMTTriggered(frame):
     Check that InIceSMTTriggered is True.
     """
     return frame['InIceSMTTriggered'].value
+
+
+# The cut variables that only need the pulses and MPEFit (added to the frame
+# by move_cut_variables, count_hits, and calc_dist_to_border). The event cuts
+# on these can be made before the reconstructions, and process.py then
+# calculates them there.
+early_cut_keys = ['NDirDoms', 'DirTrackLength', 'NHitDoms', 'rlogl', 'RecoEndpointZ',
+                  'ICAnalysisHits', 'DCAnalysisHits', 'ICNHits', 'DCNHits', 'DistToBorder']
+
+
+def find_early_cuts(event_cuts):
+    """
+    Return the event cuts (see cut_options_example.py) that can be made before
+    the reconstructions, ie. the ones on the keys in early_cut_keys.
+    """
+
+    return dict((key, cut) for key, cut in event_cuts.items() if key in early_cut_keys)
+
+
+class CutFlow(object):
+    """
+    Count the frames rejected by each event cut.
+
+    Attributes
+    ----------
+    frames : int
+        The number of frames the cuts were made on.
+
+    passed : int
+        The number of frames that passed all the cuts.
+
+    rejected : dict[str] -> int
+        The number of frames rejected by each cut (each frame is only counted
+        for the first cut it failed).
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.passed = 0
+        self.rejected = {}
+
+    def report(self, fits_per_frame):
+        """
+        Print the cut flow, and the number of fits avoided by rejecting the
+        frames (fits_per_frame for each one).
+        """
+
+        print('Early event cuts: {} of {} frames passed'.format(self.passed, self.frames))
+        for key in sorted(self.rejected):
+            print('  {:<20}rejected {}'.format(key, self.rejected[key]))
+
+        num_rejected = self.frames - self.passed
+        print('Avoided {} reconstructions'.format(num_rejected * fits_per_frame))
+
+
+cut_flow = CutFlow()
+
+
+def early_event_cuts(frame, event_cuts, cut_flow=cut_flow):
+    """
+    Make the event cuts, like make_event_cuts in cut.py, recording the cut
+    flow.
+
+    Parameters
+    ----------
+    event_cuts : dict[str] -> tuple
+        The event cuts to make, eg. event_cuts['NDirDoms'] = (operator.gt, 5).
+        They can only use the keys in early_cut_keys (see find_early_cuts).
+
+    cut_flow : CutFlow
+
+    Returns
+    -------
+    bool
+        Indicates if the frame passed all the event cuts.
+    """
+
+    cut_flow.frames += 1
+
+    for key, (function, value) in event_cuts.items():
+        if not function(frame[key].value, value):
+            cut_flow.rejected[key] = cut_flow.rejected.get(key, 0) + 1
+            return False
+
+    cut_flow.passed += 1
+    return True
+
+
+class AdaptiveFilter(icetray.I3ConditionalModule):
+    """
+    Apply several filter functions, in the order that is cheapest on average.
+
+    The filters must be independent of each other (none of them can depend on
+    something another one adds to the frame). For the first WarmUp Physics
+    frames every filter is applied to every frame, to measure the cost of
+    each one and the fraction of frames it rejects. After that the filters
+    are applied in order of increasing cost / rejection rate, stopping at the
+    first one that rejects the frame, which minimizes the expected cost per
+    frame.
+
+    The frames kept are the ones kept by applying the filters in the given
+    order. A filter may raise an exception (eg. a KeyError for a missing key)
+    on frames an earlier filter in the given order rejects, like MPEFit on
+    the frames that aren't in_ice. If a filter raises, that frame is checked
+    again with the filters in the given order, so the exception is only
+    raised if the given order would have raised it. Only those exceptions
+    are counted as errors, and exceptions never count as rejections.
+
+    The ordering and the statistics for each filter are printed at Finish.
+    """
+
+    def __init__(self, context):
+        icetray.I3ConditionalModule.__init__(self, context)
+        self.AddParameter('Filters', 'List of filter functions, in the order they would be applied', [])
+        self.AddParameter('WarmUp', 'Number of Physics frames to measure the filters on before reordering them', 1000)
+        self.AddOutBox('OutBox')
+
+    def Configure(self):
+        self.filters = list(self.GetParameter('Filters'))
+        self.warm_up = self.GetParameter('WarmUp')
+
+        self.order = list(range(len(self.filters)))
+        self.frames = 0
+        self.kept = 0
+
+        # Statistics for each filter
+        self.calls = [0] * len(self.filters)
+        self.rejections = [0] * len(self.filters)
+        self.errors = [0] * len(self.filters)
+        self.seconds = [0.0] * len(self.filters)
+
+    def Physics(self, frame):
+        self.frames += 1
+
+        if self.frames <= self.warm_up:
+            passed = self.apply_all(frame)
+            if self.frames == self.warm_up:
+                self.reorder()
+        else:
+            passed = self.apply_ordered(frame)
+
+        if passed:
+            self.kept += 1
+            self.PushFrame(frame)
+
+    def call(self, i, frame):
+        """
+        Apply the ith filter to the frame, recording its cost and whether it
+        rejected the frame.
+        """
+
+        self.calls[i] += 1
+        start = timeit.default_timer()
+        try:
+            passed = bool(self.filters[i](frame))
+        finally:
+            self.seconds[i] += timeit.default_timer() - start
+
+        if not passed:
+            self.rejections[i] += 1
+
+        return passed
+
+    def apply_all(self, frame):
+        """
+        Apply every filter to the frame (for the warm up).
+        """
+
+        results = []
+        for i in range(len(self.filters)):
+            try:
+                results.append(self.call(i, frame))
+            except Exception as error:
+                results.append(error)
+
+        # Decide as if the filters were applied in the given order.
+        for i, result in enumerate(results):
+            if isinstance(result, Exception):
+                self.errors[i] += 1
+                raise result
+            if not result:
+                return False
+
+        return True
+
+    def apply_ordered(self, frame):
+        """
+        Apply the filters in the current order, stopping at the first one that
+        rejects the frame.
+        """
+
+        for i in self.order:
+            try:
+                passed = self.call(i, frame)
+            except Exception:
+                return self.apply_given_order(frame)
+            if not passed:
+                return False
+
+        return True
+
+    def apply_given_order(self, frame):
+        """
+        Apply the filters in the given order (only recording the errors).
+        """
+
+        for i, function in enumerate(self.filters):
+            try:
+                passed = function(frame)
+            except Exception:
+                self.errors[i] += 1
+                raise
+            if not passed:
+                return False
+
+        return True
+
+    def reorder(self):
+        """
+        Order the filters by increasing cost / rejection rate. The ones that
+        rejected nothing go last, cheapest first.
+        """
+
+        def key(i):
+            cost = self.seconds[i] / self.calls[i]
+            rejection_rate = self.rejections[i] / self.calls[i]
+            if rejection_rate == 0:
+                return (1, cost)
+            return (0, cost / rejection_rate)
+
+        self.order = sorted(range(len(self.filters)), key=key)
+
+    def Finish(self):
+        names = [function.__name__ for function in self.filters]
+
+        print('AdaptiveFilter kept {} of {} frames, filter order: {}'.format(
+            self.kept, self.frames, ', '.join(names[i] for i in self.order)))
+        print('{:<20}{:>10}{:>12}{:>10}{:>16}'.format('Filter', 'Calls', 'Rejected', 'Errors', 'Cost (us)'))
+        for i in self.order:
+            cost = self.seconds[i] / self.calls[i] * 1e6 if self.calls[i] else 0
+            print('{:<20}{:>10}{:>12}{:>10}{:>16.1f}'.format(names[i], self.calls[i], self.rejections[i], self.errors[i], cost))
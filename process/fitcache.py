@@ -0,0 +1,195 @@
+"""
+On-disk cache of the partition fit results.
+
+The MPEFit0...MPEFitN partition fits are by far the most expensive part of the
+processing, but they only depend on the event, the partition, and the fit
+configuration (the pulse selection and the settings of the fitter services).
+The FitCache saves the fit results in an SQLite database, keyed by the
+(run_id, event_id, sub_event_id, sub_event_stream) of the event, the
+partition, and a hash of the configuration. When the data is processed again
+(eg. with different dom_data options), the fits are read from the cache and
+only the events that aren't in it are fitted.
+
+Several jobs (eg. the workers of schedule.py) can share a cache file. Each
+fit is committed as soon as it is stored, so no job holds the write lock
+while it fits, and the database is in WAL mode so reading doesn't block
+writing.
+"""
+
+from __future__ import print_function, division  # 2to3
+
+import hashlib
+import json
+import sqlite3
+
+from icecube import dataclasses, gulliver
+
+from pulses import frame_id
+
+# The particle and fit parameter columns of the cache
+particle_columns = ['x', 'y', 'z', 'zenith', 'azimuth', 'time', 'energy', 'length', 'speed',
+                    'type', 'shape', 'fit_status']
+params_columns = ['logl', 'rlogl', 'ndof', 'nmini']
+
+# The key columns of the cache
+key_columns = ['run_id', 'event_id', 'sub_event_id', 'sub_event_stream', 'partition', 'config']
+
+
+def config_hash(config):
+    """
+    Return a hash of the fit configuration.
+
+    Parameters
+    ----------
+    config : dict
+        Everything the fit depends on (eg. the service settings). It must be
+        serializable to JSON.
+
+    Returns
+    -------
+    str
+    """
+
+    text = json.dumps(config, sort_keys=True)
+
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class FitCache(object):
+    """
+    Cache of the fit results in an SQLite database.
+
+    Attributes
+    ----------
+    hits : int
+        The number of fits read from the cache.
+
+    misses : int
+        The number of fits that weren't in the cache.
+
+    Parameters
+    ----------
+    path : str
+        The SQLite file.
+
+    timeout : float
+        How long to wait for another job to release the write lock (s).
+    """
+
+    def __init__(self, path, timeout=60):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+        # The keys of the fits read from the cache, which don't need to be
+        # stored again.
+        self.served = set()
+
+        self.connection = sqlite3.connect(path, timeout=timeout)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+
+        columns = ['run_id INTEGER', 'event_id INTEGER', 'sub_event_id INTEGER', 'sub_event_stream TEXT',
+                   'partition INTEGER', 'config TEXT']
+        columns += ['{} REAL'.format(column) for column in particle_columns + params_columns]
+        self.connection.execute('CREATE TABLE IF NOT EXISTS fits ({}, PRIMARY KEY ({}))'.format(
+            ', '.join(columns), ', '.join(key_columns)))
+
+    def key(self, frame, partition, config):
+        return frame_id(frame) + (partition, config)
+
+    def lookup(self, frame, partition, config, fit_name):
+        """
+        Put the cached fit (and its fit parameters) into the frame as fit_name
+        (and fit_name + 'FitParams').
+
+        Returns
+        -------
+        bool
+            Indicates if the fit was in the cache.
+        """
+
+        where = ' AND '.join('{} = ?'.format(column) for column in key_columns)
+        cursor = self.connection.execute('SELECT {} FROM fits WHERE {}'.format(
+            ', '.join(particle_columns + params_columns), where), self.key(frame, partition, config))
+        row = cursor.fetchone()
+
+        if row is None:
+            self.misses += 1
+            return False
+
+        self.hits += 1
+        self.served.add(self.key(frame, partition, config))
+
+        # SQLite stores NaN (eg. the energy of the fits) as NULL.
+        values = dict(zip(particle_columns + params_columns,
+                          [float('nan') if value is None else value for value in row]))
+
+        particle = dataclasses.I3Particle()
+        particle.pos = dataclasses.I3Position(values['x'], values['y'], values['z'])
+        particle.dir = dataclasses.I3Direction(values['zenith'], values['azimuth'])
+        particle.time = values['time']
+        particle.energy = values['energy']
+        particle.length = values['length']
+        particle.speed = values['speed']
+        particle.type = dataclasses.I3Particle.ParticleType.values[int(values['type'])]
+        particle.shape = dataclasses.I3Particle.ParticleShape.values[int(values['shape'])]
+        particle.fit_status = dataclasses.I3Particle.FitStatus.values[int(values['fit_status'])]
+        frame[fit_name] = particle
+
+        params = gulliver.I3LogLikelihoodFitParams()
+        params.logl = values['logl']
+        params.rlogl = values['rlogl']
+        params.ndof = int(values['ndof'])
+        params.nmini = int(values['nmini'])
+        frame[fit_name + 'FitParams'] = params
+
+        return True
+
+    def store(self, frame, partition, config, fit_name):
+        """
+        Save the fit fit_name (and its fit parameters) in the frame to the
+        cache. Fits already in the cache are left alone.
+        """
+
+        key = self.key(frame, partition, config)
+        if key in self.served:
+            # It was read from the cache, so it's already there.
+            self.served.remove(key)
+            return
+
+        particle = frame[fit_name]
+        params = frame[fit_name + 'FitParams']
+
+        values = [particle.pos.x, particle.pos.y, particle.pos.z,
+                  particle.dir.zenith, particle.dir.azimuth,
+                  particle.time, particle.energy, particle.length, particle.speed,
+                  int(particle.type), int(particle.shape), int(particle.fit_status),
+                  params.logl, params.rlogl, params.ndof, params.nmini]
+
+        columns = key_columns + particle_columns + params_columns
+        self.connection.execute('INSERT OR IGNORE INTO fits ({}) VALUES ({})'.format(
+            ', '.join(columns), ', '.join(['?'] * len(columns))), key + tuple(values))
+
+        # Commit right away, so the write lock isn't held during the next fits.
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+def fit_cache_lookup(frame, fit_cache, partition, config, fit_name):
+    """
+    Put the cached fit into the frame (if it is in the cache). The fitter
+    should only run if fit_name isn't in the frame afterwards.
+    """
+
+    fit_cache.lookup(frame, partition, config, fit_name)
+
+
+def fit_cache_store(frame, fit_cache, partition, config, fit_name):
+    """
+    Save the fit in the frame to the cache (unless it was read from it).
+    """
+
+    if frame.Has(fit_name):
+        fit_cache.store(frame, partition, config, fit_name)
@@ -7,6 +7,16 @@ from __future__ import print_function, division
 from icecube import dataclasses, finiteReco
 from icecube.common_variables import hit_multiplicity
 
+from pulses import pulse_cache
+from regions import regions
+
+# The frame key of each hit counter, and the region it counts the hits in.
+hit_counters = {}
+hit_counters['ICAnalysisHits'] = 'ICAnalysis'
+hit_counters['DCAnalysisHits'] = 'DCAnalysis'
+hit_counters['ICNHits'] = 'ICOutside'
+hit_counters['DCNHits'] = 'DCOutside'
+
 
 def get_truth_muon(frame):
     """
@@ -56,7 +66,7 @@ def get_truth_endpoint(frame):
     frame['TruthEndpoint'] = truth_endpoint
 
 
-def count_hits(frame, pulses_name):
+def count_hits(frame, pulses_name, pulse_cache=pulse_cache):
     """
     Count the number of pulses in the given pulse series that occur in specific
     regions of the detector.
@@ -66,6 +76,9 @@ def count_hits(frame, pulses_name):
     pulses_name : str
         The key of the pulse series in the I3Frame.
 
+    pulse_cache : PulseCache
+        The cache of the applied pulse series masks.
+
     Adds To Frame
     -------------
     ICAnalysisHits : I3Double
@@ -81,35 +94,18 @@ def count_hits(frame, pulses_name):
         The number of hits outside the DC analysis region.
     """
 
-    # Strings in the analysis regions
-    IC_strings = [26, 27, 37, 46, 45, 35, 17, 18, 19, 28, 38, 47, 56, 55, 54, 44, 34, 25]
-    DC_strings = [81, 82, 83, 84, 85, 86]
-
-    IC_analysis_hits = 0
-    DC_analysis_hits = 0
-    IC_nhits = 0
-    DC_nhits = 0
-
-    pulse_series = frame[pulses_name].apply(frame)
-
-    # Iterato over the doms in the pulse series and count the hits in each
-    # region
-    for dom in pulse_series.keys():
-        if dom.string in IC_strings and dom.om >= 40:
-            IC_analysis_hits += 1
-        if dom.string in DC_strings and dom.om >= 11:
-            DC_analysis_hits += 1
-
-        # We need to exclude hits on strings 36, 79, and 80
-        if dom.string not in [36, 79, 80] + DC_strings + IC_strings:
-            IC_nhits += 1
-        if dom.string not in [36, 79, 80] + DC_strings:
-            DC_nhits += 1
-
-    frame['ICAnalysisHits'] = dataclasses.I3Double(IC_analysis_hits)
-    frame['DCAnalysisHits'] = dataclasses.I3Double(DC_analysis_hits)
-    frame['ICNHits'] = dataclasses.I3Double(IC_nhits)
-    frame['DCNHits'] = dataclasses.I3Double(DC_nhits)
+    pulse_series = pulse_cache.get(frame, pulses_name)
+
+    doms = pulse_series.keys()
+    strings = [dom.string for dom in doms]
+    oms = [dom.om for dom in doms]
+
+    # Count the hits in all the regions at once (see regions.py for their
+    # definitions).
+    counts = regions.count(strings, oms)
+
+    for key, region in hit_counters.items():
+        frame[key] = dataclasses.I3Double(counts[region])
 
 
 def reco_endpoint(frame, endpoint_fit):
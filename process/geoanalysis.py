@@ -9,7 +9,14 @@ from __future__ import print_function, division
 from icecube import dataclasses
 from I3Tray import OMKey
 
-from geometry import point_to_polygon_dist, point_in_polygon
+from geometry import polygon_edges, signed_dist, SignedDistGrid
+
+# The strings on the border of the detector, in order around the border.
+IC86_border_strings = [1, 2, 3, 4, 5, 6, 13, 21, 30, 40, 50, 59, 67, 74, 73, 72, 78, 77, 76, 75, 68, 60, 51, 41, 31, 22, 14, 7]
+
+# The (min, max) x and y coordinates covered by the signed distance grids. The
+# endpoints we look at are within +-600 m, so add a 100 m margin to that.
+grid_extent = (-700, 700)
 
 
 def get_coordinates(omgeo, strings):
@@ -43,7 +50,91 @@ def get_coordinates(omgeo, strings):
     return coords
 
 
-def calc_dist_to_border(frame):
+def geometry_key(geometry):
+    """
+    Return a key that identifies the given detector geometry.
+
+    The geometry only changes when a new G frame arrives, so this is used to
+    check if quantities derived from a geometry need to be recalculated.
+
+    Parameters
+    ----------
+    geometry : I3Geometry
+
+    Returns
+    -------
+    tuple
+        The start and end times of the geometry and its number of DOMs.
+    """
+
+    start = geometry.start_time
+    end = geometry.end_time
+
+    return (start.utc_year, start.utc_daq_time, end.utc_year, end.utc_daq_time, len(geometry.omgeo))
+
+
+class BorderCache(object):
+    """
+    Cache of the detector border polygon for the current geometry.
+
+    The border is built from the geometry once, and then reused until the
+    geometry changes.
+
+    Parameters
+    ----------
+    border_strings : list of ints
+        The strings on the detector border, in order around the border.
+
+    Attributes
+    ----------
+    edges : np.ndarray
+        The edges of the border polygon, as returned by
+        geometry.polygon_edges.
+
+    misses : int
+        The number of times the border had to be (re)built.
+    """
+
+    def __init__(self, border_strings):
+        self.border_strings = border_strings
+        self.key = None
+        self.edges = None
+        self.grids = {}
+        self.misses = 0
+
+    def get_edges(self, geometry):
+        """
+        Return the edges of the border polygon for the given I3Geometry.
+        """
+
+        key = geometry_key(geometry)
+        if key != self.key:
+            self.misses += 1
+            self.edges = polygon_edges(get_coordinates(geometry.omgeo, self.border_strings))
+            self.grids = {}
+            self.key = key
+
+        return self.edges
+
+    def get_grid(self, geometry, resolution):
+        """
+        Return the SignedDistGrid of the border polygon for the given
+        I3Geometry, with the given resolution (in metres).
+        """
+
+        edges = self.get_edges(geometry)
+        if resolution not in self.grids:
+            self.grids[resolution] = SignedDistGrid(edges, resolution, grid_extent)
+
+        return self.grids[resolution]
+
+
+# Shared by every calc_dist_to_border module that isn't given its own cache.
+border_cache = BorderCache(IC86_border_strings)
+
+
+def calc_dist_to_border(frame, border_cache=border_cache, resolution=None,
+                        endpoint_name='RecoEndpoint', output_name='DistToBorder'):
     """
     Calculate the signed minimum distance of the reconsructed endpoint to the
     detector border.
@@ -51,28 +142,41 @@ def calc_dist_to_border(frame):
     Events inside the detector are given positive distances, and events outside
     negative.
 
+    Parameters
+    ----------
+    border_cache : BorderCache
+        The cache of the detector border. By default the IC86 border is used.
+
+    resolution : float or None
+        If None (the default), calculate the exact distance. Otherwise, look
+        up the distance in a signed distance grid with this resolution (in
+        metres). The maximum error of the lookup is given by
+        border_cache.get_grid(geometry, resolution).max_error.
+
+    endpoint_name : str
+        The key of the endpoint (I3Position) in the frame. Eg. use
+        'TruthEndpoint' for the distance of the truth endpoint.
+
+    output_name : str
+        The key to save the distance under.
+
     Adds To Frame
     -------------
     DistToBorder : I3Double
         The signed minimum distance of the reconstructed endpoint to the detector
-        border.
+        border (saved under output_name).
     """
 
-    reco_endpoint = frame['RecoEndpoint']
+    reco_endpoint = frame[endpoint_name]
     endpoint = (reco_endpoint.x, reco_endpoint.y)
 
-    omgeo = frame['I3Geometry'].omgeo
-    border_strings = [1, 2, 3, 4, 5, 6, 13, 21, 30, 40, 50, 59, 67, 74, 73, 72, 78, 77, 76, 75, 68, 60, 51, 41, 31, 22, 14, 7]  # For IC86
-
-    # Get the (x, y) coordinates of the border doms.
-    detector_border = get_coordinates(omgeo, border_strings)
-
-    dist = point_to_polygon_dist(endpoint, detector_border)
-
-    inside = point_in_polygon(endpoint, detector_border)
-
-    # Endpoints outside detector get negative distances.
-    if not inside:
-        dist = -dist
+    # Endpoints outside detector get negative distances. The detector border
+    # is only rebuilt for a new geometry.
+    if resolution is None:
+        detector_border = border_cache.get_edges(frame['I3Geometry'])
+        dist = signed_dist([endpoint], detector_border)[0]
+    else:
+        grid = border_cache.get_grid(frame['I3Geometry'], resolution)
+        dist = grid([endpoint])[0]
 
-    frame['DistToBorder'] = dataclasses.I3Double(dist)
+    frame[output_name] = dataclasses.I3Double(dist)
@@ -8,7 +8,6 @@ along to these ones. Those functions are contain in geoanalysis.py.
 from __future__ import print_function, division  # 2to3
 
 import numpy as np
-from numpy import linalg
 
 
 def point_to_seg_dist(point, seg_p1, seg_p2):
@@ -37,38 +36,13 @@ def point_to_seg_dist(point, seg_p1, seg_p2):
     >>> p1 = (0, 0)
     >>> p2 = (1, 1)
     >>> point_to_seg_dist(p, p1, p2)
-    0.70710678118654757
+    0.7071067811865476
     """
 
-    # Vectorize the points.
-    point = np.array(point)
-    seg_p1 = np.array(seg_p1)
-    seg_p2 = np.array(seg_p2)
+    dist_sqrd = _edges_dist_sqrd(np.array([point], dtype=float),
+                                 np.array([[seg_p1, seg_p2]], dtype=float))
 
-    seg_vector = seg_p2 - seg_p1  # Line segment vector
-    point_vector = point - seg_p1  # Vector from point to seg_p1
-
-    length_sqrd = linalg.norm(seg_vector) ** 2  # Squared length of line segment.
-    if length_sqrd == 0:  # In this case, seg_p1 == seg_p2
-        # Just return the distance from point to seg_p1.
-        return linalg.norm(point_vector)
-
-    # We can parameterize the line L defined by the line segment as
-    # L = seg_p1 + t * seg_vector.
-
-    # The parameter for the projection of the point_vector onto the line L.
-    t = np.dot(seg_vector, point_vector) / length_sqrd
-
-    if t <= 0:  # Projection lies beyond seg_p1
-        closest_point = seg_p1
-    elif t >= 1:  # Projection lies beyond seg_p2
-        closest_point = seg_p2
-    else:  # Projection lies on the segment
-        closest_point = seg_p1 + t * seg_vector  # Projection onto segment
-
-    distance = linalg.norm(closest_point - point)
-
-    return distance
+    return float(np.sqrt(dist_sqrd[0, 0]))
 
 
 def point_to_polygon_dist(point, polygon):
@@ -104,28 +78,14 @@ def point_to_polygon_dist(point, polygon):
     Notes
     -----
     This function calculates the distance of the point to each line segment
-    of the polygon, and then returns the shortest distance.
+    of the polygon, and then returns the shortest distance. For many points,
+    use edges_dist_and_inside (or signed_dist) instead.
     """
 
-    # Calculate the distance to the first line segment of the polygon.
-    seg_p1 = polygon[0]
-    seg_p2 = polygon[1]
-
-    dist = point_to_seg_dist(point, seg_p1, seg_p2)
+    dist_sqrd = _edges_dist_sqrd(np.array([point], dtype=float),
+                                 polygon_edges(polygon))
 
-    length = len(polygon)
-
-    # Iterate over the rest of the polygon and calculate the distances to the
-    # rest of the line segments.
-    for i in range(1, length):
-        seg_p1 = polygon[i]
-        seg_p2 = polygon[(i + 1) % length]  # To wrap around once we get to the end
-
-        current_dist = point_to_seg_dist(point, seg_p1, seg_p2)
-        if current_dist < dist:
-            dist = current_dist
-
-    return dist
+    return float(np.sqrt(dist_sqrd.min()))
 
 
 def point_in_polygon(point, polygon):
@@ -158,7 +118,9 @@ def point_in_polygon(point, polygon):
     ----------
     This is a Python implementation of the horizontal ray casting algorithm on
     http://paulbourke.net/geometry/polygonmesh/
-    (look for the point in polygon section).
+    (look for the point in polygon section). For a single point the plain
+    loop is much faster than setting up the arrays; edges_dist_and_inside
+    uses the same conditions for many points.
 
     Examples
     --------
@@ -184,3 +146,250 @@ def point_in_polygon(point, polygon):
                             inside = not inside
 
     return inside
+
+
+def polygon_edges(polygon):
+    """
+    Build the array of line segments (edges) of a polygon.
+
+    Parameters
+    ----------
+    polygon: list of tuples
+        The (x, y) coordinates of the vertices of the polygon, in the same
+        format as for point_to_polygon_dist (in order, and without repeating
+        the first point at the end).
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (M, 2, 2), where M is the number of vertices.
+        edges[i, 0] is the first endpoint and edges[i, 1] is the second
+        endpoint of the ith edge. The last edge wraps back to polygon[0].
+
+    Examples
+    --------
+    >>> polygon_edges([(0, 0), (0, 1), (1, 1)])[2]
+    array([[1., 1.],
+           [0., 0.]])
+    """
+
+    vertices = np.array(polygon, dtype=float)
+    next_vertices = np.roll(vertices, -1, axis=0)  # To wrap around at the end
+
+    return np.concatenate((vertices[:, np.newaxis], next_vertices[:, np.newaxis]), axis=1)
+
+
+def edges_dist_and_inside(points, edges, chunk_size=65536):
+    """
+    Calculate the shortest distance from many points to a polygon, and whether
+    each point is inside it, in one vectorized pass.
+
+    Parameters
+    ----------
+    points : array_like
+        The (x, y) coordinates of the points, with shape (N, 2).
+
+    edges : np.ndarray
+        The edges of the polygon, as returned by polygon_edges.
+
+    chunk_size : int
+        The maximum number of points to handle at once. The intermediate
+        arrays have shape (chunk_size, M, 2), so this bounds the memory used
+        for very large inputs.
+
+    Returns
+    -------
+    dist : np.ndarray
+        The shortest distance of each point to the polygon.
+
+    inside : np.ndarray of bool
+        Indicates if each point is inside the polygon.
+
+    Notes
+    -----
+    The distance is the one from point_to_seg_dist, minimized over the edges,
+    and the inside test is the same ray casting algorithm used in
+    point_in_polygon, so the results agree with those functions.
+    """
+
+    points = np.array(points, dtype=float).reshape(-1, 2)
+
+    dist = np.empty(len(points))
+    inside = np.empty(len(points), dtype=bool)
+
+    for start in range(0, len(points), chunk_size):
+        chunk = points[start:start + chunk_size]
+
+        dist[start:start + chunk_size] = np.sqrt(_edges_dist_sqrd(chunk, edges).min(axis=1))
+        inside[start:start + chunk_size] = _edges_crossings(chunk, edges) % 2 == 1
+
+    return dist, inside
+
+
+def signed_dist(points, edges, chunk_size=65536):
+    """
+    Calculate the signed shortest distance from many points to a polygon.
+
+    Points inside the polygon get positive distances, and points outside
+    negative.
+
+    Parameters
+    ----------
+    points : array_like
+        The (x, y) coordinates of the points, with shape (N, 2).
+
+    edges : np.ndarray
+        The edges of the polygon, as returned by polygon_edges.
+
+    chunk_size : int
+        See edges_dist_and_inside.
+
+    Returns
+    -------
+    np.ndarray
+        The signed distance of each point to the polygon.
+
+    Examples
+    --------
+    >>> edges = polygon_edges([(0, 0), (0, 1), (1, 1), (1, 0)])
+    >>> signed_dist([(0.5, 0.75), (2, 0.5)], edges)
+    array([ 0.25, -1.  ])
+    """
+
+    dist, inside = edges_dist_and_inside(points, edges, chunk_size)
+
+    return np.where(inside, dist, -dist)
+
+
+class SignedDistGrid(object):
+    """
+    The signed distance to a polygon, sampled on a square grid.
+
+    Distances are looked up by bilinear interpolation between the four
+    nearest grid points, instead of walking the polygon edges. Points outside
+    the grid fall back on the exact calculation (signed_dist).
+
+    Parameters
+    ----------
+    edges : np.ndarray
+        The edges of the polygon, as returned by polygon_edges.
+
+    resolution : float
+        The spacing of the grid points.
+
+    extent : tuple
+        The (min, max) coordinates covered by the grid, in both x and y.
+
+    Attributes
+    ----------
+    max_error : float
+        Guaranteed maximum error of the interpolated distances (apart from
+        floating point rounding). The signed distance changes by at most the
+        distance moved, so each grid value differs from the true value by at
+        most the distance to that grid point. The weighted average of these
+        distances is at most resolution / sqrt(2) for bilinear interpolation.
+
+    Examples
+    --------
+    >>> edges = polygon_edges([(0, 0), (0, 1), (1, 1), (1, 0)])
+    >>> grid = SignedDistGrid(edges, 0.25, extent=(-1, 2))
+    >>> grid([(0.5, 0.75)])
+    array([0.25])
+    >>> grid.max_error
+    0.17677669529663687
+    """
+
+    def __init__(self, edges, resolution, extent):
+        self.resolution = resolution
+        self.min_coord = extent[0]
+
+        num = int(np.ceil((extent[1] - extent[0]) / resolution)) + 1
+        coords = extent[0] + resolution * np.arange(num)
+
+        grid_x, grid_y = np.meshgrid(coords, coords, indexing='ij')
+        grid_points = np.column_stack((grid_x.ravel(), grid_y.ravel()))
+
+        self.edges = edges
+        self.values = signed_dist(grid_points, edges).reshape(num, num)
+        self.max_error = resolution / 2 ** 0.5
+
+    def __call__(self, points):
+        """
+        Return the interpolated signed distance of each of the (N, 2) points.
+        """
+
+        points = np.array(points, dtype=float).reshape(-1, 2)
+
+        # Position of the points in units of grid cells, and the index of the
+        # lower left grid point of the cell containing them.
+        cell_coords = (points - self.min_coord) / self.resolution
+        lower = np.floor(cell_coords).astype(int)
+
+        num = len(self.values)
+        on_grid = np.all((lower >= 0) & (lower < num - 1), axis=1)
+
+        dist = np.empty(len(points))
+
+        # Bilinear interpolation for the points on the grid.
+        i, j = lower[on_grid, 0], lower[on_grid, 1]
+        s, t = (cell_coords[on_grid] - lower[on_grid]).T
+
+        dist[on_grid] = ((1 - s) * (1 - t) * self.values[i, j] +
+                         s * (1 - t) * self.values[i + 1, j] +
+                         (1 - s) * t * self.values[i, j + 1] +
+                         s * t * self.values[i + 1, j + 1])
+
+        # Do it the slow way for the rest.
+        if not np.all(on_grid):
+            dist[~on_grid] = signed_dist(points[~on_grid], self.edges)
+
+        return dist
+
+
+def _edges_dist_sqrd(points, edges):
+    """
+    Return the (N, M) array of squared distances from each point to each edge.
+    """
+
+    seg_p1 = edges[:, 0]
+    seg_vector = edges[:, 1] - seg_p1  # Line segment vectors, (M, 2)
+    point_vector = points[:, np.newaxis] - seg_p1  # Vectors from seg_p1 to the points, (N, M, 2)
+
+    length_sqrd = np.sum(seg_vector ** 2, axis=1)  # Squared lengths of the line segments.
+
+    # The parameter t of the projection of each point onto each line
+    # L = seg_p1 + t * seg_vector. Clipping t to [0, 1] takes care of the
+    # projections beyond seg_p1 and seg_p2, and when seg_p1 == seg_p2 we just
+    # use the distance to seg_p1 (t = 0).
+    dot = np.sum(point_vector * seg_vector, axis=2)
+    nonzero = length_sqrd != 0
+    t = np.zeros_like(dot)
+    t[:, nonzero] = dot[:, nonzero] / length_sqrd[nonzero]
+    t = np.clip(t, 0, 1)
+
+    delta = point_vector - t[:, :, np.newaxis] * seg_vector
+
+    return np.sum(delta ** 2, axis=2)
+
+
+def _edges_crossings(points, edges):
+    """
+    Return the number of edges crossed by a horizontal ray cast from each
+    point, using the same conditions as point_in_polygon.
+    """
+
+    x = points[:, 0, np.newaxis]
+    y = points[:, 1, np.newaxis]
+    p1x, p1y = edges[:, 0, 0], edges[:, 0, 1]
+    p2x, p2y = edges[:, 1, 0], edges[:, 1, 1]
+
+    straddles = (y > np.minimum(p1y, p2y)) & (y <= np.maximum(p1y, p2y)) & (x <= np.maximum(p1x, p2x))
+
+    # Horizontal edges are never crossed, so avoid dividing by zero for them.
+    not_horizontal = p1y != p2y
+    delta_y = np.where(not_horizontal, p2y - p1y, 1)
+    xinters = (y - p1y) * (p2x - p1x) / delta_y + p1x
+
+    crosses = straddles & not_horizontal & ((p1x == p2x) | (x <= xinters))
+
+    return crosses.sum(axis=1)
@@ -0,0 +1,316 @@
+"""
+Timing instrumentation for the processing tray.
+
+Instrumentation.wrap_tray returns a stand-in for the tray that wraps every
+Python module added to it (functions, and I3Module classes with their own
+Process or Physics method). The wrapper records the number of calls, the wall
+time of each call, and the number of frames passed and dropped.
+
+The C++ modules (eg. the I3SimpleFitter reconstructions) and segments can't be
+wrapped, so their time is measured as the gap between the end of one Python
+module and the start of the next one on the same frame. Each gap is labelled
+with the names of the modules and segments added to the tray in between.
+"""
+
+from __future__ import print_function, division  # 2to3
+
+import inspect
+import json
+import timeit
+
+import numpy as np
+
+from pulses import frame_id
+
+
+class Instrumentation(object):
+    """
+    The timing statistics of the modules.
+
+    Attributes
+    ----------
+    modules : dict[str] -> dict
+        The 'times' (s) of each call, and the number of frames 'passed' and
+        'dropped' by each Python module.
+
+    gaps : dict[tuple] -> dict
+        The 'between' labels and 'times' (s) of the gaps between each pair of
+        consecutive Python modules.
+
+    order : list of str
+        The names of the Python modules, in the order they were added.
+    """
+
+    def __init__(self):
+        self.start = timeit.default_timer()
+        self.modules = {}
+        self.gaps = {}
+        self.order = []
+
+        # The modules and segments added since the last Python module.
+        self.between = []
+        self.previous_name = None
+
+        # The last Python module called, the frame it was called on, and when
+        # it finished (if it passed the frame on).
+        self.last = None
+
+    def wrap_tray(self, tray):
+        """
+        Return a stand-in for the tray that instruments the modules added to
+        it.
+        """
+
+        # A new tray starts from the first module again.
+        self.between = []
+        self.previous_name = None
+        self.last = None
+
+        return InstrumentedTray(tray, self)
+
+    def add_label(self, name):
+        """
+        Record that a module or segment that can't be wrapped was added.
+        """
+
+        self.between.append(name)
+
+    def register(self, name):
+        """
+        Register a new Python module, coming after the modules and segments
+        added so far.
+
+        Returns
+        -------
+        stats : dict
+            The statistics of the module (see modules).
+
+        gap_key : tuple or None
+            The key of the gap before the module (None for the first module).
+        """
+
+        # The statistics are added up over all the trays a module is added to.
+        if name not in self.modules:
+            self.modules[name] = {'times': [], 'passed': 0, 'dropped': 0}
+            self.order.append(name)
+
+        gap_key = None
+        if self.previous_name is not None:
+            gap_key = (self.previous_name, name)
+            if gap_key not in self.gaps:
+                self.gaps[gap_key] = {'between': self.between, 'times': []}
+        self.previous_name = name
+        self.between = []
+
+        return self.modules[name], gap_key
+
+    def record(self, name, stats, gap_key, frame, start, end, passed):
+        """
+        Record a call of a Python module on a frame, from start to end, and
+        the gap before it.
+        """
+
+        current_id = frame_id(frame) if frame.Has('I3EventHeader') else None
+        if gap_key is not None and self.last is not None:
+            last_name, last_id, last_end = self.last
+            if last_name == gap_key[0] and last_id == current_id:
+                self.gaps[gap_key]['times'].append(start - last_end)
+
+        stats['times'].append(end - start)
+
+        if passed:
+            stats['passed'] += 1
+            self.last = (name, current_id, end)
+        else:
+            stats['dropped'] += 1
+            self.last = None
+
+    def wrap(self, function, name, kwargs):
+        """
+        Return a function module that calls function(frame, **kwargs) and
+        records its timing.
+        """
+
+        stats, gap_key = self.register(name)
+
+        def instrumented(frame):
+            start = timeit.default_timer()
+            result = function(frame, **kwargs)
+            self.record(name, stats, gap_key, frame, start, timeit.default_timer(), result is not False)
+
+            return result
+
+        return instrumented
+
+    def wrap_class(self, module, name):
+        """
+        Return a subclass of the I3Module class module that records its
+        timing.
+
+        If the class has its own Process method, every call of it is timed
+        (with the frame it pops). Otherwise its Physics method is timed, so
+        like the function modules only the Physics frames count. A frame is
+        counted as passed if the module pushed it.
+        """
+
+        stats, gap_key = self.register(name)
+        instrumentation = self
+
+        if _defines(module, 'Process'):
+            class Instrumented(module):
+                def PopFrame(self):
+                    self.instrumented_frame = module.PopFrame(self)
+                    return self.instrumented_frame
+
+                def PushFrame(self, frame, *args):
+                    self.instrumented_pushed = True
+                    return module.PushFrame(self, frame, *args)
+
+                def Process(self):
+                    self.instrumented_frame = None
+                    self.instrumented_pushed = False
+
+                    start = timeit.default_timer()
+                    module.Process(self)
+                    end = timeit.default_timer()
+
+                    if self.instrumented_frame is not None:
+                        instrumentation.record(name, stats, gap_key, self.instrumented_frame,
+                                               start, end, self.instrumented_pushed)
+        else:
+            class Instrumented(module):
+                def PushFrame(self, frame, *args):
+                    self.instrumented_pushed = True
+                    return module.PushFrame(self, frame, *args)
+
+                def Physics(self, frame):
+                    self.instrumented_pushed = False
+
+                    start = timeit.default_timer()
+                    module.Physics(self, frame)
+                    end = timeit.default_timer()
+
+                    instrumentation.record(name, stats, gap_key, frame, start, end, self.instrumented_pushed)
+
+        Instrumented.__name__ = module.__name__
+
+        return Instrumented
+
+    def report(self):
+        """
+        Return the statistics as a dict, ready to be saved as JSON.
+        """
+
+        wall_time = timeit.default_timer() - self.start
+
+        modules = []
+        for name in self.order:
+            stats = self.modules[name]
+            module = {'name': name, 'calls': len(stats['times']),
+                      'passed': stats['passed'], 'dropped': stats['dropped']}
+            module.update(_time_stats(stats['times']))
+            modules.append(module)
+
+        gaps = []
+        fitter_time = 0
+        for after, before in sorted(self.gaps, key=lambda key: self.order.index(key[1])):
+            gap = self.gaps[(after, before)]
+            entry = {'after': after, 'before': before, 'between': gap['between'],
+                     'calls': len(gap['times'])}
+            entry.update(_time_stats(gap['times']))
+            gaps.append(entry)
+
+            if any(label.startswith('MPEFit') for label in gap['between']):
+                fitter_time += entry['total']
+
+        return {'wall_time': wall_time, 'modules': modules, 'gaps': gaps,
+                'fitter_time': fitter_time, 'fitter_share': fitter_time / wall_time if wall_time else 0}
+
+    def save(self, path):
+        """
+        Save the report to a JSON file, and print it as a table.
+        """
+
+        report = self.report()
+
+        with open(path, 'w') as outfile:
+            json.dump(report, outfile, indent=2, sort_keys=True)
+
+        row = '{:<36}{:>9}{:>9}{:>9}{:>11}{:>11}{:>11}{:>11}'
+        print(row.format('Module', 'Calls', 'Passed', 'Dropped', 'Total (s)', 'p50 (ms)', 'p90 (ms)', 'p99 (ms)'))
+
+        for module in report['modules']:
+            print(row.format(module['name'], module['calls'], module['passed'], module['dropped'],
+                             '{:.2f}'.format(module['total']), '{:.3f}'.format(module['p50'] * 1e3),
+                             '{:.3f}'.format(module['p90'] * 1e3), '{:.3f}'.format(module['p99'] * 1e3)))
+
+        for gap in report['gaps']:
+            if not gap['between']:
+                continue
+            name = '[{}]'.format(', '.join(gap['between']))
+            if len(name) > 35:
+                name = name[:32] + '...'
+            print(row.format(name, gap['calls'], '', '',
+                             '{:.2f}'.format(gap['total']), '{:.3f}'.format(gap['p50'] * 1e3),
+                             '{:.3f}'.format(gap['p90'] * 1e3), '{:.3f}'.format(gap['p99'] * 1e3)))
+
+        print('Wall time {:.1f} s, {:.1%} of it in the MPEFit reconstructions'.format(
+            report['wall_time'], report['fitter_share']))
+
+
+def _defines(module, method):
+    """
+    Return whether a Python I3Module class (or one of its Python base
+    classes) defines the method, rather than inheriting it from IceTray.
+    """
+
+    for cls in inspect.getmro(module):
+        if cls.__module__.startswith('icecube'):
+            return False
+        if method in vars(cls):
+            return True
+
+    return False
+
+
+def _time_stats(times):
+    """
+    Return the total, mean, and 50th, 90th and 99th percentile of the times.
+    """
+
+    if not times:
+        return {'total': 0, 'mean': 0, 'p50': 0, 'p90': 0, 'p99': 0}
+
+    times = np.array(times)
+    p50, p90, p99 = np.percentile(times, [50, 90, 99])
+
+    return {'total': float(times.sum()), 'mean': float(times.mean()),
+            'p50': float(p50), 'p90': float(p90), 'p99': float(p99)}
+
+
+class InstrumentedTray(object):
+    """
+    A stand-in for an I3Tray that instruments the Python modules added to
+    it. Everything else is passed on to the tray.
+    """
+
+    def __init__(self, tray, instrumentation):
+        self.tray = tray
+        self.instrumentation = instrumentation
+
+    def AddModule(self, module, name, **kwargs):
+        if inspect.isfunction(module):
+            return self.tray.AddModule(self.instrumentation.wrap(module, name, kwargs), name)
+
+        if inspect.isclass(module) and (_defines(module, 'Process') or _defines(module, 'Physics')):
+            return self.tray.AddModule(self.instrumentation.wrap_class(module, name), name, **kwargs)
+
+        self.instrumentation.add_label(name)
+        return self.tray.AddModule(module, name, **kwargs)
+
+    def AddSegment(self, segment, name, **kwargs):
+        self.instrumentation.add_label(name)
+        return self.tray.AddSegment(segment, name, **kwargs)
+
+    def __getattr__(self, attr):
+        return getattr(self.tray, attr)
@@ -7,15 +7,26 @@ Process the I3 files.
 from __future__ import print_function, division  # 2to3
 
 import argparse
+import os
+import sys
 
 from icecube import dataio, icetray, gulliver, simclasses, dataclasses, photonics_service, phys_services
 from icecube.common_variables import direct_hits, hit_multiplicity, hit_statistics
 from I3Tray import I3Tray, I3Units, load
 
-from filters import in_ice, min_bias, SMT8, MPEFit, InIceSMTTriggered
+from filters import in_ice, min_bias, SMT8, MPEFit, InIceSMTTriggered, AdaptiveFilter, early_event_cuts, find_early_cuts, cut_flow
 from general import get_truth_muon, get_truth_endpoint, count_hits, reco_endpoint, move_cut_variables
-from geoanalysis import calc_dist_to_border
-from domanalysis import om_partition, dom_data
+from geoanalysis import calc_dist_to_border, border_cache
+from domanalysis import om_partition, dom_data, dom_index, partition_memory
+from pulses import pulse_cache, clear_pulse_cache
+from fitcache import FitCache, config_hash, fit_cache_lookup, fit_cache_store
+from columns import ColumnWriter, write_columns
+from instrument import Instrumentation
+from progress import Progress, ProgressModule
+from checkpoint import FrameRange, SegmentWriter, load_checkpoint, merge_parts
+
+# The fused mode uses the cut functions from the cut directory.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cut'))
 
 load('libipdf')
 load('libgulliver')
@@ -25,41 +36,106 @@ load('libstatic-twc')
 load('libjeb-filter-2012')
 
 
-def main():
+def load_cut_options(path):
+    """
+    Import the cut options module (eg. cut_options_example.py) at the path.
+    """
 
-    parser = argparse.ArgumentParser(description='script for proccessing I3 files')
-    parser.add_argument('gcd', help='GCD file for the data')
-    parser.add_argument('data', help='data file for processing')
-    parser.add_argument('ofile', help='name of output file')
-    parser.add_argument('-s', '--sim', help='turn on extra processing for sim files',
-                        action='store_true')
-    args = parser.parse_args()
+    name = os.path.splitext(os.path.basename(path))[0]
+
+    try:
+        from importlib.util import spec_from_file_location, module_from_spec
+    except ImportError:
+        import imp
+        return imp.load_source(name, path)
+
+    spec = spec_from_file_location(name, path)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
 
-    # Don't touch, unless you know what you're doing
-    options = {}
-    options['pulses_name'] = 'TWSRTOfflinePulses'
-    options['max_dist'] = 140
-    options['partitions'] = 5
+
+def new_tray(options):
+    """
+    Return a new I3Tray, instrumented if options['instrumentation'] is set.
+    """
 
     tray = I3Tray()
+    if options['instrumentation'] is not None:
+        tray = options['instrumentation'].wrap_tray(tray)
 
-    # Read the files.
-    tray.AddModule('I3Reader', 'I3Reader',
-                   Filenamelist=[args.gcd, args.data])
+    return tray
 
-    # Filters
 
-    # Filter the ones with sub_event_stream == in_ice
-    tray.AddModule(in_ice, 'in_ice')
+def add_cut_variables(tray, args, options):
+    """
+    Add the calculations of the cut variables to the tray.
+    """
 
-    # Check in FilterMinBias_11 that condition_passed and prescale_passed are both true
-    tray.AddModule(min_bias, 'min_bias')
+    # General
 
-    # Make sure that the length of TWOfflinePulsesHLC is >= 8
-    tray.AddModule(SMT8, 'SMT8')
+    # Calculate cut variables
+    tray.AddSegment(direct_hits.I3DirectHitsCalculatorSegment, 'I3DirectHits',
+                    PulseSeriesMapName=options['pulses_name'],
+                    ParticleName='MPEFit',
+                    OutputI3DirectHitsValuesBaseName='MPEFitDirectHits')
 
-    # Check that the fit_status of MPEFit is OK, and that 40 < zenith < 70
-    tray.AddModule(MPEFit, 'MPEFit')
+    tray.AddSegment(hit_multiplicity.I3HitMultiplicityCalculatorSegment, 'I3HitMultiplicity',
+                    PulseSeriesMapName=options['pulses_name'],
+                    OutputI3HitMultiplicityValuesName='HitMultiplicityValues')
+
+    tray.AddSegment(hit_statistics.I3HitStatisticsCalculatorSegment, 'I3HitStatistics',
+                    PulseSeriesMapName=options['pulses_name'],
+                    OutputI3HitStatisticsValuesName='HitStatisticsValues')
+
+    # Move the cut variables into the top level of the frame.
+    tray.AddModule(move_cut_variables, 'move_cut_variables',
+                   direct_hits_name='MPEFitDirectHits',
+                   hit_multiplicity_name='HitMultiplicityValues',
+                   fit_params_name='MPEFitFitParams')
+
+    # Calculate ICAnalysisHits, DCAnalysisHits, ICNHits, and DCNHits
+    tray.AddModule(count_hits, 'count_hits',
+                   pulses_name=options['pulses_name'])
+
+    if args.sim:
+        # Count the number of in ice muons and get the truth muon
+        tray.AddModule(get_truth_muon, 'get_truth_muon')
+        tray.AddModule(get_truth_endpoint, 'get_truth_endpoint')
+
+    # Geoanalysis
+
+    # Calculate the distance of each event to the detector border.
+    tray.AddModule(calc_dist_to_border, 'calc_dist_to_border',
+                   resolution=args.border_resolution)
+
+
+def add_processing(tray, args, options):
+    """
+    Add the filters, reconstructions, and calculations to the tray (everything
+    between reading and writing the files).
+    """
+
+    # Count the frames read for the progress reports.
+    if options['progress'] is not None:
+        tray.AddModule(ProgressModule, 'progress_read',
+                       Progress=options['progress'],
+                       Count='read')
+
+    # Start the cache of the applied pulse series masks afresh for each frame.
+    tray.AddModule(clear_pulse_cache, 'clear_pulse_cache')
+
+    # Filters
+
+    # in_ice: Filter the ones with sub_event_stream == in_ice
+    # min_bias: Check in FilterMinBias_11 that condition_passed and prescale_passed are both true
+    # SMT8: Make sure that the length of TWOfflinePulsesHLC is >= 8
+    # MPEFit: Check that the fit_status of MPEFit is OK, and that 40 < zenith < 70
+    # These are independent of each other, so AdaptiveFilter applies them in
+    # the cheapest order (keeping exactly the same frames).
+    tray.AddModule(AdaptiveFilter, 'base_filters',
+                   Filters=[in_ice, min_bias, SMT8, MPEFit])
 
     # Trigger check
     # jeb-filter-2012
@@ -82,41 +158,60 @@ def main():
     tray.AddModule(reco_endpoint, 'reco_endpoint',
                    endpoint_fit='FiniteRecoFit')
 
+    # Event cuts
+
+    # Make the event cuts from the cut options that only need the cut
+    # variables, so the doomed events skip the reconstructions. The cut
+    # variables are then calculated before the reconstructions instead of
+    # after them.
+    if options['early_cuts']:
+        add_cut_variables(tray, args, options)
+        tray.AddModule(early_event_cuts, 'early_event_cuts',
+                       event_cuts=options['early_cuts'])
+
     # Domanalysis
 
     # Recalculate recos on subset of Doms (above dust layer)
+    # The service settings are kept in dicts, so they can be hashed for the
+    # fit cache.
     # lilliput
-    tray.AddService('I3SimpleParametrizationFactory', 'SimpleTrack',
-                    StepX=20 * I3Units.m,                              # Set to 1/50 the size of the detector
-                    StepY=20 * I3Units.m,                              # Set to 1/50 the size of the detector
-                    StepZ=20 * I3Units.m,                              # Set to 1/50 the size of the detector
-                    StepZenith=0.1 * I3Units.radian,                   # Set to 1/30 the size of the detector
-                    StepAzimuth=0.2 * I3Units.radian,                  # Set to 1/30 the size of the detector
-                    StepLinE=0,                                        # Default
-                    StepLogE=0,                                        # Default
-                    StepT=0,                                           # Default
-                    BoundsAzimuth=[0, 0],                              # Default
-                    BoundsZenith=[0, 0],                               # Default
-                    BoundsT=[0, 0],                                    # Default
-                    BoundsX=[-2000 * I3Units.m, +2000 * I3Units.m],    # Set bounds to twice the size of the detector
-                    BoundsY=[-2000 * I3Units.m, +2000 * I3Units.m],    # Set bounds to twice the size of the detector
-                    BoundsZ=[-2000 * I3Units.m, +2000 * I3Units.m])    # Set bounds to twice the size of the detector
+    parametrization_settings = dict(
+        StepX=20 * I3Units.m,                              # Set to 1/50 the size of the detector
+        StepY=20 * I3Units.m,                              # Set to 1/50 the size of the detector
+        StepZ=20 * I3Units.m,                              # Set to 1/50 the size of the detector
+        StepZenith=0.1 * I3Units.radian,                   # Set to 1/30 the size of the detector
+        StepAzimuth=0.2 * I3Units.radian,                  # Set to 1/30 the size of the detector
+        StepLinE=0,                                        # Default
+        StepLogE=0,                                        # Default
+        StepT=0,                                           # Default
+        BoundsAzimuth=[0, 0],                              # Default
+        BoundsZenith=[0, 0],                               # Default
+        BoundsT=[0, 0],                                    # Default
+        BoundsX=[-2000 * I3Units.m, +2000 * I3Units.m],    # Set bounds to twice the size of the detector
+        BoundsY=[-2000 * I3Units.m, +2000 * I3Units.m],    # Set bounds to twice the size of the detector
+        BoundsZ=[-2000 * I3Units.m, +2000 * I3Units.m])    # Set bounds to twice the size of the detector
+
+    tray.AddService('I3SimpleParametrizationFactory', 'SimpleTrack', **parametrization_settings)
 
     # lilliput
-    tray.AddService('I3GulliverMinuitFactory', 'Minuit',
-                    Algorithm='SIMPLEX',    # Default
-                    FlatnessCheck=True,     # Default
-                    MaxIterations=1000,     # Only need 1000 iterations
-                    MinuitPrintLevel=-2,    # Default
-                    MinuitStrategy=2,       # Default
-                    Tolerance=0.01)         # Set tolerance to 0.01
+    minimizer_settings = dict(
+        Algorithm='SIMPLEX',    # Default
+        FlatnessCheck=True,     # Default
+        MaxIterations=1000,     # Only need 1000 iterations
+        MinuitPrintLevel=-2,    # Default
+        MinuitStrategy=2,       # Default
+        Tolerance=0.01)         # Set tolerance to 0.01
+
+    tray.AddService('I3GulliverMinuitFactory', 'Minuit', **minimizer_settings)
 
     # Seed the reduced SPESingle with the full SPESingle
     # lilliput
-    tray.AddService('I3BasicSeedServiceFactory', 'MPESeed',
-                    InputReadout=options['pulses_name'],
-                    TimeShiftType='TFirst',
-                    FirstGuesses=['MPEFit'])
+    seed_settings = dict(
+        InputReadout=options['pulses_name'],
+        TimeShiftType='TFirst',
+        FirstGuesses=['MPEFit'])
+
+    tray.AddService('I3BasicSeedServiceFactory', 'MPESeed', **seed_settings)
 
     # Subset reconstruction time. This is slightly complicated. Each DOM is
     # placed into a partition based on (dom.string + dom.om) %
@@ -137,76 +232,286 @@ def main():
                    options=options)
 
     for partition in range(options['partitions']):
+        fit_name = 'MPEFit{}'.format(partition)
+
         # lilliput
-        tray.AddService('I3GulliverIPDFPandelFactory', 'MPEPandel{}'.format(partition),
-                        InputReadout=output_name.format(partition),    # Use pulses given to thes function as arg
-                        EventType='InfiniteMuon',                      # Default
-                        Likelihood='MPE',                              # MPE
-                        PEProb='GaussConvolutedFastApproximation',     # New approximation for convaluted
-                        IceModel=2,                                    # Default
-                        IceFile='',                                    # Default
-                        AbsorptionLength=98.0 * I3Units.m,             # Default
-                        JitterTime=4.0 * I3Units.ns,                   # Use small jitter time
-                        NoiseProbability=10 * I3Units.hertz)           # Added a little noise term
+        likelihood_settings = dict(
+            InputReadout=output_name.format(partition),    # Use pulses given to thes function as arg
+            EventType='InfiniteMuon',                      # Default
+            Likelihood='MPE',                              # MPE
+            PEProb='GaussConvolutedFastApproximation',     # New approximation for convaluted
+            IceModel=2,                                    # Default
+            IceFile='',                                    # Default
+            AbsorptionLength=98.0 * I3Units.m,             # Default
+            JitterTime=4.0 * I3Units.ns,                   # Use small jitter time
+            NoiseProbability=10 * I3Units.hertz)           # Added a little noise term
+
+        tray.AddService('I3GulliverIPDFPandelFactory', 'MPEPandel{}'.format(partition), **likelihood_settings)
+
+        fit_cache = options['fit_cache']
+        if fit_cache is not None:
+            # Everything the fit depends on: the pulse selection and the
+            # service settings.
+            config = config_hash({'pulses_name': options['pulses_name'],
+                                  'partitions': options['partitions'],
+                                  'parametrization': parametrization_settings,
+                                  'minimizer': minimizer_settings,
+                                  'seed': seed_settings,
+                                  'likelihood': likelihood_settings})
+
+            # Get the fit from the cache if it's there.
+            tray.AddModule(fit_cache_lookup, 'fit_cache_lookup{}'.format(partition),
+                           fit_cache=fit_cache,
+                           partition=partition,
+                           config=config,
+                           fit_name=fit_name)
 
         # gulliver-modules
-        tray.AddModule('I3SimpleFitter', 'MPEFit{}'.format(partition),
+        tray.AddModule('I3SimpleFitter', fit_name,
                        # RandomService=SOBOL,                          # Name of randomizer service
                        SeedService='MPESeed',                          # Name of seed service
                        Parametrization='SimpleTrack',                  # Name of track parametrization service
                        LogLikelihood='MPEPandel{}'.format(partition),  # Name of likelihood service
-                       Minimizer='Minuit')                             # Name of minimizer service
+                       Minimizer='Minuit',                             # Name of minimizer service
+                       If=lambda frame, fit_name=fit_name: not frame.Has(fit_name))  # Only fit if the fit wasn't in the cache
+
+        if fit_cache is not None:
+            # Save the new fits to the cache.
+            tray.AddModule(fit_cache_store, 'fit_cache_store{}'.format(partition),
+                           fit_cache=fit_cache,
+                           partition=partition,
+                           config=config,
+                           fit_name=fit_name)
 
     # This uses the MPEFit's to calculate TotalCharge, RecoDistance, etc.
     tray.AddModule(dom_data, 'dom_data',
                    reco_fit='MPEFit{}',
                    options=options)
 
-    # General
-
-    # Calculate cut variables
-    tray.AddSegment(direct_hits.I3DirectHitsCalculatorSegment, 'I3DirectHits',
-                    PulseSeriesMapName=options['pulses_name'],
-                    ParticleName='MPEFit',
-                    OutputI3DirectHitsValuesBaseName='MPEFitDirectHits')
+    if not options['early_cuts']:
+        add_cut_variables(tray, args, options)
 
-    tray.AddSegment(hit_multiplicity.I3HitMultiplicityCalculatorSegment, 'I3HitMultiplicity',
-                    PulseSeriesMapName=options['pulses_name'],
-                    OutputI3HitMultiplicityValuesName='HitMultiplicityValues')
+    # Columnar output
 
-    tray.AddSegment(hit_statistics.I3HitStatisticsCalculatorSegment, 'I3HitStatistics',
-                    PulseSeriesMapName=options['pulses_name'],
-                    OutputI3HitStatisticsValuesName='HitStatisticsValues')
+    # Save the cut variables and per-dom data as columns (if asked for).
+    if options['columns'] is not None:
+        tray.AddModule(write_columns, 'write_columns',
+                       column_writer=options['columns'])
 
-    # Move the cut variables into the top level of the frame.
-    tray.AddModule(move_cut_variables, 'move_cut_variables',
-                   direct_hits_name='MPEFitDirectHits',
-                   hit_multiplicity_name='HitMultiplicityValues'
-                   fit_params_name='MPEFitFitParams')
+    # Count the frames that passed for the progress reports.
+    if options['progress'] is not None:
+        tray.AddModule(ProgressModule, 'progress_passed',
+                       Progress=options['progress'],
+                       Count='passed')
 
-    # Calculate ICAnalysisHits, DCAnalysisHits, ICNHits, and DCNHits
-    tray.AddModule(count_hits, 'count_hits',
-                   pulses_name=options['pulses_name'])
 
-    if args.sim:
-        # Count the number of in ice muons and get the truth muon
-        tray.AddModule(get_truth_muon, 'get_truth_muon')
-        tray.AddModule(get_truth_endpoint, 'get_truth_endpoint')
+# The keys that aren't written to the processed I3 files.
+skip_keys = ['InIceRecoPulseSeriesPattern.*']
 
-    # Geoanalysis
 
-    # Calculate the distance of each event to the detector border.
-    tray.AddModule(calc_dist_to_border, 'calc_dist_to_border')
+def add_writer(tray, ofile):
+    """
+    Add the I3Writer for the output file to the tray.
+    """
 
-    # Write out the data to an I3 file
     tray.AddModule('I3Writer', 'I3Writer',
-                   FileName=args.ofile,
-                   SkipKeys=['InIceRecoPulseSeriesPattern.*'],
+                   FileName=ofile,
+                   SkipKeys=skip_keys,
                    DropOrphanStreams=[icetray.I3Frame.DAQ],
                    Streams=[icetray.I3Frame.DAQ, icetray.I3Frame.Physics])
 
+
+def add_cuts(tray, cut_options, hdf_file, options):
+    """
+    Add the cuts and the HDF5 output of cut.py to the tray, so the processed
+    frames go straight to the HDF5 file (the fused mode).
+    """
+
+    from icecube.hdfwriter import I3HDFTableService
+    from icecube.tableio import I3TableWriter
+
+    from functions import make_event_cuts, make_dom_cuts
+
+    # The partition pulses aren't in the processed I3 files, so they aren't
+    # written here either.
+    tray.AddModule('Delete', 'delete_partition_pulses',
+                   Keys=['InIceRecoPulseSeriesPattern{}'.format(partition) for partition in range(options['partitions'])])
+
+    # Cut out the frames that do not pass the event cuts.
+    tray.AddModule(make_event_cuts, 'make_event_cuts',
+                   event_cuts=cut_options.event_cuts)
+
+    # Make the dom cuts on the frames that are left.
+    tray.AddModule(make_dom_cuts, 'make_dom_cuts',
+                   dom_cuts=cut_options.dom_cuts,
+                   dom_keys=cut_options.dom_keys)
+
+    tray.AddModule(I3TableWriter, 'I3TableWriter',
+                   TableService=I3HDFTableService(hdf_file),
+                   BookEverything=True,
+                   SubEventStreams=['in_ice'])
+
+
+def process_in_segments(args, options):
+    """
+    Process the data file in segments of args.checkpoint DAQ frames, saving a
+    checkpoint after each one (see checkpoint.py).
+
+    The whole file is processed in one pass, with the output of each segment
+    going to its own part file. If there is a checkpoint from an earlier run
+    with the same arguments, the segments it has already processed are
+    skipped.
+    """
+
+    checkpoint = load_checkpoint(args.ofile, args.gcd, args.data, args.checkpoint)
+    if checkpoint['next_frame']:
+        print('Resuming at DAQ frame {} (after event {})'.format(checkpoint['next_frame'], checkpoint['last_event']))
+
+    # Remove the columns written after the checkpoint.
+    column_writer = options['columns']
+    if column_writer is not None:
+        column_writer.truncate(checkpoint.get('column_events', 0))
+
+    position = {}
+
+    tray = new_tray(options)
+    tray.AddModule('I3Reader', 'I3Reader',
+                   Filenamelist=[args.gcd, args.data])
+    tray.AddModule(FrameRange, 'FrameRange',
+                   Start=checkpoint['next_frame'],
+                   Position=position)
+    add_processing(tray, args, options)
+    tray.AddModule(SegmentWriter, 'SegmentWriter',
+                   OutputFile=args.ofile,
+                   Checkpoint=checkpoint,
+                   Position=position,
+                   ColumnWriter=column_writer,
+                   SkipKeys=skip_keys)
     tray.Execute()
     tray.Finish()
 
+    merge_parts(args.ofile, checkpoint)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='script for proccessing I3 files')
+    parser.add_argument('gcd', help='GCD file for the data')
+    parser.add_argument('data', help='data file for processing')
+    parser.add_argument('ofile', help='name of output file')
+    parser.add_argument('-s', '--sim', help='turn on extra processing for sim files',
+                        action='store_true')
+    parser.add_argument('--border-resolution', help='look up DistToBorder in a grid with this resolution (in metres) instead of calculating it exactly',
+                        type=float)
+    parser.add_argument('--checkpoint', help='process the file in segments of this many DAQ frames, saving a checkpoint after each one so a killed job can be resumed by running it again',
+                        type=int)
+    parser.add_argument('--fit-cache', help='SQLite file to cache the partition fits in; fits already in it are not redone')
+    parser.add_argument('--columns', help='also save the cut variables and per-dom data to this HDF5 file as columns (see columns.py)')
+    parser.add_argument('--hdf', help='also make the cuts in the --cut-options file and write the result to this HDF5 file, like cut.py (the fused mode)')
+    parser.add_argument('--no-i3', help='do not write the processed I3 file (ofile), only the --hdf output',
+                        action='store_true')
+    parser.add_argument('--instrument', help='time the modules and save the report to this JSON file')
+    parser.add_argument('--progress', help='report the progress every this many seconds',
+                        type=float)
+    parser.add_argument('--status-file', help='also save the progress reports to this JSON file (needs --progress)')
+    parser.add_argument('--cut-options', help='cut options file (see cut_options_example.py); the event cuts that only need variables calculated before the reconstructions are made before them, so those events are not in the output')
+    args = parser.parse_args()
+
+    if args.hdf and not args.cut_options:
+        parser.error('--hdf needs --cut-options')
+    if args.hdf and args.checkpoint:
+        parser.error('--hdf can not be used with --checkpoint')
+    if args.no_i3 and not args.hdf:
+        parser.error('--no-i3 needs --hdf')
+
+    # Don't touch, unless you know what you're doing
+    options = {}
+    options['pulses_name'] = 'TWSRTOfflinePulses'
+    options['max_dist'] = 140
+    options['partitions'] = 5
+    options['engine'] = 'calculator'  # or 'numpy' for the vectorized per-dom calculations
+    options['partition_mode'] = 'copy'  # or 'mask' to partition the pulses without copying them
+
+    # The per-dom data can be calculated for several configurations in one
+    # pass (eg. for systematics studies). Each one adds the per-dom keys with
+    # its suffix. Without this, there is one configuration with no suffix,
+    # options['max_dist'], and a 1000 ns residual window.
+    # options['dom_configs'] = [{'suffix': '', 'max_dist': 140, 'residual_window': 1000},
+    #                           {'suffix': 'Dist120', 'max_dist': 120, 'residual_window': 1000},
+    #                           {'suffix': 'Window500', 'max_dist': 140, 'residual_window': 500}]
+
+    # The progress reports (if any).
+    options['progress'] = None
+    if args.progress:
+        options['progress'] = Progress([args.gcd, args.data], args.progress, args.status_file)
+
+    # The timing instrumentation (if any).
+    options['instrumentation'] = None
+    if args.instrument:
+        options['instrumentation'] = Instrumentation()
+
+    # The cache of the partition fits (if any).
+    options['fit_cache'] = None
+    if args.fit_cache:
+        options['fit_cache'] = FitCache(args.fit_cache)
+
+    # The columnar output (if any). With checkpoints, it is added to after
+    # the last checkpoint.
+    options['columns'] = None
+    if args.columns:
+        options['columns'] = ColumnWriter(args.columns, append=bool(args.checkpoint))
+
+    # The event cuts to make before the reconstructions (if any).
+    options['early_cuts'] = {}
+    cut_options = None
+    if args.cut_options:
+        cut_options = load_cut_options(args.cut_options)
+        options['early_cuts'] = find_early_cuts(cut_options.event_cuts)
+        print('Making the event cuts on {} before the reconstructions'.format(', '.join(sorted(options['early_cuts']))))
+
+    if args.checkpoint:
+        process_in_segments(args, options)
+    else:
+        tray = new_tray(options)
+        tray.AddModule('I3Reader', 'I3Reader',
+                       Filenamelist=[args.gcd, args.data])
+        add_processing(tray, args, options)
+        if not args.no_i3:
+            add_writer(tray, args.ofile)
+        if args.hdf:
+            add_cuts(tray, cut_options, args.hdf, options)
+        tray.Execute()
+        tray.Finish()
+
+        if args.hdf:
+            # Write the cuts to the HDF5 as metadata (as cut.py does).
+            from functions import write_cut_metadata
+            write_cut_metadata(args.hdf, cut_options.event_cuts, cut_options.dom_cuts)
+
+    if options['progress'] is not None:
+        options['progress'].report(done=True)
+
+    if options['columns'] is not None:
+        options['columns'].close()
+
+    if options['instrumentation'] is not None:
+        options['instrumentation'].save(args.instrument)
+
+    print('Detector border built {} time(s)'.format(border_cache.misses))
+    for grid in border_cache.grids.values():
+        print('DistToBorder looked up with a maximum error of {:.3f} m'.format(grid.max_error))
+    print('dom_data looked at {} of {} candidate DOMs'.format(dom_index.total_after, dom_index.total_before))
+    print('Pulse series masks applied {} time(s), reused {} time(s)'.format(pulse_cache.misses, pulse_cache.hits))
+    if options['early_cuts']:
+        cut_flow.report(fits_per_frame=options['partitions'])
+    if options['fit_cache'] is not None:
+        fit_cache = options['fit_cache']
+        fit_cache.close()
+        lookups = fit_cache.hits + fit_cache.misses
+        if lookups:
+            print('Fit cache: {} hits, {} misses ({:.1%} hit rate)'.format(fit_cache.hits, fit_cache.misses, fit_cache.hits / lookups))
+    if partition_memory.frames:
+        print('Partition masks saved {:.1f} kB per frame'.format(partition_memory.total / partition_memory.frames / 1e3))
+
 if __name__ == '__main__':
     main()
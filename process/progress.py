@@ -0,0 +1,212 @@
+"""
+Progress reports for long running trays.
+
+The Progress counts the DAQ frames read and the Physics frames passed through
+the tray, and every so often prints the counts, the (smoothed) frame rate, the
+number of bytes read from the input files, and an estimate of the time left.
+The same numbers can be saved to a small JSON status file for a scheduler to
+poll.
+
+The bytes read are the position of the reader in the input files, from
+/proc/self/fdinfo (so only on Linux). Since the files are read in order, the
+time left is estimated from the number of bytes still to read.
+"""
+
+from __future__ import print_function, division  # 2to3
+
+import json
+import os
+import timeit
+
+from icecube import icetray
+
+
+def format_time(seconds):
+    """
+    Return the time in seconds as h:mm:ss.
+    """
+
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+
+    return '{}:{:02d}:{:02d}'.format(hours, minutes, seconds)
+
+
+class Progress(object):
+    """
+    Progress of a tray through its input files.
+
+    Parameters
+    ----------
+    input_files : list of str
+        The files read by the tray, in order.
+
+    interval : float
+        The time between reports (s).
+
+    status_file : str or None
+        The JSON file to save the status to at each report.
+
+    smoothing : float
+        The weight of the latest interval in the smoothed rates (between 0
+        and 1).
+    """
+
+    def __init__(self, input_files, interval=60, status_file=None, smoothing=0.3):
+        self.input_files = [os.path.realpath(path) for path in input_files]
+        self.sizes = [os.path.getsize(path) for path in self.input_files]
+        self.total_bytes = sum(self.sizes)
+
+        self.interval = interval
+        self.status_file = status_file
+        self.smoothing = smoothing
+
+        self.frames_read = 0
+        self.frames_passed = 0
+
+        self.start = timeit.default_timer()
+        self.last_report = self.start
+        self.last_frames = 0
+        self.last_bytes = 0
+        self.frame_rate = None
+        self.byte_rate = None
+
+        # The furthest the reader has got: (file index, position).
+        self.position = (0, 0)
+
+    def bytes_read(self):
+        """
+        Return the number of bytes of the input files read so far, or None if
+        it can't be found (eg. not on Linux).
+        """
+
+        try:
+            fds = os.listdir('/proc/self/fd')
+        except OSError:
+            return None
+
+        for fd in fds:
+            try:
+                target = os.readlink(os.path.join('/proc/self/fd', fd))
+            except OSError:
+                continue
+            if target not in self.input_files:
+                continue
+
+            index = self.input_files.index(target)
+            with open(os.path.join('/proc/self/fdinfo', fd)) as fdinfo:
+                for line in fdinfo:
+                    if line.startswith('pos:'):
+                        self.position = max(self.position, (index, int(line.split()[1])))
+
+        index, position = self.position
+
+        return sum(self.sizes[:index]) + position
+
+    def read(self):
+        """
+        Count a DAQ frame read, and report if it's time to.
+        """
+
+        self.frames_read += 1
+
+        if timeit.default_timer() - self.last_report >= self.interval:
+            self.report()
+
+    def passed(self):
+        """
+        Count a Physics frame that passed.
+        """
+
+        self.frames_passed += 1
+
+    def status(self, done=False):
+        """
+        Return the current status as a dict, and update the smoothed rates.
+        """
+
+        now = timeit.default_timer()
+        elapsed = now - self.start
+
+        bytes_read = self.total_bytes if done else self.bytes_read()
+
+        # Smooth the rates over the report intervals.
+        if now > self.last_report:
+            frame_rate = (self.frames_read - self.last_frames) / (now - self.last_report)
+            if self.frame_rate is None:
+                self.frame_rate = frame_rate
+            else:
+                self.frame_rate = self.smoothing * frame_rate + (1 - self.smoothing) * self.frame_rate
+
+            if bytes_read is not None:
+                byte_rate = (bytes_read - self.last_bytes) / (now - self.last_report)
+                if self.byte_rate is None:
+                    self.byte_rate = byte_rate
+                else:
+                    self.byte_rate = self.smoothing * byte_rate + (1 - self.smoothing) * self.byte_rate
+                self.last_bytes = bytes_read
+
+        self.last_report = now
+        self.last_frames = self.frames_read
+
+        eta = None
+        if done:
+            eta = 0
+        elif bytes_read is not None and self.byte_rate:
+            eta = (self.total_bytes - bytes_read) / self.byte_rate
+
+        return {'done': done, 'elapsed': elapsed, 'frames_read': self.frames_read,
+                'frames_passed': self.frames_passed, 'frame_rate': self.frame_rate,
+                'bytes_read': bytes_read, 'total_bytes': self.total_bytes, 'eta': eta}
+
+    def report(self, done=False):
+        """
+        Print the status, and save it to the status file (if there is one).
+        """
+
+        status = self.status(done)
+
+        message = '{} DAQ frames read, {} passed, {:.1f} frames/s'.format(
+            status['frames_read'], status['frames_passed'], status['frame_rate'] or 0)
+        if status['bytes_read'] is not None and status['total_bytes']:
+            message += ', {:.1f} of {:.1f} MB ({:.0%})'.format(
+                status['bytes_read'] / 1e6, status['total_bytes'] / 1e6, status['bytes_read'] / status['total_bytes'])
+        if status['eta'] is not None:
+            message += ', ETA {}'.format(format_time(status['eta']))
+        print('[{}] {}'.format(format_time(status['elapsed']), message))
+
+        if self.status_file:
+            # Write to a temporary file first so the status file is never
+            # read half written.
+            with open(self.status_file + '.tmp', 'w') as outfile:
+                json.dump(status, outfile, indent=2, sort_keys=True)
+            os.rename(self.status_file + '.tmp', self.status_file)
+
+
+class ProgressModule(icetray.I3Module):
+    """
+    Update a Progress. With Count='read' (put it right after the I3Reader) it
+    counts the DAQ frames read, and with Count='passed' (put it at the end of
+    the tray) it counts the Physics frames that passed. Call
+    Progress.report(done=True) for the final report after the tray is done.
+    """
+
+    def __init__(self, context):
+        icetray.I3Module.__init__(self, context)
+        self.AddParameter('Progress', 'The Progress to update', None)
+        self.AddParameter('Count', "'read' to count the DAQ frames read, or 'passed' to count the Physics frames passed", 'read')
+        self.AddOutBox('OutBox')
+
+    def Configure(self):
+        self.progress = self.GetParameter('Progress')
+        self.count = self.GetParameter('Count')
+
+    def Process(self):
+        frame = self.PopFrame()
+
+        if self.count == 'read' and frame.Stop == icetray.I3Frame.DAQ:
+            self.progress.read()
+        elif self.count == 'passed' and frame.Stop == icetray.I3Frame.Physics:
+            self.progress.passed()
+
+        self.PushFrame(frame)
@@ -0,0 +1,88 @@
+"""
+Cache of the pulse series masks applied in a frame.
+
+Several modules apply the same pulse series mask to the same frame (eg.
+om_partition, dom_data, and count_hits all use TWSRTOfflinePulses). The
+PulseCache applies each mask once per frame and hands the same pulse series
+to every module that asks for it. The clear_pulse_cache module has to be
+added to the tray ahead of the modules using the cache, so it starts afresh
+with each frame.
+"""
+
+from __future__ import print_function, division  # 2to3
+
+
+def frame_id(frame):
+    """
+    Return the (run_id, event_id, sub_event_id, sub_event_stream) of the frame.
+    """
+
+    header = frame['I3EventHeader']
+
+    return (header.run_id, header.event_id, header.sub_event_id, header.sub_event_stream)
+
+
+class PulseCache(object):
+    """
+    Cache of the applied pulse series masks for the current frame.
+
+    The cache has to be cleared (with clear) before each new frame, since
+    two different frames can have the same event header (eg. the same file
+    read twice). As a safeguard it is also cleared whenever a frame from a
+    different event (or sub event) comes along. The pulse series returned are
+    shared, so don't modify them.
+
+    Attributes
+    ----------
+    hits : int
+        The number of times a pulse series was found in the cache.
+
+    misses : int
+        The number of times a mask had to be applied.
+    """
+
+    def __init__(self):
+        self.frame_id = None
+        self.pulses = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, frame, key):
+        """
+        Return frame[key].apply(frame), applying the mask only if it hasn't
+        been applied to this frame yet.
+        """
+
+        current_id = frame_id(frame)
+        if current_id != self.frame_id:
+            self.frame_id = current_id
+            self.pulses = {}
+
+        if key in self.pulses:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.pulses[key] = frame[key].apply(frame)
+
+        return self.pulses[key]
+
+    def clear(self):
+        """
+        Forget the pulse series of the current frame.
+        """
+
+        self.frame_id = None
+        self.pulses = {}
+
+
+# Shared by all the modules, so they all get the same pulse series.
+pulse_cache = PulseCache()
+
+
+def clear_pulse_cache(frame, pulse_cache=pulse_cache):
+    """
+    Clear the pulse cache for a new frame. Add this to the tray before the
+    modules using the cache.
+    """
+
+    pulse_cache.clear()
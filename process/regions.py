@@ -0,0 +1,136 @@
+"""
+The regions of the detector used in the analysis.
+
+A region is a set of strings and a range of OMs on those strings. All the
+regions in a RegionRegistry are compiled into dense lookup tables indexed by
+string and OM, so finding which regions a DOM is in is a single array lookup.
+
+This is the one place the analysis strings are defined. It is used by
+count_hits and dom_data in the processing, and by the cut options. Like
+geometry.py, this module is independent of the IceCube framework.
+"""
+
+from __future__ import print_function, division  # 2to3
+
+import numpy as np
+
+# Strings in the analysis regions
+IC_strings = [26, 27, 37, 46, 45, 35, 17, 18, 19, 28, 38, 47, 56, 55, 54, 44, 34, 25]
+DC_strings = [81, 82, 83, 84, 85, 86]
+
+# We need to exclude hits on strings 36, 79, and 80 when counting the hits
+# outside the analysis regions.
+excluded_strings = [36, 79, 80]
+
+# The size of the lookup tables (string and OM numbers start at 1).
+num_strings = 87
+num_oms = 65
+
+
+class RegionRegistry(object):
+    """
+    A collection of detector regions.
+
+    Examples
+    --------
+    >>> registry = RegionRegistry()
+    >>> registry.add('Top', [1, 2], om_range=(1, 10))
+    >>> registry.add('NotString1', [1], invert=True)
+    >>> sorted(registry.count([1, 1, 2, 3], [5, 20, 5, 5]).items())
+    [('NotString1', 2), ('Top', 2)]
+    """
+
+    def __init__(self):
+        self.names = []
+        self.tables = np.zeros((0, num_strings, num_oms), dtype=bool)
+        self.inverted = np.zeros(0, dtype=bool)
+
+    def add(self, name, strings, om_range=(1, num_oms - 1), invert=False):
+        """
+        Add a region.
+
+        Parameters
+        ----------
+        name : str
+
+        strings : list of ints
+            The strings in the region.
+
+        om_range : tuple
+            The (first, last) OMs on the strings in the region (inclusive).
+            Use None for the last OM to include all the OMs from the first.
+
+        invert : bool
+            If True, the region is everything except the given strings and
+            OMs.
+        """
+
+        first, last = om_range
+        if last is None:
+            last = num_oms - 1
+
+        table = np.zeros((num_strings, num_oms), dtype=bool)
+        table[np.ix_(strings, range(first, last + 1))] = True
+
+        self.names.append(name)
+        self.tables = np.concatenate((self.tables, table[np.newaxis]))
+        self.inverted = np.append(self.inverted, invert)
+
+    def lookup(self, strings, oms):
+        """
+        Find which regions each DOM is in.
+
+        Parameters
+        ----------
+        strings, oms : array_like
+            The string and OM numbers of the DOMs.
+
+        Returns
+        -------
+        np.ndarray of bool
+            Array of shape (number of regions, number of DOMs). Element [i, j]
+            indicates if the jth DOM is in the region self.names[i]. DOMs
+            outside the lookup tables are not in any of the regions (or in
+            all of them for the inverted regions).
+        """
+
+        strings = np.asarray(strings, dtype=int)
+        oms = np.asarray(oms, dtype=int)
+
+        in_table = (strings >= 0) & (strings < num_strings) & (oms >= 0) & (oms < num_oms)
+        member = self.tables[:, np.where(in_table, strings, 0), np.where(in_table, oms, 0)] & in_table
+
+        return member ^ self.inverted[:, np.newaxis]
+
+    def contains(self, name, strings, oms):
+        """
+        Return a boolean array indicating which DOMs are in the named region.
+        """
+
+        return self.lookup(strings, oms)[self.names.index(name)]
+
+    def count(self, strings, oms):
+        """
+        Count the number of DOMs in each region.
+
+        Returns
+        -------
+        dict[str] -> int
+        """
+
+        counts = self.lookup(strings, oms).sum(axis=1)
+
+        return dict(zip(self.names, counts.tolist()))
+
+
+regions = RegionRegistry()
+
+# The IC analysis region is the inner two hexagons (excluding Deep Core and
+# string 36) below the dust layer, and the DC analysis region is the Deep
+# Core strings (excluding 79 and 80) below the dust layer.
+regions.add('ICAnalysis', IC_strings, om_range=(40, None))
+regions.add('DCAnalysis', DC_strings, om_range=(11, None))
+
+# Everything outside the analysis regions (and the excluded strings).
+regions.add('ICOutside', excluded_strings + DC_strings + IC_strings, invert=True)
+regions.add('DCOutside', excluded_strings + DC_strings, invert=True)
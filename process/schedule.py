@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+
+"""
+Run process.py on many data files in parallel on the local machine.
+
+The data files are handed out in batches to a pool of worker processes, and
+each worker runs process.py on the files of its batch one at a time. The
+processing time per input byte is measured as files finish, and used to size
+the batches so each one takes about --batch-time seconds, and so no file is
+started that isn't expected to finish within the --budget for the whole run.
+Failed files are retried up to --retries times, each in a batch of its own
+so a file that fails again doesn't take other files down with it.
+
+A summary of the run is saved to process_summary.json in the output
+directory. It lists the status of each file: 'ok', 'failed', or 'pending'
+(not started because it wouldn't fit in the budget). Running the script again
+with the same output directory skips the files that are already 'ok', so
+leftover files can be processed in a later job.
+"""
+
+from __future__ import print_function, division  # 2to3
+
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+process_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'process.py')
+
+
+def output_path(data, outdir):
+    """
+    Return the path of the output file for a data file.
+    """
+
+    return os.path.join(outdir, os.path.basename(data))
+
+
+def run_batch(batch, gcd, outdir, process_args):
+    """
+    Run process.py on each of the data files in the batch.
+
+    The output of process.py for each file is saved to the output file name
+    with '.log' added.
+
+    Parameters
+    ----------
+    batch : list of str
+        The data files.
+
+    gcd : str
+        The GCD file for the data.
+
+    outdir : str
+        The directory to save the output files in.
+
+    process_args : list of str
+        Extra arguments for process.py.
+
+    Returns
+    -------
+    list of dicts
+        The 'file', 'returncode', 'seconds' and 'bytes' of each data file.
+    """
+
+    results = []
+    for data in batch:
+        ofile = output_path(data, outdir)
+        command = [sys.executable, process_script, gcd, data, ofile] + process_args
+
+        start = time.time()
+        with open(ofile + '.log', 'w') as logfile:
+            returncode = subprocess.call(command, stdout=logfile, stderr=subprocess.STDOUT)
+
+        results.append({'file': data, 'returncode': returncode,
+                        'seconds': time.time() - start, 'bytes': os.path.getsize(data)})
+
+    return results
+
+
+class Throughput(object):
+    """
+    Running estimate of the processing time per byte of input.
+    """
+
+    def __init__(self):
+        self.seconds = 0
+        self.bytes = 0
+
+    def add(self, seconds, num_bytes):
+        self.seconds += seconds
+        self.bytes += num_bytes
+
+    def predict(self, num_bytes):
+        """
+        Return the predicted processing time (s) for a file of num_bytes
+        bytes, or None if nothing has been measured yet.
+        """
+
+        if self.bytes == 0:
+            return None
+
+        return num_bytes * self.seconds / self.bytes
+
+
+def next_batch(queue, throughput, batch_time, time_left):
+    """
+    Take the next batch of files off the front of the queue.
+
+    Files are added to the batch while the predicted time of the batch is
+    within batch_time (but there is always at least one file). Until the
+    throughput has been measured, each batch is a single file. No file is
+    added that isn't predicted to finish within time_left.
+
+    Parameters
+    ----------
+    queue : list of str
+        The data files waiting to be processed.
+
+    throughput : Throughput
+
+    batch_time : float
+        The target duration of the batch (s).
+
+    time_left : float or None
+        The time left in the budget (s), or None for no budget.
+
+    Returns
+    -------
+    list of str
+        The batch. It is empty if the next file doesn't fit in the budget.
+    """
+
+    batch = []
+    predicted = 0
+    while queue:
+        file_time = throughput.predict(os.path.getsize(queue[0]))
+        if file_time is None:
+            return [queue.pop(0)]
+
+        if time_left is not None and predicted + file_time > time_left:
+            break
+        if batch and predicted + file_time > batch_time:
+            break
+
+        batch.append(queue.pop(0))
+        predicted += file_time
+
+    return batch
+
+
+def load_summary(path):
+    """
+    Return the file records of a previous run's summary (or an empty dict).
+    """
+
+    if not os.path.exists(path):
+        return {}
+
+    with open(path) as infile:
+        summary = json.load(infile)
+
+    return dict((record['file'], record) for record in summary['files'])
+
+
+def save_summary(path, records, wall_time, workers):
+    """
+    Save the summary of the run.
+    """
+
+    files = [records[data] for data in sorted(records)]
+
+    summary = {}
+    summary['files'] = files
+    summary['wall_time'] = wall_time
+    summary['workers'] = workers
+    for status in ['ok', 'failed', 'pending']:
+        summary[status] = len([record for record in files if record['status'] == status])
+    summary['processing_time'] = sum(record['seconds'] for record in files)
+    summary['bytes_processed'] = sum(record['bytes'] for record in files if record['status'] == 'ok')
+
+    # Write to a temporary file first so a killed run never leaves a broken summary.
+    with open(path + '.tmp', 'w') as outfile:
+        json.dump(summary, outfile, indent=2, sort_keys=True)
+    os.rename(path + '.tmp', path)
+
+    return summary
+
+
+def parse_args(argv):
+    """
+    Parse the command line arguments.
+
+    The arguments after '--' are for process.py. They are split off before
+    parsing, since the data files (nargs='+') would take them otherwise.
+
+    Returns
+    -------
+    args : argparse.Namespace
+
+    process_args : list of str
+        The arguments for process.py.
+    """
+
+    process_args = []
+    if '--' in argv:
+        split = argv.index('--')
+        argv, process_args = argv[:split], argv[split + 1:]
+
+    parser = argparse.ArgumentParser(description='run process.py on many data files in parallel',
+                                     epilog='Arguments after -- are passed on to process.py, eg. -- -s')
+    parser.add_argument('gcd', help='GCD file for the data')
+    parser.add_argument('outdir', help='directory to save the output files in')
+    parser.add_argument('data', help='data files for processing',
+                        nargs='+')
+    parser.add_argument('-j', '--workers', help='number of files to process at once (default: number of cores)',
+                        type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--budget', help='wall clock time for the whole run (s); files that would not finish in time are left for later',
+                        type=float)
+    parser.add_argument('--batch-time', help='target processing time of a batch of files (s)',
+                        type=float, default=1800)
+    parser.add_argument('--retries', help='number of times to retry a failed file',
+                        type=int, default=1)
+
+    return parser.parse_args(argv), process_args
+
+
+def main():
+
+    args, process_args = parse_args(sys.argv[1:])
+
+    start = time.time()
+    summary_path = os.path.join(args.outdir, 'process_summary.json')
+
+    # Skip the files that were already processed in a previous run.
+    records = load_summary(summary_path)
+    queue = [data for data in args.data if records.get(data, {}).get('status') != 'ok']
+    for data in queue:
+        records[data] = {'file': data, 'status': 'pending', 'attempts': 0, 'seconds': 0,
+                         'bytes': os.path.getsize(data)}
+
+    print('{} files to process ({} already done)'.format(len(queue), len(args.data) - len(queue)))
+
+    throughput = Throughput()
+    pool = multiprocessing.Pool(args.workers)
+    running = []
+
+    # The failed files to retry. They go first, each in a batch of its own
+    # (a batch_time of 0 gives a single file).
+    retry_queue = []
+
+    while queue or retry_queue or running:
+
+        # Hand out batches to the idle workers.
+        while (queue or retry_queue) and len(running) < args.workers:
+            time_left = None if args.budget is None else args.budget - (time.time() - start)
+            if retry_queue:
+                batch = next_batch(retry_queue, throughput, 0, time_left)
+            else:
+                batch = next_batch(queue, throughput, args.batch_time, time_left)
+            if not batch:
+                break
+
+            result = pool.apply_async(run_batch, (batch, args.gcd, args.outdir, process_args))
+            running.append(result)
+
+        # Out of budget: leave the rest of the files for later.
+        if not running:
+            break
+
+        time.sleep(1)
+
+        for result in [result for result in running if result.ready()]:
+            running.remove(result)
+
+            for file_result in result.get():
+                record = records[file_result['file']]
+                record['attempts'] += 1
+                record['seconds'] += file_result['seconds']
+
+                if file_result['returncode'] == 0:
+                    record['status'] = 'ok'
+                    throughput.add(file_result['seconds'], file_result['bytes'])
+                elif record['attempts'] <= args.retries:
+                    # Retry it next, on its own.
+                    retry_queue.append(file_result['file'])
+                else:
+                    record['status'] = 'failed'
+
+                status = 'retrying' if record['status'] == 'pending' else record['status']
+                print('{} {} ({:.0f} s)'.format(status, file_result['file'], file_result['seconds']))
+
+            save_summary(summary_path, records, time.time() - start, args.workers)
+
+    pool.close()
+    pool.join()
+
+    summary = save_summary(summary_path, records, time.time() - start, args.workers)
+    print('{ok} ok, {failed} failed, {pending} pending in {wall_time:.0f} s'.format(**summary))
+
+    if summary['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
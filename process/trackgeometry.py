@@ -0,0 +1,180 @@
+"""
+Vectorized calculations of the geometry of DOMs relative to a muon track.
+
+These do the same calculations as the I3Calculator functions used in
+domanalysis.py (cherenkov_distance, closest_approach_position, etc.), but for
+an array of DOM positions at once. Like geometry.py, the functions in this
+module are independent of the IceCube framework.
+"""
+
+from __future__ import print_function, division  # 2to3
+
+from collections import namedtuple
+
+import numpy as np
+
+# Speed of light in vacuum (m/ns), the same as I3Constants.c
+c = 0.299792458
+
+TrackGeometry = namedtuple('TrackGeometry', ['reco_dist', 'dist_above_endpoint', 'impact_angle',
+                                             'closest_z', 'cherenkov_pos', 'cherenkov_time',
+                                             'passed'])
+
+PulseArrays = namedtuple('PulseArrays', ['offsets', 'times', 'charges'])
+
+
+# The track shapes (the I3Particle shapes InfiniteTrack, StartingTrack,
+# StoppingTrack and ContainedTrack).
+track_shapes = ['infinite', 'starting', 'stopping', 'contained']
+
+
+def track_geometry(positions, track_pos, track_dir, track_shape, track_length, endpoint,
+                   n_group, n_phase, max_dist, track_time=0):
+    """
+    Calculate the per-dom track geometry used in dom_data for many DOMs.
+
+    Parameters
+    ----------
+    positions : array_like
+        The (x, y, z) positions of the DOMs, with shape (N, 3).
+
+    track_pos : array_like
+        The (x, y, z) position of the track (the vertex, or the stopping
+        point of a stopping track).
+
+    track_dir : array_like
+        The (x, y, z) unit direction vector of the track.
+
+    track_shape : str
+        One of track_shapes. As in I3Calculator, the shape decides where the
+        track is: the Cherenkov position must lie after the vertex of a
+        starting track, before the stopping point of a stopping track, and
+        between the vertex and track_length after it for a contained track.
+        The Cherenkov distance is NaN for the DOMs where it doesn't, and for
+        all the DOMs if the shape isn't a track shape.
+
+    track_length : float
+        The length of the track (only used for contained tracks).
+
+    endpoint : array_like
+        The (x, y, z) position of the reconstructed endpoint.
+
+    n_group, n_phase : float
+        The group and phase indices of refraction of the ice.
+
+    max_dist : float
+        The maximum Cherenkov distance for a DOM to pass.
+
+    track_time : float
+        The time of the track at its vertex (in ns).
+
+    Returns
+    -------
+    TrackGeometry
+        A namedtuple of arrays with one entry per DOM:
+
+        reco_dist : The Cherenkov distance (RecoDistance).
+        dist_above_endpoint : The distance of the Cherenkov position above
+            the endpoint along the track (DistAboveEndpoint).
+        impact_angle : The ImpactAngle (in radians).
+        closest_z : The z coordinate of the closest approach position.
+        cherenkov_pos : The Cherenkov positions, with shape (N, 3).
+        cherenkov_time : The time the Cherenkov photons reach the DOMs
+            (time residuals are measured relative to this).
+        passed : Boolean mask of the DOMs that pass the dom_data selection,
+            ie. reco_dist < max_dist, the closest approach is below the DOM,
+            and the Cherenkov position is above the endpoint.
+    """
+
+    positions = np.array(positions, dtype=float).reshape(-1, 3)
+    track_pos = np.array(track_pos, dtype=float)
+    track_dir = np.array(track_dir, dtype=float)
+
+    # Cherenkov angle
+    sin_changle = np.sqrt(1 - 1 / n_phase ** 2)
+    tan_changle = np.sqrt(n_phase ** 2 - 1)
+
+    # Closest approach of the track to each DOM.
+    delta = positions - track_pos
+    along = np.dot(delta, track_dir)  # distance_along_track of the DOMs
+    closest_pos = track_pos + along[:, np.newaxis] * track_dir
+    closest_dist = np.sqrt(np.sum((positions - closest_pos) ** 2, axis=1))
+
+    # The Cherenkov photons reach the DOM from a point on the track before
+    # the closest approach.
+    cherenkov_along = along - closest_dist / tan_changle
+    cherenkov_pos = track_pos + cherenkov_along[:, np.newaxis] * track_dir
+    reco_dist = closest_dist / sin_changle
+
+    # The photons travel along the track at c and then to the DOM at the
+    # group velocity.
+    cherenkov_time = track_time + (cherenkov_along + reco_dist * n_group) / c
+
+    if track_shape != 'infinite':
+        if track_shape == 'starting':
+            on_track = cherenkov_along >= 0
+        elif track_shape == 'stopping':
+            on_track = cherenkov_along <= 0
+        elif track_shape == 'contained':
+            on_track = (cherenkov_along >= 0) & (cherenkov_along <= track_length)
+        else:
+            on_track = np.zeros(len(positions), dtype=bool)
+        reco_dist = np.where(on_track, reco_dist, np.nan)
+
+    endpoint_along = np.dot(np.array(endpoint, dtype=float) - track_pos, track_dir)
+    dist_above_endpoint = endpoint_along - cherenkov_along
+
+    # The impact parameter is the horizontal distance of the DOM to the
+    # closest approach position.
+    impact_param = np.hypot(positions[:, 0] - closest_pos[:, 0], positions[:, 1] - closest_pos[:, 1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        impact_angle = np.arcsin(np.clip(impact_param / closest_dist, 0, 1))
+
+    with np.errstate(invalid='ignore'):  # NaN distances don't pass
+        passed = (reco_dist < max_dist) & (closest_pos[:, 2] < positions[:, 2]) & (dist_above_endpoint > 0)
+
+    return TrackGeometry(reco_dist, dist_above_endpoint, impact_angle,
+                         closest_pos[:, 2], cherenkov_pos, cherenkov_time, passed)
+
+
+def windowed_charge(pulses, doms, cherenkov_time, window):
+    """
+    Sum the charge of the pulses on each of the given DOMs with a time
+    residual less than window.
+
+    Parameters
+    ----------
+    pulses : PulseArrays
+        The flattened pulse series. The pulses of the ith DOM are
+        pulses.times[pulses.offsets[i]:pulses.offsets[i + 1]] (and the same
+        for the charges).
+
+    doms : np.ndarray of int
+        The indices of the DOMs to sum the charges of.
+
+    cherenkov_time : np.ndarray
+        The Cherenkov time of each of the DOMs (see track_geometry).
+
+    window : float
+        The maximum time residual (in ns).
+
+    Returns
+    -------
+    np.ndarray
+        The total charge of each DOM.
+    """
+
+    doms = np.asarray(doms, dtype=int)
+    starts = pulses.offsets[doms]
+    counts = pulses.offsets[doms + 1] - starts
+
+    # The index of the DOM each pulse belongs to (in doms), and the index of
+    # the pulse in the flattened arrays.
+    owner = np.repeat(np.arange(len(doms)), counts)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    pulse_index = np.repeat(starts, counts) + np.arange(len(owner)) - first
+
+    with np.errstate(invalid='ignore'):  # NaN residuals are left out
+        keep = pulses.times[pulse_index] - cherenkov_time[owner] < window
+
+    return np.bincount(owner[keep], weights=pulses.charges[pulse_index][keep], minlength=len(doms))
@@ -0,0 +1,11 @@
+"""
+The modules are run as scripts from their own directories, so put those on
+the path for the tests.
+"""
+
+import os
+import sys
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+for directory in ['process', 'cut', 'benchmark']:
+    sys.path.insert(0, os.path.join(root, directory))
@@ -0,0 +1,115 @@
+"""
+Tests for fitcache.py (they need IceTray).
+"""
+
+from __future__ import print_function, division  # 2to3
+
+import math
+
+import pytest
+
+pytest.importorskip('icecube.gulliver')
+
+from icecube import dataclasses, gulliver, icetray
+
+from fitcache import FitCache
+
+
+def make_frame(fit_status=dataclasses.I3Particle.OK):
+    """
+    Return a frame with a fit like the ones I3SimpleFitter makes (NaN energy
+    and length, and everything NaN if it failed).
+    """
+
+    frame = icetray.I3Frame(icetray.I3Frame.Physics)
+
+    header = dataclasses.I3EventHeader()
+    header.run_id = 1
+    header.event_id = 2
+    header.sub_event_stream = 'in_ice'
+    frame['I3EventHeader'] = header
+
+    particle = dataclasses.I3Particle()
+    particle.shape = dataclasses.I3Particle.InfiniteTrack
+    particle.fit_status = fit_status
+    if fit_status == dataclasses.I3Particle.OK:
+        particle.pos = dataclasses.I3Position(1, 2, 3)
+        particle.dir = dataclasses.I3Direction(0.5, 1.5)
+        particle.time = 10000
+    frame['MPEFit0'] = particle
+
+    params = gulliver.I3LogLikelihoodFitParams()
+    if fit_status == dataclasses.I3Particle.OK:
+        params.logl = 100
+        params.rlogl = 8
+    params.ndof = 12
+    params.nmini = 50
+    frame['MPEFit0FitParams'] = params
+
+    return frame
+
+
+def same(a, b):
+    return a == b or (math.isnan(a) and math.isnan(b))
+
+
+@pytest.mark.parametrize('fit_status', [dataclasses.I3Particle.OK, dataclasses.I3Particle.FailedToConverge])
+def test_round_trip_nan(tmpdir, fit_status):
+    fit_cache = FitCache(str(tmpdir.join('fits.sqlite')))
+
+    frame = make_frame(fit_status)
+    fit_cache.store(frame, 0, 'config', 'MPEFit0')
+
+    cached = icetray.I3Frame(icetray.I3Frame.Physics)
+    cached['I3EventHeader'] = frame['I3EventHeader']
+    assert fit_cache.lookup(cached, 0, 'config', 'MPEFit0')
+
+    original, particle = frame['MPEFit0'], cached['MPEFit0']
+    assert math.isnan(particle.energy) and math.isnan(particle.length)
+    for attr in ['x', 'y', 'z']:
+        assert same(getattr(original.pos, attr), getattr(particle.pos, attr))
+    assert same(original.dir.zenith, particle.dir.zenith)
+    assert same(original.time, particle.time)
+    assert particle.fit_status == original.fit_status
+
+    params = cached['MPEFit0FitParams']
+    assert same(frame['MPEFit0FitParams'].logl, params.logl)
+    assert params.ndof == 12 and params.nmini == 50
+
+    fit_cache.close()
+
+
+def test_served_fits_not_stored_again(tmpdir):
+    fit_cache = FitCache(str(tmpdir.join('fits.sqlite')))
+
+    frame = make_frame()
+    fit_cache.store(frame, 0, 'config', 'MPEFit0')
+    assert fit_cache.connection.total_changes == 1
+
+    cached = icetray.I3Frame(icetray.I3Frame.Physics)
+    cached['I3EventHeader'] = frame['I3EventHeader']
+    assert fit_cache.lookup(cached, 0, 'config', 'MPEFit0')
+
+    fit_cache.store(cached, 0, 'config', 'MPEFit0')
+    assert fit_cache.connection.total_changes == 1
+
+    fit_cache.close()
+
+
+def test_shared_cache_file(tmpdir):
+    path = str(tmpdir.join('fits.sqlite'))
+    first = FitCache(path, timeout=0.1)
+    second = FitCache(path, timeout=0.1)
+
+    # Neither job holds the write lock between fits.
+    frame = make_frame()
+    first.store(frame, 0, 'config', 'MPEFit0')
+    second.store(frame, 1, 'config', 'MPEFit0')
+    first.store(frame, 2, 'config', 'MPEFit0')
+
+    cached = icetray.I3Frame(icetray.I3Frame.Physics)
+    cached['I3EventHeader'] = frame['I3EventHeader']
+    assert second.lookup(cached, 2, 'config', 'MPEFit0')
+
+    first.close()
+    second.close()
@@ -0,0 +1,84 @@
+"""
+Tests for parallel.py.
+"""
+
+from __future__ import print_function, division  # 2to3
+
+import operator as op
+
+import numpy as np
+import pytest
+
+tables = pytest.importorskip('tables')
+
+from columnar import cut_columns
+from columns import ColumnWriter, event_columns, id_columns, dom_keys
+from parallel import cut_parallel, index_group
+
+event_cuts = {'NDirDoms': (op.gt, 5)}
+dom_cuts = {'ImpactAngle': (op.lt, np.pi / 2)}
+
+
+def write_column_file(path, rng, run, num_events):
+    """
+    Write a columnar file (as process.py --columns does) of random events.
+    """
+
+    writer = ColumnWriter(path)
+
+    for event in range(num_events):
+        row = [rng.uniform(0, 100) for column in event_columns()]
+        row[:len(id_columns)] = [run, event, 0]
+        row[event_columns().index('NDirDoms')] = rng.randint(0, 12)
+
+        num_doms = rng.randint(0, 8)
+        doms = [rng.uniform(0, np.pi, num_doms) if key == 'ImpactAngle' else rng.uniform(0, 100, num_doms)
+                for key in dom_keys]
+
+        writer.event_buffer.append(row)
+        writer.dom_buffer.append(doms)
+        writer.dom_counts.append(num_doms)
+
+    writer.close()
+
+
+def cut_part(task):
+    datafile, part_file = task
+    cut_columns([datafile], part_file, event_cuts, dom_cuts, dom_keys)
+
+    return part_file
+
+
+def read_tables(path):
+    """
+    Return the contents of all the tables of an HDF5 file.
+    """
+
+    with tables.open_file(path) as infile:
+        return dict((table._v_pathname, table.read()) for table in infile.walk_nodes('/', 'Table'))
+
+
+def test_merged_parts_match_single_process(tmpdir):
+    rng = np.random.RandomState(0)
+
+    datafiles = []
+    for run in range(3):
+        path = str(tmpdir.join('columns{}.h5'.format(run)))
+        write_column_file(path, rng, run, 50 + 10 * run)
+        datafiles.append(path)
+
+    single = str(tmpdir.join('single.h5'))
+    cut_columns(datafiles, single, event_cuts, dom_cuts, dom_keys)
+
+    merged = str(tmpdir.join('merged.h5'))
+    cut_parallel(cut_part, datafiles, merged, 2)
+
+    expected = read_tables(single)
+    result = read_tables(merged)
+
+    assert sorted(result) == sorted(expected)
+    assert any(name.startswith('/' + index_group) for name in result)
+    for name in expected:
+        np.testing.assert_array_equal(result[name], expected[name], err_msg=name)
+
+    assert not tmpdir.listdir(lambda path: '.part' in path.basename)
@@ -0,0 +1,37 @@
+"""
+Tests for schedule.py.
+"""
+
+from __future__ import print_function, division  # 2to3
+
+from schedule import Throughput, next_batch, parse_args
+
+
+def test_process_args_after_double_dash():
+    args, process_args = parse_args(['gcd', 'out', 'f1', 'f2', '--', '-s', '--checkpoint', '100'])
+
+    assert args.data == ['f1', 'f2']
+    assert process_args == ['-s', '--checkpoint', '100']
+
+
+def test_no_process_args():
+    args, process_args = parse_args(['gcd', 'out', 'f1', '-j', '4'])
+
+    assert args.data == ['f1']
+    assert args.workers == 4
+    assert process_args == []
+
+
+def test_retry_batch_is_one_file(tmpdir):
+    files = []
+    for i in range(3):
+        path = tmpdir.join('f{}'.format(i))
+        path.write('x' * 100)
+        files.append(str(path))
+
+    throughput = Throughput()
+    throughput.add(1, 1000)
+
+    # Normal batches take several files, retries (batch_time=0) only one.
+    assert next_batch(list(files), throughput, 1800, None) == files
+    assert next_batch(list(files), throughput, 0, None) == files[:1]
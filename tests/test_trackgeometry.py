@@ -0,0 +1,209 @@
+"""
+Tests for trackgeometry.py.
+
+track_geometry is checked against values worked out by hand for a simple
+track, against a scalar reference of the formulas of the per-DOM loop dom_data
+had before the numpy engine, and (with IceTray) against I3Calculator itself.
+"""
+
+from __future__ import print_function, division  # 2to3
+
+import math
+
+import numpy as np
+import pytest
+
+from trackgeometry import c, track_geometry
+
+# The same as I3Constants.n_ice_group and n_ice_phase
+n_group = 1.35634
+n_phase = 1.3195
+
+max_dist = 140
+
+
+def reference(dom, track_pos, track_dir, track_shape, track_length, endpoint, track_time):
+    """
+    Return the reco_dist, dist_above_endpoint, impact_angle, closest_z,
+    cherenkov_time and passed of one DOM, one step at a time.
+    """
+
+    changle = math.acos(1 / n_phase)
+
+    delta = [dom[i] - track_pos[i] for i in range(3)]
+    along = sum(delta[i] * track_dir[i] for i in range(3))
+    closest = [track_pos[i] + along * track_dir[i] for i in range(3)]
+    closest_dist = math.sqrt(sum((dom[i] - closest[i]) ** 2 for i in range(3)))
+
+    cherenkov_along = along - closest_dist / math.tan(changle)
+    reco_dist = closest_dist / math.sin(changle)
+    cherenkov_time = track_time + (cherenkov_along + reco_dist * n_group) / c
+
+    # I3Calculator gives NaN when the Cherenkov position isn't on the track.
+    on_track = {'infinite': True,
+                'starting': cherenkov_along >= 0,
+                'stopping': cherenkov_along <= 0,
+                'contained': 0 <= cherenkov_along <= track_length}
+    if not on_track.get(track_shape, False):
+        reco_dist = float('nan')
+
+    endpoint_along = sum((endpoint[i] - track_pos[i]) * track_dir[i] for i in range(3))
+    dist_above_endpoint = endpoint_along - cherenkov_along
+
+    impact_param = math.hypot(dom[0] - closest[0], dom[1] - closest[1])
+    impact_angle = math.asin(min(impact_param / closest_dist, 1))
+
+    passed = reco_dist < max_dist and closest[2] < dom[2] and dist_above_endpoint > 0
+
+    return reco_dist, dist_above_endpoint, impact_angle, closest[2], cherenkov_time, passed
+
+
+def random_track(rng):
+    zenith = math.radians(rng.uniform(40, 70))
+    azimuth = rng.uniform(0, 2 * math.pi)
+    track_dir = -np.array([math.sin(zenith) * math.cos(azimuth),
+                           math.sin(zenith) * math.sin(azimuth),
+                           math.cos(zenith)])
+    endpoint = rng.uniform(-200, 200, 3)
+    track_pos = endpoint - 800 * track_dir
+
+    # DOMs scattered around the track, some beyond each end of it.
+    along = rng.uniform(-200, 1000, 500)
+    offsets = rng.normal(0, 100, (500, 3))
+    positions = track_pos + along[:, np.newaxis] * track_dir + offsets
+
+    return positions, track_pos, track_dir, endpoint
+
+
+def test_known_values():
+    # A horizontal track through the origin along x, and DOMs 50 m from it.
+    # The Cherenkov angle is acos(1 / n_phase), so reco_dist = 50 / sin(angle)
+    # and the Cherenkov position is 50 / tan(angle) = 58.08 m before the point
+    # of closest approach.
+    positions = [(100, 0, 50), (100, 30, 40), (100, 0, -50), (-100, 0, 50)]
+
+    result = track_geometry(positions, (0, 0, 0), (1, 0, 0), 'infinite', float('nan'), (300, 0, 0),
+                            n_group, n_phase, max_dist)
+
+    np.testing.assert_allclose(result.reco_dist, 76.63846175132926, rtol=1e-12)
+    np.testing.assert_allclose(result.closest_z, 0, atol=1e-12)
+    np.testing.assert_allclose(result.dist_above_endpoint,
+                               [258.0814412666383, 258.0814412666383, 258.0814412666383, 458.0814412666383],
+                               rtol=1e-12)
+    np.testing.assert_allclose(result.impact_angle, [0, math.asin(0.6), 0, 0], atol=1e-12)
+    np.testing.assert_allclose(result.cherenkov_time[0], 486.5578371059609, rtol=1e-12)
+    np.testing.assert_allclose(result.cherenkov_time[0] - result.cherenkov_time[3], 200 / c, rtol=1e-12)
+
+    # The third DOM is below the track.
+    np.testing.assert_array_equal(result.passed, [True, True, False, True])
+
+
+@pytest.mark.parametrize('track_shape, track_length, on_track', [
+    ('infinite', float('nan'), [True, True]),
+    ('infinite', 40, [True, True]),  # the length of an infinite track doesn't matter
+    ('starting', float('nan'), [True, False]),
+    ('stopping', float('nan'), [False, True]),
+    ('contained', 60, [True, False]),
+    ('contained', 40, [False, False]),
+    ('point', 60, [False, False]),
+])
+def test_track_shapes(track_shape, track_length, on_track):
+    # The Cherenkov positions are 41.92 m after and 158.08 m before the vertex
+    # (the stopping point of the stopping track).
+    positions = [(100, 0, 50), (-100, 0, 50)]
+
+    result = track_geometry(positions, (0, 0, 0), (1, 0, 0), track_shape, track_length, (300, 0, 0),
+                            n_group, n_phase, max_dist)
+
+    np.testing.assert_array_equal(~np.isnan(result.reco_dist), on_track)
+    np.testing.assert_array_equal(result.passed, on_track)
+
+
+@pytest.mark.parametrize('track_shape, track_length', [('infinite', float('nan')), ('infinite', 400),
+                                                       ('starting', float('nan')), ('stopping', float('nan')),
+                                                       ('contained', 800), ('contained', 400)])
+def test_matches_reference(track_shape, track_length):
+    rng = np.random.RandomState(0)
+    positions, track_pos, track_dir, endpoint = random_track(rng)
+
+    result = track_geometry(positions, track_pos, track_dir, track_shape, track_length, endpoint,
+                            n_group, n_phase, max_dist, track_time=10000)
+
+    expected = [reference(dom, track_pos, track_dir, track_shape, track_length, endpoint, 10000)
+                for dom in positions]
+    reco_dist, dist_above_endpoint, impact_angle, closest_z, cherenkov_time, passed = map(np.array, zip(*expected))
+
+    np.testing.assert_allclose(result.reco_dist, reco_dist, rtol=1e-9, equal_nan=True)
+    np.testing.assert_allclose(result.dist_above_endpoint, dist_above_endpoint, rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(result.impact_angle, impact_angle, rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(result.closest_z, closest_z, rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(result.cherenkov_time, cherenkov_time, rtol=1e-12)
+    np.testing.assert_array_equal(result.passed, passed)
+
+    # The finite tracks leave some DOMs off the track.
+    assert np.isnan(result.reco_dist).any() == (track_shape != 'infinite')
+    assert passed.any()
+
+
+def test_max_dist_edge():
+    rng = np.random.RandomState(1)
+    positions, track_pos, track_dir, endpoint = random_track(rng)
+
+    result = track_geometry(positions, track_pos, track_dir, 'infinite', float('nan'), endpoint,
+                            n_group, n_phase, max_dist)
+
+    # A DOM that passes, with max_dist set to exactly its distance.
+    dom = np.flatnonzero(result.passed)[0]
+    edge = result.reco_dist[dom]
+
+    at_edge = track_geometry(positions[dom], track_pos, track_dir, 'infinite', float('nan'), endpoint,
+                             n_group, n_phase, edge)
+    assert not at_edge.passed[0]  # reco_dist < max_dist, as in dom_data
+
+    above_edge = track_geometry(positions[dom], track_pos, track_dir, 'infinite', float('nan'), endpoint,
+                                n_group, n_phase, np.nextafter(edge, np.inf))
+    assert above_edge.passed[0]
+
+
+@pytest.mark.parametrize('track_shape, track_length', [('infinite', float('nan')), ('starting', float('nan')),
+                                                       ('stopping', float('nan')), ('contained', 800),
+                                                       ('contained', 400)])
+def test_matches_i3calculator(track_shape, track_length):
+    pytest.importorskip('icecube.phys_services')
+    from icecube import dataclasses
+    from icecube.phys_services import I3Calculator as calc
+
+    rng = np.random.RandomState(2)
+    positions, track_pos, track_dir, endpoint = random_track(rng)
+
+    particle = dataclasses.I3Particle()
+    particle.pos = dataclasses.I3Position(*track_pos)
+    particle.dir = dataclasses.I3Direction(*track_dir)
+    particle.time = 10000
+    particle.length = track_length
+    particle.shape = {'infinite': dataclasses.I3Particle.InfiniteTrack,
+                      'starting': dataclasses.I3Particle.StartingTrack,
+                      'stopping': dataclasses.I3Particle.StoppingTrack,
+                      'contained': dataclasses.I3Particle.ContainedTrack}[track_shape]
+
+    result = track_geometry(positions, track_pos, track_dir, track_shape, track_length, endpoint,
+                            n_group, n_phase, max_dist, track_time=10000)
+
+    reco_endpoint = dataclasses.I3Position(*endpoint)
+    for i, position in enumerate(positions):
+        dom_position = dataclasses.I3Position(*position)
+
+        reco_dist = calc.cherenkov_distance(particle, dom_position, n_group, n_phase)
+        np.testing.assert_allclose(result.reco_dist[i], reco_dist, rtol=1e-9, equal_nan=True)
+
+        closest = calc.closest_approach_position(particle, dom_position)
+        np.testing.assert_allclose(result.closest_z[i], closest.z, rtol=1e-9, atol=1e-9)
+
+        if not math.isnan(reco_dist):
+            cherenkov_pos = calc.cherenkov_position(particle, dom_position, n_group, n_phase)
+            dist_above_endpoint = (calc.distance_along_track(particle, reco_endpoint) -
+                                   calc.distance_along_track(particle, cherenkov_pos))
+            np.testing.assert_allclose(result.dist_above_endpoint[i], dist_above_endpoint, rtol=1e-9, atol=1e-9)
+
+            residual = calc.time_residual(particle, dom_position, 10500, n_group, n_phase)
+            np.testing.assert_allclose(10500 - result.cherenkov_time[i], residual, rtol=1e-9, atol=1e-6)